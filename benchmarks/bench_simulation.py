@@ -0,0 +1,202 @@
+# benchmarks/bench_simulation.py
+"""
+Benchmark symulacji Monte Carlo: stara pętla "dzień po dniu" vs silnik wektorowy.
+
+Uruchomienie (z katalogu repo):
+    python -m benchmarks.bench_simulation
+
+Stare implementacje są tu skopiowane 1:1 tylko na potrzeby porównania czasu.
+"""
+
+from __future__ import annotations
+
+import time
+from typing import Callable, Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from oi.simulation import (
+    _simulate_policy_core,
+    _to_daily_series,
+    monte_carlo_policy,
+    monte_carlo_policy_events,
+    monte_carlo_stockout,
+)
+
+
+# ─────────────────────────────────────────────────────────────
+# Referencyjne (stare) implementacje
+# ─────────────────────────────────────────────────────────────
+
+def legacy_monte_carlo_stockout(
+    forecast: pd.Series,
+    current_stock: float,
+    lead_time_days: int,
+    n_sim: int = 500,
+    demand_volatility: float = 0.15,
+) -> Dict[str, float]:
+    daily_forecast = _to_daily_series(forecast)
+
+    stockouts = 0
+    ending_stocks: List[float] = []
+
+    for _ in range(n_sim):
+        stock = float(current_stock)
+        for val in daily_forecast:
+            noise = np.random.normal(loc=0.0, scale=demand_volatility * val)
+            demand = max(val + noise, 0.0)
+            stock -= demand
+        ending_stocks.append(stock)
+        if stock < 0:
+            stockouts += 1
+
+    return {
+        "prob_stockout": stockouts / n_sim,
+        "avg_ending_stock": float(np.mean(ending_stocks)),
+    }
+
+
+def legacy_monte_carlo_policy(
+    forecast: pd.Series,
+    current_stock: float,
+    reorder_point: float,
+    order_qty: float,
+    lead_time_days: int,
+    n_sim: int = 500,
+    demand_volatility: float = 0.15,
+) -> Dict[str, float]:
+    daily_forecast = _to_daily_series(forecast)
+
+    stockout_runs = 0
+    stockouts_per_run: List[int] = []
+
+    for _ in range(n_sim):
+        stock = float(current_stock)
+        deliveries: List[Tuple[int, float]] = []
+        stockouts_this_run = 0
+
+        for day_idx, val in enumerate(daily_forecast):
+            if deliveries and deliveries[0][0] == day_idx:
+                _, qty = deliveries.pop(0)
+                stock += qty
+            if stock < reorder_point and order_qty > 0:
+                deliveries.append((day_idx + lead_time_days, order_qty))
+            noise = np.random.normal(loc=0.0, scale=demand_volatility * val)
+            demand = max(val + noise, 0.0)
+            stock -= demand
+            if stock < 0:
+                stockouts_this_run += 1
+
+        stockouts_per_run.append(stockouts_this_run)
+        if stockouts_this_run > 0:
+            stockout_runs += 1
+
+    return {
+        "prob_any_stockout": stockout_runs / n_sim,
+        "avg_stockouts_per_run": float(np.mean(stockouts_per_run)),
+    }
+
+
+# ─────────────────────────────────────────────────────────────
+# Narzędzia
+# ─────────────────────────────────────────────────────────────
+
+def _weekly_forecast(weeks: int = 52, level: float = 70.0) -> pd.Series:
+    idx = pd.date_range("2025-01-05", periods=weeks, freq="W")
+    return pd.Series(np.full(weeks, level), index=idx)
+
+
+def _best_of(fn: Callable[[], object], repeat: int = 3) -> Tuple[float, object]:
+    best = float("inf")
+    out: object = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = fn()
+        best = min(best, time.perf_counter() - t0)
+    return best, out
+
+
+def _report(label: str, t_old: float, t_new: float) -> None:
+    print(f"{label:<40} stara: {t_old*1000:9.1f} ms   nowa: {t_new*1000:8.2f} ms   "
+          f"przyspieszenie: {t_old / t_new:7.1f}×")
+
+
+# ─────────────────────────────────────────────────────────────
+# Benchmarki
+# ─────────────────────────────────────────────────────────────
+
+def bench_stockout(n_sim: int = 2000, weeks: int = 52) -> None:
+    fc = _weekly_forecast(weeks)
+    kwargs = dict(forecast=fc, current_stock=3640.0, lead_time_days=7, n_sim=n_sim)
+
+    t_old, old = _best_of(lambda: legacy_monte_carlo_stockout(**kwargs), repeat=1)
+    t_new, new = _best_of(lambda: monte_carlo_stockout(**kwargs, seed=0))
+    _report(f"monte_carlo_stockout n_sim={n_sim}, {weeks} tyg.", t_old, t_new)
+    print(f"    prob_stockout: stara={old['prob_stockout']:.3f} nowa={new['prob_stockout']:.3f}")
+
+
+def bench_policy(n_sim: int = 10_000, days: int = 365, legacy_n_sim: int = 500) -> None:
+    """
+    Stara pętla na 10k × 365 dni liczy się minutami, więc mierzymy ją na
+    `legacy_n_sim` przebiegach i skalujemy liniowo (koszt jest ~ n_sim × n_days).
+    """
+    idx = pd.date_range("2025-01-01", periods=days, freq="D")
+    fc = pd.Series(np.full(days, 10.0), index=idx)
+    kwargs = dict(forecast=fc, current_stock=150.0, reorder_point=75.0, order_qty=100.0, lead_time_days=7)
+
+    # najlepszy z kilku pomiarów – pojedynczy przebieg starej pętli waha się o dziesiątki procent
+    t_old, _ = _best_of(lambda: legacy_monte_carlo_policy(**kwargs, n_sim=legacy_n_sim), repeat=5)
+    t_old *= n_sim / legacy_n_sim
+    t_new, new = _best_of(lambda: monte_carlo_policy(**kwargs, n_sim=n_sim, seed=0), repeat=5)
+    _report(f"monte_carlo_policy n_sim={n_sim}, {days} dni", t_old, t_new)
+    print(f"    fill_rate={new['fill_rate']:.3f} prob_any_stockout={new['prob_any_stockout']:.3f} "
+          f"(stara pętla mierzona na {legacy_n_sim} przebiegach i przeskalowana)")
+
+
+def _sparse_demand_matrix(n_sim: int, days: int, level: float, p: float, volatility: float,
+                          rng: np.random.Generator) -> np.ndarray:
+    """Ten sam model popytu co demand_probability=p w kernelu zdarzeniowym, ale jako gęsta macierz dni."""
+    hit = rng.random((n_sim, days)) < p
+    sizes = level / p * (1.0 + volatility * rng.standard_normal((n_sim, days)))
+    return np.where(hit, np.maximum(sizes, 0.0), 0.0)
+
+
+def bench_policy_events(n_sim: int = 1000, years: int = 10, legacy_n_sim: int = 100, p: float = 0.05) -> None:
+    """
+    SKU sporadyczny (popyt ~1 dzień na 20) na horyzoncie wieloletnim, ten sam model popytu
+    dla obu silników: kernel zdarzeniowy vs silnik dzienny (_simulate_policy_core na gęstej
+    macierzy popytu, z losowaniem) i vs stara pętla dzienna (skalowana jak wyżej).
+    """
+    days = 365 * years
+    level = 0.5
+    idx = pd.date_range("2025-01-01", periods=days, freq="D")
+    fc = pd.Series(np.full(days, level), index=idx)
+    policy = dict(current_stock=30.0, reorder_point=8.0, order_qty=40.0, lead_time_days=14)
+
+    t_old, _ = _best_of(lambda: legacy_monte_carlo_policy(forecast=fc, **policy, n_sim=legacy_n_sim), repeat=1)
+    t_old *= n_sim / legacy_n_sim
+
+    def dense() -> Dict[str, np.ndarray]:
+        demand = _sparse_demand_matrix(n_sim, days, level, p, 0.15, np.random.default_rng(0))
+        return _simulate_policy_core(demand, **policy)
+
+    t_vec, per_run = _best_of(dense)
+    t_evt, res = _best_of(
+        lambda: monte_carlo_policy_events(forecast=fc, **policy, n_sim=n_sim, demand_probability=p, seed=0)
+    )
+    _report(f"policy_events n_sim={n_sim}, {years} lat (vs pętla)", t_old, t_evt)
+    _report(f"policy_events n_sim={n_sim}, {years} lat (vs dzienny)", t_vec, t_evt)
+    dense_fill = per_run["served"].sum() / per_run["demand"].sum()
+    print(f"    fill_rate: zdarzeniowy={res['fill_rate']:.3f} dzienny={dense_fill:.3f}   "
+          f"avg_orders_per_run={res['avg_orders_per_run']:.1f}")
+
+
+def main() -> None:
+    bench_stockout()
+    bench_policy()
+    bench_policy_events()
+
+
+if __name__ == "__main__":
+    main()
@@ -8,8 +8,21 @@ Ten pakiet spina całą logikę domenową aplikacji:
 - data_ingestion    – wczytywanie wielu plików (sprzedaż, dostawy, produkcja, stany)
 - preprocessing     – normalizacja, mapowanie kolumn, agregacje czasowe
 - forecasting       – prognozowanie popytu (fallback + haki pod modele zaawansowane)
+- ets               – wygładzanie wykładnicze / Holt-Winters liczone macierzowo
+- intermittent      – popyt sporadyczny: reprezentacja rzadka (CSR) + Croston / SBA / TSB
+- probabilistic     – prognozy probabilistyczne: ścieżki popytu i kwantyle z bootstrapu błędów
+- hierarchy         – hierarchia całość / magazyn / SKU i uzgadnianie prognoz (BU / TD / MinT)
+- forecast_state    – stan prognoz (bufory, poziom/trend/sezon) z przyrostową aktualizacją
+- forecast_executor – równoległe prognozy ciężkimi modelami (Prophet) w puli procesów
+- forecast_cache    – cache prognoz adresowany treścią (LRU w pamięci + opcjonalnie dysk)
+- backtesting       – wektorowy backtest prognoz (rolling origin, MAE/MAPE/sMAPE/bias)
+- model_selection   – tryb "auto": ABC/XYZ i budżet liczenia zależny od wartości SKU
+- lead_times        – empiryczne czasy dostaw z plików dostaw (indeks dostawca × SKU, przyrostowy)
 - optimization      – ROP, safety stock, EOQ i inne polityki uzupełnień
+- order_allocation  – zamówienia wielu SKU przy wspólnym budżecie / pojemności (koszt oczekiwany)
+- multi_echelon     – zapas bezpieczeństwa w sieci DC → magazyny regionalne (guaranteed service)
 - simulation        – Monte Carlo i testowanie strategii
+- online_stats      – statystyki liczone w locie (Welford, przedziały ufności)
 - ai_assistant      – integracja z OpenAI, copilot magazynowy
 - ui_components     – wspólne komponenty UI dla Streamlit
 
@@ -34,8 +47,21 @@ __all__ = [
     "data_ingestion",
     "preprocessing",
     "forecasting",
+    "ets",
+    "intermittent",
+    "probabilistic",
+    "hierarchy",
+    "forecast_state",
+    "forecast_executor",
+    "forecast_cache",
+    "backtesting",
+    "model_selection",
+    "lead_times",
     "optimization",
+    "order_allocation",
+    "multi_echelon",
     "simulation",
+    "online_stats",
     "ai_assistant",
     "ui_components",
     "get_submodule",
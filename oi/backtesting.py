@@ -0,0 +1,243 @@
+# oi/backtesting.py
+from __future__ import annotations
+"""
+Backtest prognoz metodą rolling origin – wektorowo.
+
+Zamiast jednego punktu (jak mape_last w forecast_sku) sprawdzamy prognozę z wielu
+punktów startu ("origin"): dla każdego origin bierzemy historię do tego okresu,
+prognozujemy `horizon` okresów do przodu i porównujemy z tym, co się faktycznie sprzedało.
+
+Wszystko na macierzy (szeregi × okresy) z preprocessing.pivot_sales_matrix:
+- okna historii i okna celu to widoki sliding_window_view (bez kopiowania danych),
+- wszystkie origin-y wszystkich szeregów sklejamy w jedną macierz i liczymy metodę
+  z forecasting.BATCH_FORECASTERS jednym wywołaniem,
+- metryki (MAE / MAPE / sMAPE / bias) to sumy po maskach – bez pętli po SKU.
+"""
+
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+from .ets import season_length_for
+from .forecasting import BATCH_FORECASTERS, BATCH_LOOKBACK, forecast_matrix
+from .preprocessing import pivot_sales_matrix
+
+# ile elementów okien historii (szeregi × origin-y × okno) materializujemy naraz
+_BACKTEST_CHUNK_ELEMENTS = 20_000_000
+
+METRICS = ("mae", "mape", "smape", "bias")
+
+# metody backtestu, gdy nie podano listy – tanie metody z ograniczonym oknem historii.
+# ETS / Holt-Winters / Croston dopasowują się od nowa z pełnej historii w każdym origin-ie,
+# więc trzeba je wskazać jawnie (10k szeregów × 52 origin-y: kilka sekund vs kilka minut)
+DEFAULT_BACKTEST_METHODS = ("naive", "ma", "level_trend")
+
+
+def rolling_origins(n_periods: int, horizon: int, n_origins: int, stride: int = 1) -> np.ndarray:
+    """
+    Indeksy origin-ów: origin o = prognoza startuje od okresu o (historia to kolumny < o).
+    Ostatni origin to n_periods - horizon, żeby cały horyzont miał dane rzeczywiste.
+    """
+    last = n_periods - horizon
+    if last < 1 or n_origins <= 0:
+        return np.empty(0, dtype=np.int64)
+    first = max(last - (n_origins - 1) * stride, 1)
+    return np.arange(first, last + 1, stride, dtype=np.int64)
+
+
+def _method_forecasts(
+    y: np.ndarray,
+    origins: np.ndarray,
+    horizon: int,
+    method: str,
+    lookback: Optional[int],
+    season_length: int = 1,
+) -> np.ndarray:
+    """Prognozy metody dla wszystkich (szereg, origin) naraz → (n_series, n_origins, horizon)."""
+    n_series, n_periods = y.shape
+    window = n_periods if lookback is None else max(int(lookback), 1)
+    # NaN z lewej, żeby okno kończące się przed origin o zawsze istniało: ypad[:, o : o + window]
+    ypad = np.concatenate([np.full((n_series, window), np.nan), y], axis=1)
+    windows = sliding_window_view(ypad, window, axis=1)
+
+    out = np.empty((n_series, origins.size, horizon))
+    chunk = max(1, _BACKTEST_CHUNK_ELEMENTS // max(n_series * window, 1))
+    for lo in range(0, origins.size, chunk):
+        sel = origins[lo:lo + chunk]
+        hist = windows[:, sel].reshape(-1, window)
+        out[:, lo:lo + sel.size] = forecast_matrix(hist, horizon, method, season_length).reshape(n_series, sel.size, horizon)
+    return out
+
+
+def _error_sums(fc: np.ndarray, actual: np.ndarray, mask: np.ndarray, axis: Any) -> Dict[str, np.ndarray]:
+    """Sumy błędów po wskazanych osiach (tylko tam, gdzie mask)."""
+    err = np.where(mask, fc - actual, 0.0)
+    abs_err = np.abs(err)
+    nonzero = mask & (actual != 0)
+    ape = np.divide(abs_err, np.abs(actual), out=np.zeros_like(abs_err), where=nonzero)
+    denom = np.abs(actual) + np.abs(fc)
+    # sMAPE dla 0 vs 0 = 0 (idealna prognoza braku sprzedaży)
+    sape = np.divide(2.0 * abs_err, denom, out=np.zeros_like(abs_err), where=mask & (denom > 0))
+    return {
+        "n": mask.sum(axis=axis),
+        "n_nonzero": nonzero.sum(axis=axis),
+        "abs_err": abs_err.sum(axis=axis),
+        "err": err.sum(axis=axis),
+        "ape": ape.sum(axis=axis),
+        "sape": sape.sum(axis=axis),
+    }
+
+
+def _metrics_from_sums(sums: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    n = np.asarray(sums["n"], dtype=float)
+    nz = np.asarray(sums["n_nonzero"], dtype=float)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return {
+            "mae": np.where(n > 0, sums["abs_err"] / n, np.nan),
+            "mape": np.where(nz > 0, sums["ape"] / nz * 100.0, np.nan),
+            "smape": np.where(n > 0, sums["sape"] / n * 100.0, np.nan),
+            "bias": np.where(n > 0, sums["err"] / n, np.nan),
+            "n_forecasts": n,
+        }
+
+
+def backtest_matrix(
+    y: np.ndarray,
+    horizon: int = 4,
+    n_origins: int = 12,
+    methods: Optional[Sequence[str]] = None,
+    min_history: int = 2,
+    stride: int = 1,
+    season_length: int = 1,
+) -> Dict[str, Any]:
+    """
+    Rolling-origin backtest na macierzy historii (NaN = przed startem szeregu).
+    methods – metody z BATCH_FORECASTERS (None → DEFAULT_BACKTEST_METHODS),
+    season_length – długość sezonu dla metod sezonowych (patrz ets.season_length_for).
+
+    Para (szereg, origin) wchodzi do oceny, gdy szereg ma przed origin co najmniej
+    min_history okresów historii. Zwraca surowe sumy błędów per metoda:
+    "by_series" (n_series,), "by_step" (horizon,), "total" (skalar) + origin-y.
+    """
+    y = np.asarray(y, dtype=float)
+    if methods is None:
+        methods = DEFAULT_BACKTEST_METHODS
+    methods = [m for m in methods if m in BATCH_FORECASTERS]
+    n_series, n_periods = y.shape
+    origins = rolling_origins(n_periods, horizon, n_origins, stride)
+    if n_series == 0 or origins.size == 0 or not methods:
+        return {"origins": origins, "methods": methods, "results": {}}
+
+    actual = sliding_window_view(y, horizon, axis=1)[:, origins]          # (S, O, h)
+    n_hist = np.cumsum(~np.isnan(y), axis=1)[:, origins - 1]             # historia przed origin
+    mask = np.broadcast_to((n_hist >= min_history)[:, :, None], actual.shape)
+    actual = np.where(mask, actual, 0.0)
+
+    results: Dict[str, Dict[str, Any]] = {}
+    for method in methods:
+        fc = _method_forecasts(y, origins, horizon, method, BATCH_LOOKBACK.get(method), season_length)
+        results[method] = {
+            "by_series": _error_sums(fc, actual, mask, axis=(1, 2)),
+            "by_step": _error_sums(fc, actual, mask, axis=(0, 1)),
+            "total": _error_sums(fc, actual, mask, axis=None),
+        }
+    return {"origins": origins, "methods": methods, "results": results}
+
+
+def backtest_mae_by_series(
+    y: np.ndarray,
+    horizon: int,
+    n_origins: int,
+    methods: Optional[Sequence[str]] = None,
+    min_history: int = 2,
+    season_length: int = 1,
+) -> Dict[str, np.ndarray]:
+    """Skrót: MAE każdego szeregu dla każdej metody (NaN, gdy historia za krótka)."""
+    bt = backtest_matrix(
+        y, horizon=horizon, n_origins=n_origins, methods=methods,
+        min_history=min_history, season_length=season_length,
+    )
+    return {m: _metrics_from_sums(res["by_series"])["mae"] for m, res in bt["results"].items()}
+
+
+def rolling_origin_backtest(
+    df: pd.DataFrame,
+    freq: str = "W",
+    horizon: int = 4,
+    n_origins: int = 12,
+    methods: Optional[Sequence[str]] = None,
+    min_history: int = 2,
+    stride: int = 1,
+) -> Dict[str, Any]:
+    """
+    Backtest metod wektorowych (methods, None → DEFAULT_BACKTEST_METHODS) na wszystkich
+    szeregach z ramki aggregate_sales.
+
+    Metryki (błąd = prognoza − rzeczywistość, liczone po wszystkich origin-ach i krokach horyzontu):
+    - mae   – średni błąd bezwzględny (szt.),
+    - mape  – średni błąd procentowy, tylko okresy z niezerową sprzedażą,
+    - smape – symetryczny MAPE (0–200%), działa też przy zerach,
+    - bias  – średni błąd ze znakiem (> 0 = przeszacowanie).
+
+    Zwraca dict:
+    {
+        "summary": DataFrame – metoda × metryki (cały asortyment),
+        "by_series": DataFrame long – klucze szeregu, metoda, metryki,
+        "by_horizon": DataFrame – metoda, krok horyzontu, metryki,
+        "meta": {... origin-y, parametry ...},
+    }
+    """
+    pivot = pivot_sales_matrix(df, freq=freq)
+    keys = pivot["keys"]
+    bt = backtest_matrix(
+        pivot["values"], horizon, n_origins, methods, min_history, stride, season_length_for(freq)
+    )
+    origins = bt["origins"]
+    periods = pivot["periods"]
+
+    meta = {
+        "status": "ok" if bt["results"] else "empty",
+        "freq": freq,
+        "horizon": int(horizon),
+        "n_origins": int(origins.size),
+        "origin_dates": [periods[o - 1] for o in origins] if len(periods) else [],
+        "min_history": int(min_history),
+        "n_series": int(len(keys)),
+        "methods": list(bt["methods"]),
+    }
+    metric_cols = list(METRICS) + ["n_forecasts"]
+    if not bt["results"]:
+        return {
+            "summary": pd.DataFrame(columns=["method"] + metric_cols),
+            "by_series": pd.DataFrame(columns=list(keys.columns) + ["method"] + metric_cols),
+            "by_horizon": pd.DataFrame(columns=["method", "step"] + metric_cols),
+            "meta": meta,
+        }
+
+    summary_rows: List[Dict[str, Any]] = []
+    series_frames: List[pd.DataFrame] = []
+    horizon_frames: List[pd.DataFrame] = []
+    for method, res in bt["results"].items():
+        total = _metrics_from_sums(res["total"])
+        summary_rows.append({"method": method, **{k: float(v) for k, v in total.items()}})
+
+        per_series = keys.copy()
+        per_series.insert(len(keys.columns), "method", method)
+        for k, v in _metrics_from_sums(res["by_series"]).items():
+            per_series[k] = v
+        series_frames.append(per_series)
+
+        per_step = pd.DataFrame({"method": method, "step": np.arange(1, horizon + 1)})
+        for k, v in _metrics_from_sums(res["by_step"]).items():
+            per_step[k] = v
+        horizon_frames.append(per_step)
+
+    summary = pd.DataFrame(summary_rows).sort_values("mae", kind="stable").reset_index(drop=True)
+    return {
+        "summary": summary,
+        "by_series": pd.concat(series_frames, ignore_index=True),
+        "by_horizon": pd.concat(horizon_frames, ignore_index=True),
+        "meta": meta,
+    }
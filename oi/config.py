@@ -17,7 +17,7 @@ from __future__ import annotations
 
 import os
 from dataclasses import dataclass, field, asdict
-from typing import List, Tuple, Dict, Any
+from typing import List, Tuple, Dict, Any, Optional
 
 
 def _get_env(key: str, default: str) -> str:
@@ -25,6 +25,22 @@ def _get_env(key: str, default: str) -> str:
     return os.getenv(key, default)
 
 
+def _resolve_n_jobs(n_jobs: Optional[int], n_tasks: Optional[int] = None) -> int:
+    """
+    Liczba procesów puli: None/1 → 1, -1 (albo <= 0) → wszystkie rdzenie.
+    n_tasks – nigdy więcej procesów niż zadań (wspólne dla simulation i forecast_executor).
+    """
+    if n_jobs is None:
+        workers = 1
+    elif n_jobs <= 0:
+        workers = max(os.cpu_count() or 1, 1)
+    else:
+        workers = int(n_jobs)
+    if n_tasks is not None:
+        workers = min(workers, n_tasks)
+    return max(workers, 1)
+
+
 @dataclass(frozen=True)
 class AppConfig:
     # ─────────────────────────────────────────
@@ -34,18 +50,38 @@ class AppConfig:
     sku_col: str = _get_env("MAGAPP_SKU_COL", "sku")
     qty_col: str = _get_env("MAGAPP_QTY_COL", "ilosc")
     location_col: str = _get_env("MAGAPP_LOCATION_COL", "magazyn")
+    # dostawy: dostawca i data złożenia zamówienia (data przyjęcia to date_col)
+    supplier_col: str = _get_env("MAGAPP_SUPPLIER_COL", "dostawca")
+    order_date_col: str = _get_env("MAGAPP_ORDER_DATE_COL", "data_zamowienia")
 
     # ─────────────────────────────────────────
     # Parametry logistyczne – domyślne
     # ─────────────────────────────────────────
     default_service_level: float = float(_get_env("MAGAPP_SERVICE_LEVEL", "0.95"))
     default_lead_time_days: int = int(_get_env("MAGAPP_LEAD_TIME_DAYS", "7"))
+    # czas przerzutu z centrum dystrybucji do magazynu regionalnego (tryb wielopoziomowy)
+    default_transfer_days: int = int(_get_env("MAGAPP_TRANSFER_DAYS", "2"))
+    # co ile dni składamy zamówienia – okres ochrony zapasu = lead time + ten okres
+    default_review_period_days: int = int(_get_env("MAGAPP_REVIEW_PERIOD_DAYS", "7"))
 
     # ─────────────────────────────────────────
     # Ekonomia zamówień – można podpiąć w UI
     # ─────────────────────────────────────────
     default_order_cost: float = float(_get_env("MAGAPP_ORDER_COST", "50"))
     default_holding_cost: float = float(_get_env("MAGAPP_HOLDING_COST", "2"))
+    # koszt braku 1 szt. (utracona marża / kara) – używany w symulacjach kosztowych
+    default_shortage_cost: float = float(_get_env("MAGAPP_SHORTAGE_COST", "10"))
+
+    # ─────────────────────────────────────────
+    # Symulacje – ile przebiegów trzymamy naraz w pamięci (tryb strumieniowy)
+    # ─────────────────────────────────────────
+    sim_block_size: int = int(_get_env("MAGAPP_SIM_BLOCK_SIZE", "2000"))
+
+    # ─────────────────────────────────────────
+    # Cache prognoz – rozmiar LRU w pamięci i katalog na dysku (pusty = bez dysku)
+    # ─────────────────────────────────────────
+    forecast_cache_size: int = int(_get_env("MAGAPP_FORECAST_CACHE_SIZE", "256"))
+    forecast_cache_dir: str = _get_env("MAGAPP_FORECAST_CACHE_DIR", "")
 
     # ─────────────────────────────────────────
     # Agregacje czasowe
@@ -0,0 +1,362 @@
+# oi/ets.py
+from __future__ import annotations
+"""
+Wygładzanie wykładnicze (ETS / Holt-Winters) liczone na całej macierzy szeregów naraz.
+
+Rodzina modeli:
+- "ses"         – proste wygładzanie (sam poziom),
+- "holt"        – poziom + trend liniowy,
+- "holt_damped" – poziom + trend tłumiony (φ < 1, prognoza wypłaszcza się),
+- "hw_add"      – Holt-Winters, sezonowość addytywna (trend tłumiony φ = 0.98),
+- "hw_mul"      – Holt-Winters, sezonowość multiplikatywna (j.w.),
+- "ets"         – per szereg wybieramy z powyższych model o najniższym AIC.
+
+Jak liczymy:
+- macierz y (szeregi × okresy, NaN = przed startem szeregu) – jak w pivot_sales_matrix,
+- parametry (α, β, γ, φ) dobieramy siatką: stan modelu ma kształt (punkty siatki × szeregi),
+  więc jedna pętla po okresach liczy rekursje dla wszystkich szeregów i wszystkich
+  kombinacji parametrów naraz; per szereg wybieramy punkt siatki o najmniejszym SSE
+  błędów jednokrokowych,
+- sezonowość jest przypięta do kalendarza (faza = numer okresu mod m), więc wszystkie
+  szeregi dzielą tę samą fazę; do startu sezonowości szereg potrzebuje 2 pełnych cykli –
+  krótsze szeregi dostają neutralne indeksy sezonowe i w "ets" nie wybierają modeli sezonowych.
+"""
+
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+import numpy as np
+
+# długość sezonu dla częstotliwości agregacji: dzień → tydzień, tydzień / miesiąc → rok
+SEASON_LENGTH: Dict[str, int] = {"D": 7, "W": 52, "M": 12}
+
+# ile elementów stanu (punkty siatki × szeregi × długość sezonu) trzymamy naraz
+_ETS_CHUNK_ELEMENTS = 8_000_000
+
+_ALPHAS = (0.05, 0.1, 0.2, 0.35, 0.5, 0.8)
+_BETAS = (0.01, 0.05, 0.15)
+_PHIS = (0.85, 0.95)
+_SEASONAL_ALPHAS = (0.05, 0.1, 0.2, 0.4)
+_SEASONAL_BETAS = (0.01, 0.1)
+_GAMMAS = (0.05, 0.15, 0.3)
+_SEASONAL_PHI = 0.98
+
+# specyfikacja modeli: trend, sezonowość, siatka parametrów
+ETS_MODELS: Dict[str, Dict[str, Any]] = {
+    "ses": {"trend": False, "seasonal": None, "grid": {"alpha": _ALPHAS}},
+    "holt": {"trend": True, "seasonal": None, "grid": {"alpha": _ALPHAS, "beta": _BETAS}},
+    "holt_damped": {
+        "trend": True, "seasonal": None, "grid": {"alpha": _ALPHAS, "beta": _BETAS, "phi": _PHIS},
+    },
+    "hw_add": {
+        "trend": True, "seasonal": "add",
+        "grid": {"alpha": _SEASONAL_ALPHAS, "beta": _SEASONAL_BETAS, "gamma": _GAMMAS, "phi": (_SEASONAL_PHI,)},
+    },
+    "hw_mul": {
+        "trend": True, "seasonal": "mul",
+        "grid": {"alpha": _SEASONAL_ALPHAS, "beta": _SEASONAL_BETAS, "gamma": _GAMMAS, "phi": (_SEASONAL_PHI,)},
+    },
+}
+
+
+def season_length_for(freq: Optional[str]) -> int:
+    """'W-SUN' → 52, 'D' → 7, 'ME' → 12; nieznana częstotliwość → 1 (bez sezonowości)."""
+    if not freq:
+        return 1
+    return SEASON_LENGTH.get(freq.upper()[0], 1)
+
+
+def _param_grid(grid: Dict[str, Sequence[float]]) -> Dict[str, np.ndarray]:
+    """Iloczyn kartezjański siatki → płaskie wektory (G, 1) do broadcastu z (G, S)."""
+    names = ("alpha", "beta", "gamma", "phi")
+    axes = [np.asarray(grid.get(n, (0.0,) if n != "phi" else (1.0,)), dtype=float) for n in names]
+    mesh = np.meshgrid(*axes, indexing="ij")
+    return {n: m.ravel()[:, None] for n, m in zip(names, mesh)}
+
+
+def _initial_states(
+    y: np.ndarray,
+    first: np.ndarray,
+    n_valid: np.ndarray,
+    trend: bool,
+    seasonal: Optional[str],
+    m: int,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Stany początkowe z pierwszych okresów każdego szeregu:
+    poziom = średnia pierwszego cyklu, trend = różnica średnich dwóch pierwszych cykli / m,
+    sezonowość = odchylenia faz od poziomu w pierwszych 2 cyklach (gdy są dostępne).
+    Zwraca (level0, trend0, season0 (S × m), czy_sezon_zainicjowany).
+    """
+    n_series, n_periods = y.shape
+    w = m if seasonal else 1
+    t = np.arange(n_periods)[None, :]
+    rel = t - first[:, None]
+    y0 = np.nan_to_num(y)
+
+    def window_mean(lo: int, hi: int) -> Tuple[np.ndarray, np.ndarray]:
+        mask = (rel >= lo) & (rel < hi) & ~np.isnan(y)
+        cnt = mask.sum(axis=1)
+        return np.where(cnt > 0, (y0 * mask).sum(axis=1) / np.maximum(cnt, 1), np.nan), cnt
+
+    level0, _ = window_mean(0, w)
+    level0 = np.nan_to_num(level0)
+    trend0 = np.zeros(n_series)
+    if trend:
+        second, cnt2 = window_mean(w, 2 * w)
+        trend0 = np.where(cnt2 == w, (second - level0) / w, 0.0)
+        trend0 = np.nan_to_num(trend0)
+
+    has_season = np.zeros(n_series, dtype=bool)
+    neutral = 1.0 if seasonal == "mul" else 0.0
+    season0 = np.full((n_series, max(m, 1)), neutral)
+    if seasonal and m > 1:
+        has_season = n_valid >= 2 * m
+        mask = (rel >= 0) & (rel < 2 * m) & ~np.isnan(y)
+        pad = (-n_periods) % m
+        ym = np.pad(y0 * mask, ((0, 0), (0, pad))).reshape(n_series, -1, m).sum(axis=1)
+        cm = np.pad(mask, ((0, 0), (0, pad))).reshape(n_series, -1, m).sum(axis=1)
+        phase_mean = ym / np.maximum(cm, 1)
+        base, _ = window_mean(0, 2 * m)
+        base = np.nan_to_num(base)[:, None]
+        if seasonal == "add":
+            est = phase_mean - base
+        else:
+            est = np.divide(phase_mean, base, out=np.ones_like(phase_mean), where=base > 0)
+        season0 = np.where(has_season[:, None] & (cm > 0), est, neutral)
+    return level0, trend0, season0, has_season
+
+
+def _fit_chunk(
+    y: np.ndarray,
+    spec: Dict[str, Any],
+    m: int,
+) -> Dict[str, np.ndarray]:
+    """
+    Rekursje ETS dla paczki szeregów × cała siatka.
+    Zwraca stan końcowy i parametry najlepszego (min SSE) punktu siatki dla każdego szeregu.
+    """
+    trend = spec["trend"]
+    seasonal = spec["seasonal"] if m > 1 else None
+    params = _param_grid(spec["grid"])
+    alpha, beta, gamma, phi = params["alpha"], params["beta"], params["gamma"], params["phi"]
+    n_grid = alpha.shape[0]
+    n_series, n_periods = y.shape
+
+    valid = ~np.isnan(y)
+    n_valid = valid.sum(axis=1)
+    first = np.argmax(valid, axis=1)
+    level0, trend0, season0, has_season = _initial_states(y, first, n_valid, trend, seasonal, m)
+
+    level = np.repeat(level0[None, :], n_grid, axis=0)
+    slope = np.repeat(trend0[None, :], n_grid, axis=0)
+    # sezonowość jako (faza, siatka, szeregi) – season[phase] to ciągły blok pamięci
+    season = np.repeat(season0.T[:, None, :], n_grid, axis=1) if seasonal else None
+    sse = np.zeros((n_grid, n_series))
+
+    for t in range(n_periods):
+        v = valid[:, t]
+        if not v.any():
+            continue
+        # po starcie ostatniego szeregu wszystkie wiersze są ważne – bez masek
+        full = bool(v.all())
+        yt = y[:, t] if full else np.where(v, y[:, t], 0.0)
+        damped = phi * slope if trend else 0.0
+        base = level + damped
+        if seasonal:
+            phase = t % m
+            s_t = season[phase]
+            yhat = base + s_t if seasonal == "add" else base * s_t
+        else:
+            yhat = base
+        err = yt - yhat
+        sse += err * err if full else np.where(v, err * err, 0.0)
+
+        if seasonal == "add":
+            new_level = alpha * (yt - s_t) + (1.0 - alpha) * base
+        elif seasonal == "mul":
+            deseason = np.divide(yt, s_t, out=np.array(base), where=s_t > 1e-9)
+            new_level = alpha * deseason + (1.0 - alpha) * base
+        else:
+            new_level = alpha * yt + (1.0 - alpha) * base
+
+        if trend:
+            new_slope = beta * (new_level - level) + (1.0 - beta) * damped
+            slope = new_slope if full else np.where(v, new_slope, slope)
+        if seasonal == "add":
+            new_season = gamma * (yt - new_level) + (1.0 - gamma) * s_t
+        elif seasonal == "mul":
+            ratio = np.divide(yt, new_level, out=np.array(s_t), where=new_level > 1e-9)
+            new_season = gamma * ratio + (1.0 - gamma) * s_t
+        if seasonal:
+            season[phase] = new_season if full else np.where(v, new_season, s_t)
+        level = new_level if full else np.where(v, new_level, level)
+
+    best = np.argmin(sse, axis=0)
+    cols = np.arange(n_series)
+    if seasonal:
+        best_season = season[:, best, cols].T
+    else:
+        best_season = np.zeros((n_series, max(m, 1)))
+    return {
+        "level": level[best, cols],
+        "slope": slope[best, cols],
+        "season": best_season,
+        "alpha": alpha[best, 0],
+        "beta": beta[best, 0],
+        "gamma": gamma[best, 0],
+        "phi": phi[best, 0],
+        "seasonal": np.full(n_series, seasonal or "none", dtype=object),
+        "sse": sse[best, cols],
+        "has_season": has_season,
+    }
+
+
+# pola stanu ETS trzymane per szereg (reszta stanu: "t" i "season_length")
+_STATE_FIELDS = ("level", "slope", "season", "alpha", "beta", "gamma", "phi", "seasonal", "sse", "aic", "model", "n_obs")
+
+
+def ets_fit_state(
+    y: np.ndarray,
+    model: str = "ets",
+    season_length: int = 1,
+) -> Dict[str, Any]:
+    """
+    Dopasowanie modelu dla całej macierzy → stan po ostatnim okresie.
+
+    Stan (dict) to wszystko, czego potrzeba do prognozy i do dalszej aktualizacji
+    bez ponownego dopasowania: poziom, trend, indeksy sezonowe (S × m, faza liczona od
+    kolumny 0 macierzy), parametry wygładzania, typ sezonowości i model per szereg,
+    SSE / AIC, liczba obserwacji oraz "t" – ile okresów stan już przetworzył.
+    Modele bez trendu mają beta = 0 i trend 0, bez sezonowości – indeksy 0 (addytywnie),
+    więc aktualizacja i prognoza mogą liczyć wszystkie szeregi jednym wzorem.
+    """
+    y = np.asarray(y, dtype=float)
+    n_series, n_periods = y.shape
+    m = max(int(season_length), 1)
+    names = list(ETS_MODELS) if model == "ets" else [model]
+    if m <= 1:
+        names = [n for n in names if ETS_MODELS[n]["seasonal"] is None] or ["ses"]
+
+    n_valid = np.sum(~np.isnan(y), axis=1)
+    state: Dict[str, Any] = {
+        "level": np.zeros(n_series),
+        "slope": np.zeros(n_series),
+        "season": np.zeros((n_series, m)),
+        "alpha": np.zeros(n_series),
+        "beta": np.zeros(n_series),
+        "gamma": np.zeros(n_series),
+        "phi": np.ones(n_series),
+        "seasonal": np.full(n_series, "none", dtype=object),
+        "sse": np.full(n_series, np.inf),
+        "aic": np.full(n_series, np.inf),
+        "model": np.full(n_series, names[0], dtype=object),
+        "n_obs": n_valid.astype(np.int64),
+        "t": int(n_periods),
+        "season_length": m,
+    }
+    if n_series == 0 or n_periods == 0:
+        return state
+
+    for name in names:
+        spec = ETS_MODELS[name]
+        grid_size = int(np.prod([len(v) for v in spec["grid"].values()]))
+        width = m if spec["seasonal"] else 1
+        chunk = max(1, _ETS_CHUNK_ELEMENTS // (grid_size * width))
+        # liczba parametrów + stanów początkowych do AIC
+        k = len(spec["grid"]) + 1 + int(spec["trend"]) + (m - 1 if spec["seasonal"] else 0)
+        for lo in range(0, n_series, chunk):
+            sl = slice(lo, min(lo + chunk, n_series))
+            fit = _fit_chunk(y[sl], spec, m)
+            n = np.maximum(n_valid[sl], 1)
+            aic = n * np.log(fit["sse"] / n + 1e-12) + 2.0 * k
+            if spec["seasonal"]:
+                # bez 2 pełnych cykli model sezonowy jest tylko trendem z neutralnymi indeksami
+                aic = np.where(fit["has_season"], aic, np.inf)
+            better = aic < state["aic"][sl] if model == "ets" else np.ones(aic.shape, dtype=bool)
+            for field in _STATE_FIELDS:
+                if field in fit:
+                    state[field][sl][better] = fit[field][better]
+            state["aic"][sl][better] = aic[better]
+            state["model"][sl][better] = name
+    return state
+
+
+def ets_state_forecast(state: Dict[str, Any], periods: int) -> np.ndarray:
+    """Prognoza (S × periods) ze stanu – bez dotykania historii."""
+    n_series = state["level"].shape[0]
+    if n_series == 0:
+        return np.zeros((0, periods))
+    steps = np.arange(1, periods + 1)[None, :]
+    # Σ φ^i dla i = 1..h (φ = 1 → h)
+    cum_phi = np.cumsum(state["phi"][:, None] ** steps, axis=1)
+    fc = state["level"][:, None] + cum_phi * state["slope"][:, None]
+    m = state["season_length"]
+    phases = (state["t"] + steps - 1) % m
+    s_fc = state["season"][np.arange(n_series)[:, None], phases]
+    mul = (state["seasonal"] == "mul")[:, None]
+    fc = np.where(mul, fc * s_fc, fc + s_fc)
+    return np.maximum(fc, 0.0)
+
+
+def ets_update_state(state: Dict[str, Any], y_new: np.ndarray) -> Dict[str, Any]:
+    """
+    Przesuwa stan o nowe okresy (S × k, NaN = szereg jeszcze nie wystartował) –
+    te same rekursje co w dopasowaniu, z zamrożonymi parametrami. Koszt O(k) na szereg,
+    niezależnie od długości historii. Zwraca nowy dict (wejściowy stan zostaje bez zmian).
+    """
+    y_new = np.asarray(y_new, dtype=float)
+    new = {k: (np.array(v) if isinstance(v, np.ndarray) else v) for k, v in state.items()}
+    level, slope, season = new["level"], new["slope"], new["season"]
+    alpha, beta, gamma, phi = new["alpha"], new["beta"], new["gamma"], new["phi"]
+    mul = new["seasonal"] == "mul"
+    m = new["season_length"]
+    t = new["t"]
+
+    for j in range(y_new.shape[1]):
+        phase = (t + j) % m
+        v = ~np.isnan(y_new[:, j])
+        if not v.any():
+            continue
+        yt = np.where(v, y_new[:, j], 0.0)
+        s_t = season[:, phase]
+        damped = phi * slope
+        base = level + damped
+        yhat = np.where(mul, base * s_t, base + s_t)
+        err = yt - yhat
+        new["sse"] = new["sse"] + np.where(v, err * err, 0.0)
+
+        deseason = np.where(mul, np.divide(yt, s_t, out=np.array(base), where=s_t > 1e-9), yt - s_t)
+        new_level = alpha * deseason + (1.0 - alpha) * base
+        new_slope = beta * (new_level - level) + (1.0 - beta) * damped
+        ratio = np.where(
+            mul, np.divide(yt, new_level, out=np.array(s_t), where=new_level > 1e-9), yt - new_level
+        )
+        new_season = gamma * ratio + (1.0 - gamma) * s_t
+
+        season[:, phase] = np.where(v, new_season, s_t)
+        slope = np.where(v, new_slope, slope)
+        level = np.where(v, new_level, level)
+        new["n_obs"] = new["n_obs"] + v
+
+    new["level"], new["slope"] = level, slope
+    new["t"] = t + y_new.shape[1]
+    return new
+
+
+def ets_fit_forecast(
+    y: np.ndarray,
+    periods: int,
+    model: str = "ets",
+    season_length: int = 1,
+) -> Dict[str, np.ndarray]:
+    """
+    Dopasowanie + prognoza dla całej macierzy. Zwraca dict:
+    forecast (S × periods), sse, aic, model (nazwa modelu per szereg – istotne dla "ets").
+    """
+    state = ets_fit_state(y, model=model, season_length=season_length)
+    return {
+        "forecast": ets_state_forecast(state, periods),
+        "sse": state["sse"],
+        "aic": state["aic"],
+        "model": state["model"],
+    }
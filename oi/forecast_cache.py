@@ -0,0 +1,281 @@
+# oi/forecast_cache.py
+from __future__ import annotations
+"""
+Cache wyników prognoz adresowany treścią.
+
+Klucz = hash danych szeregu (daty + ilości po filtrze SKU / magazyn)
+        + parametry (sku, location, freq, method, periods).
+Zmiana danych sprzedażowych zmienia hash, więc stare wpisy same przestają
+trafiać (i wypadają z LRU) – nie trzeba niczego ręcznie unieważniać.
+
+Dwa poziomy:
+- pamięć: OrderedDict jako LRU o ograniczonej liczbie wpisów,
+- dysk (opcjonalnie): pliki pickle w katalogu z CONFIG.forecast_cache_dir,
+  przeżywają restart aplikacji.
+"""
+
+import hashlib
+import os
+import pickle
+import tempfile
+import weakref
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .config import CONFIG
+from .forecasting import forecast_sku
+
+# podbij, gdy zmieni się format wyniku forecast_sku – stare pliki na dysku przestaną pasować
+_CACHE_VERSION = "1"
+
+
+def series_data_digest(series_df: pd.DataFrame) -> str:
+    """Hash samych danych szeregu (daty + ilości) – zmienia się, gdy zmieni się sprzedaż."""
+    digest = hashlib.blake2b(digest_size=16)
+    if CONFIG.date_col in series_df.columns:
+        dates = pd.to_datetime(series_df[CONFIG.date_col], errors="coerce")
+        digest.update(np.ascontiguousarray(dates.array.asi8).tobytes())
+    qty = pd.to_numeric(series_df[CONFIG.qty_col], errors="coerce").to_numpy(dtype=float)
+    digest.update(np.ascontiguousarray(qty).tobytes())
+    return digest.hexdigest()
+
+
+def forecast_cache_key(
+    data_digest: str,
+    sku: Any,
+    location: Optional[Any],
+    freq: str,
+    method: str,
+    periods: int,
+    quantiles: Optional[Sequence[float]] = None,
+    n_paths: int = 0,
+) -> str:
+    """Klucz wpisu: hash danych szeregu + parametry prognozy (hex, 32 znaki)."""
+    params: Tuple[Any, ...] = (_CACHE_VERSION, data_digest, str(sku), None if location is None else str(location),
+                               freq, method, int(periods))
+    # rozkład prognozy tylko gdy o niego proszono – klucze samych prognoz punktowych bez zmian
+    if quantiles or n_paths:
+        params += (tuple(float(q) for q in quantiles or ()), int(n_paths))
+    return hashlib.blake2b(repr(params).encode("utf-8"), digest_size=16).hexdigest()
+
+
+class ForecastCache:
+    """
+    LRU w pamięci + opcjonalny katalog na dysku.
+
+    Liczniki: hits (pamięć), disk_hits (dysk → podniesione do pamięci), misses.
+    Zwracamy kopie serii, żeby UI nie zmodyfikował przypadkiem wpisu w cache.
+
+    Żeby trafienie nie kosztowało filtrowania całej ramki, dla kilku ostatnio
+    widzianych ramek pamiętamy indeks grup (SKU / SKU × magazyn → wiersze) i hashe
+    szeregów. Ramki traktujemy jak niemutowalne (tak jak cache Streamlita) – po zmianie
+    danych in-place wywołaj forget_frame(df) albo podaj nową ramkę.
+    """
+
+    # ile ramek trzymamy w indeksie naraz
+    _MAX_FRAMES = 4
+
+    def __init__(self, max_entries: int = 256, disk_dir: Optional[str] = None) -> None:
+        self.max_entries = max(int(max_entries), 1)
+        self.disk_dir = disk_dir or None
+        self._mem: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        # id(ramki) → (weakref, indeksy grup, hashe szeregów)
+        self._frames: "OrderedDict[int, Tuple[Any, Dict[str, Any], Dict[Any, str]]]" = OrderedDict()
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+
+    # ── dostęp
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        value = self._mem.get(key)
+        if value is not None:
+            self._mem.move_to_end(key)
+            self.hits += 1
+            return _copy_result(value)
+
+        value = self._read_disk(key)
+        if value is not None:
+            self.disk_hits += 1
+            self._remember(key, value)
+            return _copy_result(value)
+
+        self.misses += 1
+        return None
+
+    def put(self, key: str, value: Dict[str, Any]) -> None:
+        value = _copy_result(value)
+        self._remember(key, value)
+        self._write_disk(key, value)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._mem or (self._disk_path(key) is not None and os.path.exists(self._disk_path(key)))
+
+    def __len__(self) -> int:
+        return len(self._mem)
+
+    def stats(self) -> Dict[str, Any]:
+        """Liczniki do pokazania w UI."""
+        lookups = self.hits + self.disk_hits + self.misses
+        return {
+            "entries": len(self._mem),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+            "disk_dir": self.disk_dir,
+        }
+
+    def clear(self, disk: bool = False) -> None:
+        """Czyści pamięć (i opcjonalnie pliki na dysku) oraz zeruje liczniki."""
+        self._mem.clear()
+        self.hits = self.disk_hits = self.misses = 0
+        if disk and self.disk_dir:
+            for name in os.listdir(self.disk_dir):
+                if name.endswith(".pkl"):
+                    try:
+                        os.remove(os.path.join(self.disk_dir, name))
+                    except OSError:
+                        pass
+
+    # ── hash szeregu z indeksem ramki
+
+    def series_digest(self, df: pd.DataFrame, sku: Any, location: Optional[Any] = None) -> str:
+        """Hash danych szeregu SKU (× magazyn) z ramki; powtórka dla tej samej ramki to lookup w dict."""
+        _, groups, digests = self._frame_entry(df)
+        by_location = bool(location) and CONFIG.location_col in df.columns
+        dkey = (sku, location if by_location else None)
+        digest = digests.get(dkey)
+        if digest is not None:
+            return digest
+
+        mode = "sku_loc" if by_location else "sku"
+        if mode not in groups:
+            by = [CONFIG.sku_col, CONFIG.location_col] if by_location else CONFIG.sku_col
+            groups[mode] = df.groupby(by, sort=False).indices
+        positions = groups[mode].get((sku, location) if by_location else sku, np.empty(0, dtype=np.int64))
+        cols = [c for c in (CONFIG.date_col, CONFIG.qty_col) if c in df.columns]
+        digest = series_data_digest(df.iloc[positions][cols])
+        digests[dkey] = digest
+        return digest
+
+    def forget_frame(self, df: pd.DataFrame) -> None:
+        """Usuwa indeks ramki (np. po modyfikacji in-place)."""
+        self._frames.pop(id(df), None)
+
+    def _frame_entry(self, df: pd.DataFrame) -> Tuple[Any, Dict[str, Any], Dict[Any, str]]:
+        entry = self._frames.get(id(df))
+        if entry is not None and entry[0]() is df:
+            self._frames.move_to_end(id(df))
+            return entry
+        entry = (weakref.ref(df), {}, {})
+        self._frames[id(df)] = entry
+        while len(self._frames) > self._MAX_FRAMES:
+            self._frames.popitem(last=False)
+        return entry
+
+    # ── wnętrzności
+
+    def _remember(self, key: str, value: Dict[str, Any]) -> None:
+        self._mem[key] = value
+        self._mem.move_to_end(key)
+        while len(self._mem) > self.max_entries:
+            self._mem.popitem(last=False)
+
+    def _disk_path(self, key: str) -> Optional[str]:
+        if not self.disk_dir:
+            return None
+        return os.path.join(self.disk_dir, f"{key}.pkl")
+
+    def _read_disk(self, key: str) -> Optional[Dict[str, Any]]:
+        path = self._disk_path(key)
+        if path is None or not os.path.exists(path):
+            return None
+        try:
+            with open(path, "rb") as fh:
+                return pickle.load(fh)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError):
+            # uszkodzony / niekompatybilny plik traktujemy jak brak wpisu
+            return None
+
+    def _write_disk(self, key: str, value: Dict[str, Any]) -> None:
+        path = self._disk_path(key)
+        if path is None:
+            return
+        # zapis atomowy: plik tymczasowy + rename, żeby równoległy odczyt nie trafił na połówkę
+        try:
+            fd, tmp = tempfile.mkstemp(dir=self.disk_dir, suffix=".tmp")
+            with os.fdopen(fd, "wb") as fh:
+                pickle.dump(value, fh, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, path)
+        except OSError:
+            pass
+
+
+def _copy_result(res: Dict[str, Any]) -> Dict[str, Any]:
+    out = dict(res)
+    for k in ("history", "forecast", "quantiles", "paths"):
+        if isinstance(out.get(k), (pd.Series, pd.DataFrame, np.ndarray)):
+            out[k] = out[k].copy()
+    if isinstance(out.get("meta"), dict):
+        out["meta"] = dict(out["meta"])
+    return out
+
+
+# ─────────────────────────────────────────────────────────────
+# Globalny cache + wrapper na forecast_sku
+# ─────────────────────────────────────────────────────────────
+
+_DEFAULT_CACHE: Optional[ForecastCache] = None
+
+
+def get_forecast_cache() -> ForecastCache:
+    """Wspólny cache procesu (rozmiar i katalog z CONFIG)."""
+    global _DEFAULT_CACHE
+    if _DEFAULT_CACHE is None:
+        _DEFAULT_CACHE = ForecastCache(
+            max_entries=CONFIG.forecast_cache_size,
+            disk_dir=CONFIG.forecast_cache_dir or None,
+        )
+    return _DEFAULT_CACHE
+
+
+def cached_forecast_sku(
+    df: pd.DataFrame,
+    sku: str,
+    location: Optional[str] = None,
+    periods: int = 8,
+    freq: str = "W",
+    method: str = "ma",
+    cache: Optional[ForecastCache] = None,
+    quantiles: Optional[Sequence[float]] = None,
+    n_paths: int = 0,
+) -> Dict[str, Any]:
+    """
+    forecast_sku z cache. Ten sam wynik co forecast_sku, plus meta["cache"] = "hit" / "miss".
+    Puste / błędne wyniki nie są cache'owane.
+    """
+    if cache is None:
+        cache = get_forecast_cache()
+
+    digest = cache.series_digest(df, sku, location)
+    key = forecast_cache_key(digest, sku, location, freq, method, periods, quantiles, n_paths)
+    res = cache.get(key)
+    if res is not None:
+        res["meta"]["cache"] = "hit"
+        return res
+
+    res = forecast_sku(
+        df, sku=sku, location=location, periods=periods, freq=freq, method=method,
+        quantiles=quantiles, n_paths=n_paths,
+    )
+    if res.get("meta", {}).get("status") == "ok":
+        cache.put(key, res)
+    res["meta"]["cache"] = "miss"
+    return res
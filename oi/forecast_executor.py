@@ -0,0 +1,267 @@
+# oi/forecast_executor.py
+from __future__ import annotations
+"""
+Równoległe prognozy dla ciężkich metod (np. Prophet) – pula procesów.
+
+Metody wektorowe (naive / ma / level_trend) liczy forecasting.forecast_all w ułamku sekundy.
+Modele typu Prophet trzeba dopasować osobno dla każdego szeregu, więc:
+- szeregi rozdzielamy na paczki (wiersze macierzy z pivot_sales_matrix) i wysyłamy do workerów,
+- każdy worker raz, na starcie, importuje model i robi rozgrzewkowy fit
+  (import + załadowanie modelu Stan nie powtarzają się per zadanie),
+- każdy szereg ma limit czasu – po przekroczeniu albo przy błędzie bierzemy "ma",
+- postęp raportujemy callbackiem (np. do st.progress w UI).
+"""
+
+import logging
+import signal
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .config import _resolve_n_jobs
+from .forecasting import (
+    BATCH_FORECASTERS,
+    FORECASTERS,
+    _batch_result,
+    add_batch_quantiles,
+    forecast_all,
+    moving_average_forecast,
+)
+from .preprocessing import pivot_sales_matrix, series_key_cols
+
+
+# callback postępu: (ile szeregów gotowych, ile wszystkich)
+ProgressCallback = Callable[[int, int], None]
+
+# domyślne: ile szeregów na jedno zadanie i ile sekund maksymalnie na szereg
+DEFAULT_CHUNK_SIZE = 25
+DEFAULT_SERIES_TIMEOUT_S = 30.0
+
+# stan procesu workera – ustawiany raz w initializerze
+_WORKER_STATE: Dict[str, Any] = {}
+
+
+class _SeriesTimeout(Exception):
+    """Przekroczony limit czasu dopasowania jednego szeregu."""
+
+
+# ─────────────────────────────────────────────────────────────
+# Worker
+# ─────────────────────────────────────────────────────────────
+
+def _warm_up_worker(method: str) -> None:
+    """
+    Initializer workera: import + jeden malutki fit, żeby kolejne zadania
+    nie płaciły za ładowanie biblioteki i modelu. Nieudana rozgrzewka nie zabija puli –
+    zadania dostaną wtedy fallback "ma".
+    """
+    _WORKER_STATE["method"] = method
+    _WORKER_STATE["ready"] = False
+    _WORKER_STATE["warmup_error"] = None
+    # Prophet / cmdstanpy gadają na INFO przy każdym fit
+    for name in ("prophet", "cmdstanpy"):
+        logging.getLogger(name).setLevel(logging.WARNING)
+    forecaster = FORECASTERS.get(method)
+    if forecaster is None:
+        _WORKER_STATE["warmup_error"] = f"Nieznana metoda: {method}"
+        return
+    try:
+        idx = pd.date_range("2024-01-07", periods=12, freq="W")
+        forecaster(pd.Series(np.arange(12, dtype=float), index=idx), periods=1)
+        _WORKER_STATE["ready"] = True
+    except Exception as e:  # noqa: BLE001 – dowolny błąd modelu = fallback
+        _WORKER_STATE["warmup_error"] = repr(e)
+
+
+def _timeouts_supported() -> bool:
+    """SIGALRM jest tylko na Unixie i tylko w głównym wątku procesu."""
+    return hasattr(signal, "SIGALRM") and threading.current_thread() is threading.main_thread()
+
+
+def _raise_timeout(signum: int, frame: Any) -> None:
+    raise _SeriesTimeout()
+
+
+def _forecast_one(
+    series: pd.Series,
+    periods: int,
+    method: str,
+    timeout_s: Optional[float],
+) -> Tuple[np.ndarray, str, str]:
+    """Jeden szereg z limitem czasu. Zwraca (prognoza, użyta metoda, status)."""
+    forecaster = FORECASTERS.get(method)
+    if forecaster is None or not _WORKER_STATE.get("ready", True):
+        fc = moving_average_forecast(series, periods)
+        return fc.to_numpy(dtype=float), "ma", "fallback_unavailable"
+
+    use_alarm = bool(timeout_s) and _timeouts_supported()
+    if use_alarm:
+        previous = signal.signal(signal.SIGALRM, _raise_timeout)
+        signal.setitimer(signal.ITIMER_REAL, float(timeout_s))
+    try:
+        fc = forecaster(series, periods=periods)
+        return fc.to_numpy(dtype=float), method, "ok"
+    except _SeriesTimeout:
+        status = "fallback_timeout"
+    except Exception:  # noqa: BLE001 – błąd modelu na jednym SKU nie psuje całej paczki
+        status = "fallback_error"
+    finally:
+        if use_alarm:
+            signal.setitimer(signal.ITIMER_REAL, 0.0)
+            signal.signal(signal.SIGALRM, previous)
+    fc = moving_average_forecast(series, periods)
+    return fc.to_numpy(dtype=float), "ma", status
+
+
+def _forecast_chunk(
+    rows: np.ndarray,
+    values: np.ndarray,
+    first: np.ndarray,
+    index: pd.DatetimeIndex,
+    periods: int,
+    method: str,
+    timeout_s: Optional[float],
+) -> Tuple[np.ndarray, np.ndarray, List[str], List[str]]:
+    """
+    Zadanie dla workera: paczka wierszy macierzy historii.
+    Każdy wiersz zamieniamy z powrotem na szereg od pierwszej sprzedaży.
+    """
+    fc = np.empty((rows.size, periods))
+    methods: List[str] = []
+    statuses: List[str] = []
+    for i in range(rows.size):
+        start = int(first[i])
+        series = pd.Series(values[i, start:], index=index[start:])
+        fc[i], used, status = _forecast_one(series, periods, method, timeout_s)
+        methods.append(used)
+        statuses.append(status)
+    return rows, fc, methods, statuses
+
+
+# ─────────────────────────────────────────────────────────────
+# API
+# ─────────────────────────────────────────────────────────────
+
+def forecast_all_parallel(
+    df: pd.DataFrame,
+    periods: int = 8,
+    freq: str = "W",
+    method: str = "prophet",
+    n_jobs: Optional[int] = -1,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    timeout_s: Optional[float] = DEFAULT_SERIES_TIMEOUT_S,
+    progress_callback: Optional[ProgressCallback] = None,
+    quantiles: Optional[Sequence[float]] = None,
+) -> Dict[str, Any]:
+    """
+    Jak forecasting.forecast_all, ale dla metod bez wersji wektorowej – w puli procesów.
+
+    - metody z BATCH_FORECASTERS liczymy od razu wektorowo (pula nic by nie dała),
+    - n_jobs: -1 = wszystkie rdzenie, 1 = w bieżącym procesie (bez puli),
+    - chunk_size: ile szeregów w jednym zadaniu (mniej narzutu na serializację),
+    - timeout_s: limit na jeden szereg; po nim / przy błędzie → prognoza "ma"
+      (limit działa na Unixie; w Windows i w wątkach pobocznych jest pomijany),
+    - progress_callback(done, total) wołany po każdej skończonej paczce,
+    - quantiles: kolumny kwantyli jak w forecast_all (ciężkie metody – z profilem błędów "ma").
+
+    Wynik ma ten sam kształt co forecast_all; w meta "method" to metoda faktycznie
+    użyta dla szeregu, a "status" mówi, czy był fallback (fallback_timeout / fallback_error / ...).
+    mape_last nie liczymy – wymagałoby drugiego dopasowania ciężkiego modelu per szereg.
+    """
+    if method in BATCH_FORECASTERS or method not in FORECASTERS:
+        res = forecast_all(df, periods=periods, freq=freq, method=method, quantiles=quantiles)
+        if progress_callback is not None:
+            progress_callback(len(res["meta"]), len(res["meta"]))
+        return res
+
+    pivot = pivot_sales_matrix(df, freq=freq)
+    keys = pivot["keys"]
+    key_cols = list(keys.columns) if len(keys.columns) else series_key_cols(df)
+    values = pivot["values"]
+    first = pivot["first_period"]
+    n_series = len(keys)
+    if n_series == 0:
+        return _batch_result(pivot, key_cols, np.empty((0, periods)), freq, method)
+
+    fc, methods, statuses, info = forecast_rows(
+        values, first, pivot["periods"], periods, method,
+        n_jobs=n_jobs, chunk_size=chunk_size, timeout_s=timeout_s, progress_callback=progress_callback,
+    )
+    res = _batch_result(pivot, key_cols, fc, freq, method, status=statuses, methods_used=methods)
+    res["run_info"] = {"requested_method": method, **info}
+    if quantiles:
+        add_batch_quantiles(res, quantiles)
+    return res
+
+
+def forecast_rows(
+    values: np.ndarray,
+    first: np.ndarray,
+    index: pd.DatetimeIndex,
+    periods: int,
+    method: str,
+    n_jobs: Optional[int] = -1,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    timeout_s: Optional[float] = DEFAULT_SERIES_TIMEOUT_S,
+    progress_callback: Optional[ProgressCallback] = None,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, Dict[str, Any]]:
+    """
+    Silnik forecast_all_parallel na samych tablicach: wiersze macierzy historii
+    (+ indeks pierwszego okresu każdego wiersza) → (prognozy, użyte metody, statusy, info).
+    Przydaje się, gdy ciężki model liczymy tylko dla wybranych szeregów (np. tryb "auto").
+    """
+    n_series = values.shape[0]
+    fc = np.empty((n_series, periods))
+    methods = np.empty(n_series, dtype=object)
+    statuses = np.empty(n_series, dtype=object)
+    if n_series == 0:
+        return fc, methods, statuses, {"n_jobs": 0, "chunks": 0, "elapsed_s": 0.0, "fallbacks": 0}
+
+    chunk_size = max(int(chunk_size), 1)
+    tasks = [
+        (rows, values[rows], first[rows])
+        for rows in (np.arange(lo, min(lo + chunk_size, n_series)) for lo in range(0, n_series, chunk_size))
+    ]
+    done = 0
+
+    def collect(result: Tuple[np.ndarray, np.ndarray, List[str], List[str]]) -> None:
+        nonlocal done
+        rows, chunk_fc, chunk_methods, chunk_statuses = result
+        fc[rows] = chunk_fc
+        methods[rows] = chunk_methods
+        statuses[rows] = chunk_statuses
+        done += rows.size
+        if progress_callback is not None:
+            progress_callback(done, n_series)
+
+    workers = _resolve_n_jobs(n_jobs, len(tasks))
+    t0 = time.perf_counter()
+    if workers <= 1:
+        _warm_up_worker(method)
+        for rows, vals, fst in tasks:
+            collect(_forecast_chunk(rows, vals, fst, index, periods, method, timeout_s))
+    else:
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_warm_up_worker,
+            initargs=(method,),
+        ) as pool:
+            futures = [
+                pool.submit(_forecast_chunk, rows, vals, fst, index, periods, method, timeout_s)
+                for rows, vals, fst in tasks
+            ]
+            for fut in as_completed(futures):
+                collect(fut.result())
+
+    info = {
+        "n_jobs": workers,
+        "chunks": len(tasks),
+        "elapsed_s": time.perf_counter() - t0,
+        "fallbacks": int(np.sum(statuses != "ok")),
+    }
+    return fc, methods, statuses, info
+
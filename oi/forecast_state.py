@@ -0,0 +1,310 @@
+# oi/forecast_state.py
+from __future__ import annotations
+"""
+Stan prognoz z przyrostową aktualizacją.
+
+forecast_all liczy wszystko od zera z pełnej historii, a cotygodniowe odświeżenie
+dokłada tylko jeden okres na szereg. Tutaj trzymamy "stan" metody dla każdego szeregu:
+- naive / ma / level_trend – bufor cykliczny ostatnich BATCH_LOOKBACK okresów
+  (te metody i tak nie czytają nic starszego, więc prognoza jest identyczna jak z pełnej historii),
+- rodzina ETS – poziom, trend, indeksy sezonowe i dobrane parametry wygładzania (oi/ets.py).
+
+update(...) przesuwa stan o nowe okresy w O(1) na szereg i okres – bez ponownego
+dopasowania, więc koszt zależy od ilości nowych danych, nie od długości historii.
+W ETS parametry (α, β, γ, φ) i wybór modelu są zamrożone od ostatniego fit-u –
+co jakiś czas (np. raz na kwartał, patrz periods_since_fit) warto zrobić pełne
+fit_forecast_state, żeby parametry nadążały za zmianą charakteru sprzedaży.
+
+Stan można zapisać na dysk (save / load) i odświeżać go między sesjami aplikacji.
+"""
+
+import os
+import pickle
+import tempfile
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from .config import CONFIG
+from .ets import ETS_MODELS, ets_fit_state, ets_state_forecast, ets_update_state, season_length_for
+from .forecasting import BATCH_FORECASTERS, BATCH_LOOKBACK, _batch_result, forecast_matrix
+from .preprocessing import period_labels, pivot_sales_matrix, series_key_cols
+
+# podbij, gdy zmieni się format stanu – stare pliki przestaną się wczytywać
+_STATE_VERSION = 1
+
+# metody z rekursją ETS (stan = poziom / trend / sezonowość)
+_ETS_METHODS = set(ETS_MODELS) | {"ets"}
+
+
+def stateful_methods() -> List[str]:
+    """Metody, dla których da się trzymać stan i aktualizować go przyrostowo."""
+    lookback = [m for m, lb in BATCH_LOOKBACK.items() if lb is not None and m in BATCH_FORECASTERS]
+    return lookback + [m for m in BATCH_FORECASTERS if m in _ETS_METHODS]
+
+
+# ─────────────────────────────────────────────────────────────
+# Stan per metoda: init z macierzy historii / przesunięcie / prognoza
+# ─────────────────────────────────────────────────────────────
+
+def _tail_window(values: np.ndarray, width: int) -> np.ndarray:
+    """Ostatnie `width` kolumn, z NaN z lewej, gdy historia jest krótsza."""
+    out = np.full((values.shape[0], width), np.nan)
+    k = min(width, values.shape[1])
+    if k:
+        out[:, width - k:] = values[:, -k:]
+    return out
+
+
+def _init_arrays(method: str, values: np.ndarray, season_length: int) -> Dict[str, Any]:
+    if method in _ETS_METHODS:
+        return ets_fit_state(values, model=method, season_length=season_length)
+    return {"buffer": _tail_window(values, int(BATCH_LOOKBACK[method])), "pos": 0}
+
+
+def _advance_arrays(method: str, arrays: Dict[str, Any], new_values: np.ndarray) -> Dict[str, Any]:
+    if method in _ETS_METHODS:
+        return ets_update_state(arrays, new_values)
+    buffer = np.array(arrays["buffer"])
+    width = buffer.shape[1]
+    k = new_values.shape[1]
+    if k >= width:
+        return {"buffer": _tail_window(new_values, width), "pos": 0}
+    # bufor cykliczny: pos wskazuje najstarszą kolumnę (wspólny dla wszystkich szeregów)
+    cols = (arrays["pos"] + np.arange(k)) % width
+    buffer[:, cols] = new_values
+    return {"buffer": buffer, "pos": int((arrays["pos"] + k) % width)}
+
+
+def _forecast_arrays(method: str, arrays: Dict[str, Any], periods: int) -> np.ndarray:
+    if method in _ETS_METHODS:
+        return ets_state_forecast(arrays, periods)
+    ordered = np.roll(arrays["buffer"], -arrays["pos"], axis=1)
+    return forecast_matrix(ordered, periods, method)
+
+
+def _append_rows(method: str, arrays: Dict[str, Any], extra: Dict[str, Any]) -> Dict[str, Any]:
+    """Dokleja stany nowych szeregów (policzone na samym bloku nowych okresów) do istniejących."""
+    if method not in _ETS_METHODS:
+        # ring buffer nowych wierszy układamy tak jak istniejący (ta sama pozycja startu)
+        buffer = np.roll(extra["buffer"], arrays["pos"], axis=1)
+        return {"buffer": np.concatenate([arrays["buffer"], buffer]), "pos": arrays["pos"]}
+
+    m = arrays["season_length"]
+    # fazy nowych szeregów liczone są od początku bloku – przesuwamy je na wspólny kalendarz
+    shift = (arrays["t"] - extra["t"]) % m
+    out = dict(arrays)
+    for field, value in arrays.items():
+        if not isinstance(value, np.ndarray):
+            continue
+        other = extra[field]
+        if field == "season":
+            other = np.roll(other, shift, axis=1)
+        out[field] = np.concatenate([value, other])
+    return out
+
+
+# ─────────────────────────────────────────────────────────────
+# API
+# ─────────────────────────────────────────────────────────────
+
+class ForecastState:
+    """
+    Stan metody prognozy dla wszystkich szeregów SKU (× magazyn).
+
+    Atrybuty:
+    - method, freq, season_length,
+    - keys – DataFrame kluczy (wiersz i = szereg i, jak w pivot_sales_matrix),
+    - last_period – ostatni okres, który stan już widział (pd.Period),
+    - n_history – liczba okresów historii per szereg,
+    - periods_since_fit – ile okresów dołożono przyrostowo od ostatniego pełnego fit-u.
+    """
+
+    def __init__(
+        self,
+        method: str,
+        freq: str,
+        keys: pd.DataFrame,
+        last_period: pd.Period,
+        n_history: np.ndarray,
+        arrays: Dict[str, Any],
+        periods_since_fit: int = 0,
+    ) -> None:
+        self.method = method
+        self.freq = freq
+        self.season_length = season_length_for(freq)
+        self.keys = keys.reset_index(drop=True)
+        self.last_period = last_period
+        self.n_history = np.asarray(n_history, dtype=np.int64)
+        self.arrays = arrays
+        self.periods_since_fit = int(periods_since_fit)
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    # ── prognoza
+
+    def forecast(self, periods: int = 8) -> np.ndarray:
+        """Macierz prognoz (szeregi × periods) od okresu po last_period."""
+        if len(self.keys) == 0:
+            return np.empty((0, periods))
+        return _forecast_arrays(self.method, self.arrays, periods)
+
+    def result(self, periods: int = 8) -> Dict[str, Any]:
+        """
+        Wynik w kształcie forecasting.forecast_all ("forecast" long + "meta").
+        "history" zawiera tylko klucze i ostatni okres – pełnej historii stan nie trzyma.
+        """
+        pivot = {
+            "keys": self.keys,
+            "periods": period_labels(pd.period_range(start=self.last_period, periods=1)),
+            "values": np.empty((len(self.keys), 0)),
+            "first_period": np.zeros(len(self.keys), dtype=np.int64),
+        }
+        key_cols = list(self.keys.columns)
+        return _batch_result(
+            pivot, key_cols, self.forecast(periods), self.freq, self.method, n_history=self.n_history
+        )
+
+    # ── aktualizacja
+
+    def update(self, new_values: np.ndarray) -> Dict[str, int]:
+        """
+        Dokłada nowe okresy: macierz (len(state) × k) dla okresów last_period+1 … last_period+k,
+        wiersze w kolejności self.keys (0 = brak sprzedaży, NaN = szereg jeszcze nie wystartował).
+        """
+        new_values = np.asarray(new_values, dtype=float)
+        if new_values.ndim != 2 or new_values.shape[0] != len(self.keys):
+            raise ValueError(
+                f"Oczekiwano macierzy ({len(self.keys)} × k), a jest {new_values.shape}."
+            )
+        k = new_values.shape[1]
+        if k:
+            self.arrays = _advance_arrays(self.method, self.arrays, new_values)
+            self.n_history = self.n_history + np.sum(~np.isnan(new_values), axis=1)
+            self.last_period = self.last_period + k
+            self.periods_since_fit += k
+        return {"new_periods": k, "new_series": 0, "ignored_rows": 0}
+
+    def update_from_sales(self, agg: pd.DataFrame) -> Dict[str, int]:
+        """
+        Dokłada nowe okresy z ramki aggregate_sales (może to być cała historia albo tylko przyrost –
+        wiersze z okresów, które stan już widział, są pomijane).
+
+        - szereg bez sprzedaży w nowych okresach dostaje zera,
+        - nowy szereg (SKU, którego stan jeszcze nie znał) dostaje własny stan policzony
+          na nowych okresach – jego cała historia i tak mieści się w przyroście.
+        Zwraca podsumowanie: new_periods, new_series, ignored_rows.
+        """
+        summary = {"new_periods": 0, "new_series": 0, "ignored_rows": 0}
+        if agg is None or agg.empty:
+            return summary
+        key_cols = series_key_cols(agg)
+        if key_cols != list(self.keys.columns):
+            raise ValueError(
+                f"Klucze szeregów się nie zgadzają: stan {list(self.keys.columns)}, dane {key_cols}."
+            )
+
+        dates = pd.to_datetime(agg[CONFIG.date_col], errors="coerce")
+        fresh = (dates.dt.to_period(self.freq) > self.last_period).to_numpy()
+        summary["ignored_rows"] = int((~fresh).sum())
+        if not fresh.any():
+            return summary
+
+        pivot = pivot_sales_matrix(agg.loc[fresh], freq=self.freq)
+        block_periods = pd.DatetimeIndex(pivot["periods"]).to_period(self.freq)
+        # okresy od last_period+1; luka przed pierwszym nowym okresem = brak sprzedaży
+        gap = int((block_periods[0] - self.last_period).n) - 1
+        n_new = gap + len(block_periods)
+        block = np.concatenate([np.full((len(pivot["keys"]), gap), np.nan), pivot["values"]], axis=1)
+
+        known = pd.MultiIndex.from_frame(self.keys)
+        rows = known.get_indexer(pd.MultiIndex.from_frame(pivot["keys"][key_cols]))
+        is_new = rows < 0
+
+        # istniejące szeregi już wystartowały – brak danych w przyroście to 0, nie NaN
+        existing = np.zeros((len(self.keys), n_new))
+        existing[rows[~is_new]] = np.nan_to_num(block[~is_new])
+
+        new_keys = pivot["keys"].loc[is_new, key_cols]
+        if is_new.any() and self.method not in _ETS_METHODS:
+            # bufor z NaN = szereg "bez historii"; update wpisze mu okresy od pierwszej sprzedaży
+            empty = {"buffer": np.full((int(is_new.sum()), self.arrays["buffer"].shape[1]), np.nan), "pos": 0}
+            self.arrays = _append_rows(self.method, self.arrays, empty)
+            self.keys = pd.concat([self.keys, new_keys], ignore_index=True)
+            self.n_history = np.concatenate([self.n_history, np.zeros(len(new_keys), dtype=np.int64)])
+            existing = np.concatenate([existing, block[is_new]])
+            self.update(existing)
+        else:
+            self.update(existing)
+            if is_new.any():
+                extra = _init_arrays(self.method, block[is_new], self.season_length)
+                self.arrays = _append_rows(self.method, self.arrays, extra)
+                self.keys = pd.concat([self.keys, new_keys], ignore_index=True)
+                self.n_history = np.concatenate(
+                    [self.n_history, np.sum(~np.isnan(block[is_new]), axis=1).astype(np.int64)]
+                )
+
+        summary["new_periods"] = n_new
+        summary["new_series"] = int(is_new.sum())
+        return summary
+
+    # ── zapis / odczyt
+
+    def save(self, path: str) -> None:
+        """Zapis atomowy (plik tymczasowy + rename) do pliku pickle."""
+        payload = {
+            "version": _STATE_VERSION,
+            "method": self.method,
+            "freq": self.freq,
+            "keys": self.keys,
+            "last_period": self.last_period,
+            "n_history": self.n_history,
+            "arrays": self.arrays,
+            "periods_since_fit": self.periods_since_fit,
+        }
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        with os.fdopen(fd, "wb") as fh:
+            pickle.dump(payload, fh, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str) -> "ForecastState":
+        with open(path, "rb") as fh:
+            payload = pickle.load(fh)
+        if not isinstance(payload, dict) or payload.get("version") != _STATE_VERSION:
+            raise ValueError(f"Nieobsługiwany format stanu prognoz: {path}")
+        payload.pop("version")
+        return cls(**payload)
+
+
+def fit_forecast_state(
+    agg: pd.DataFrame,
+    freq: str = "W",
+    method: str = "ma",
+    values: Optional[Dict[str, Any]] = None,
+) -> ForecastState:
+    """
+    Pełne dopasowanie stanu na całej historii z ramki aggregate_sales.
+    values – opcjonalnie gotowy wynik pivot_sales_matrix (żeby nie pivotować drugi raz).
+    Metoda bez stanu (np. prophet, auto) → ValueError; lista: stateful_methods().
+    """
+    if method not in stateful_methods():
+        raise ValueError(
+            f"Metoda {method!r} nie ma stanu przyrostowego. Dostępne: {', '.join(stateful_methods())}."
+        )
+    pivot = values if values is not None else pivot_sales_matrix(agg, freq=freq)
+    keys = pivot["keys"]
+    if len(keys.columns) == 0:
+        keys = pd.DataFrame(columns=series_key_cols(agg))
+    season_length = season_length_for(freq)
+    y = pivot["values"]
+    if len(pivot["periods"]):
+        last_period = pd.DatetimeIndex(pivot["periods"][-1:]).to_period(freq)[0]
+    else:
+        last_period = pd.Period(pd.Timestamp.today(), freq=freq) - 1
+    arrays = _init_arrays(method, y, season_length)
+    return ForecastState(method, freq, keys, last_period, np.sum(~np.isnan(y), axis=1), arrays)
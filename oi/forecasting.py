@@ -9,16 +9,30 @@ Założenia:
 - można łatwo podmienić metodę prognozy (rejestr),
 - zwracamy nie tylko serię prognozy, ale też meta-info (ile danych, jakie freq, jaka metoda),
 - normalizujemy szereg do żądanej częstotliwości (D/W/M),
-- wynik ma się łatwo łączyć z modułem optymalizacji.
+- wynik ma się łatwo łączyć z modułem optymalizacji,
+- cały asortyment naraz: forecast_all liczy wszystkie szeregi jako operacje na macierzy.
 """
 
-from typing import Dict, Any, Callable, Optional, Literal
+import importlib.util
+from functools import partial
+from typing import Dict, Any, Callable, List, Optional, Literal, Sequence
 from datetime import timedelta
 
 import numpy as np
 import pandas as pd
 
 from .config import CONFIG
+from .ets import ETS_MODELS, ets_fit_forecast, season_length_for
+from .intermittent import (
+    INTERMITTENT_METHODS,
+    drop_last_period,
+    intermittent_forecast_matrix,
+    intermittent_forecast_sparse,
+    sparse_demand,
+    sparse_from_series,
+    sparse_period_labels,
+)
+from .preprocessing import period_labels, pivot_sales_matrix, series_key_cols
 
 
 # ─────────────────────────────────────────────────────────────
@@ -68,6 +82,36 @@ def level_trend_forecast(series: pd.Series, periods: int) -> pd.Series:
     return pd.Series(fc_vals, dtype="float")
 
 
+def prophet_available() -> bool:
+    """Czy pakiet prophet jest zainstalowany (bez importowania go – import trwa kilka sekund)."""
+    return importlib.util.find_spec("prophet") is not None
+
+
+def prophet_forecast(series: pd.Series, periods: int) -> pd.Series:
+    """
+    Prognoza Prophetem (sezonowość roczna/tygodniowa wg danych).
+    Potrzebuje indeksu datetime – tak jak szereg z _ensure_datetime_index.
+    Prophet jest ciężki (setki ms na szereg), więc dla wielu SKU używaj
+    forecast_executor.forecast_all_parallel, a nie pętli w wątku UI.
+    """
+    if len(series) < 3:
+        return moving_average_forecast(series, periods)
+
+    from prophet import Prophet  # import leniwy – pakiet opcjonalny
+
+    freq = series.index.freqstr if series.index.freq is not None else pd.infer_freq(series.index)
+    hist = pd.DataFrame({"ds": series.index, "y": series.to_numpy(dtype=float)})
+    model = Prophet(
+        yearly_seasonality="auto",
+        weekly_seasonality=bool(freq and freq.upper().startswith("D")),
+        daily_seasonality=False,
+    )
+    model.fit(hist)
+    future = model.make_future_dataframe(periods=periods, freq=freq or "W", include_history=False)
+    yhat = model.predict(future)["yhat"].to_numpy()
+    return pd.Series(np.maximum(yhat, 0.0), dtype="float")
+
+
 # ─────────────────────────────────────────────────────────────
 # Rejestr metod – łatwo dodać Prophet / darts / neuralforecast
 # ─────────────────────────────────────────────────────────────
@@ -76,19 +120,34 @@ FORECASTERS: Dict[str, Callable[..., pd.Series]] = {
     "naive": naive_forecast,
     "ma": moving_average_forecast,
     "level_trend": level_trend_forecast,
-    # "prophet": forecast_with_prophet,  # ← tu możesz kiedyś podpiąć
 }
+# Prophet rejestrujemy tylko, gdy jest zainstalowany – reszta aplikacji działa bez niego
+if prophet_available():
+    FORECASTERS["prophet"] = prophet_forecast
 
 
 def list_forecasters() -> Dict[str, str]:
     """
     Zwraca listę dostępnych metod – możesz to wyświetlić w UI.
     """
-    return {
+    methods = {
         "naive": "Powtarzanie ostatniej wartości (działa zawsze)",
         "ma": "Średnia krocząca (stabilizuje szum)",
-        "level_trend": "Poziom + prosty trend (gdy widać kierunek)"
+        "level_trend": "Poziom + prosty trend (gdy widać kierunek)",
+        "ses": "Wygładzanie wykładnicze – sam poziom",
+        "holt": "Holt – poziom + trend",
+        "holt_damped": "Holt z tłumionym trendem (bezpieczniejszy na dłuższy horyzont)",
+        "hw_add": "Holt-Winters, sezonowość addytywna (min. 2 pełne cykle historii)",
+        "hw_mul": "Holt-Winters, sezonowość multiplikatywna (min. 2 pełne cykle historii)",
+        "ets": "ETS – najlepszy model wygładzania wg AIC, osobno dla każdego szeregu",
+        "croston": "Croston – popyt sporadyczny (wielkość / odstęp między sprzedażami)",
+        "sba": "SBA – Croston z korektą obciążenia (domyślny wybór dla rzadkiej sprzedaży)",
+        "tsb": "TSB – popyt sporadyczny, prognoza wygasa, gdy SKU przestaje się sprzedawać",
+        "auto": "Automatycznie: ABC/XYZ + backtest tylko dla ważnych, zmiennych SKU",
     }
+    if "prophet" in FORECASTERS:
+        methods["prophet"] = "Prophet – trend + sezonowość (wolny, liczony w puli procesów)"
+    return methods
 
 
 # ─────────────────────────────────────────────────────────────
@@ -144,15 +203,22 @@ def forecast_sku(
     periods: int = 8,
     freq: str = "W",
     method: str = "ma",
+    quantiles: Optional[Sequence[float]] = None,
+    n_paths: int = 0,
 ) -> Dict[str, Any]:
     """
     Buduje prognozę dla konkretnego SKU i (opcjonalnie) magazynu.
 
+    quantiles (np. (0.05, 0.5, 0.95)) / n_paths > 0 – dodatkowo rozkład prognozy
+    z bootstrapu błędów backtestu (oi/probabilistic.py).
+
     Zwraca dict:
     {
         "history": pd.Series,
         "forecast": pd.Series | None,
-        "meta": {...}
+        "meta": {...},
+        "quantiles": DataFrame (kolumny p5, p50, ...) – tylko gdy podano quantiles,
+        "paths": ndarray (n_paths × periods) – tylko gdy n_paths > 0,
     }
     """
     # ── 1. filtrowanie po SKU + lokalizacji
@@ -188,8 +254,15 @@ def forecast_sku(
     y = ts_df[CONFIG.qty_col]
 
     # ── 3. wybór metody
-    if method not in FORECASTERS:
-        # fallback
+    requested_method = method
+    selection: Optional[Dict[str, Any]] = None
+    if method == "auto":
+        from .model_selection import select_method_for_series
+
+        selection = select_method_for_series(y, periods)
+        method = selection["method"]
+    elif method not in FORECASTERS:
+        # fallback – ale zapisujemy w meta, że nie dostaliśmy tego, o co proszono
         method = "ma"
     forecaster = FORECASTERS[method]
 
@@ -221,10 +294,394 @@ def forecast_sku(
         "mape_last": mape,
         "sku": sku,
         "location": location,
+        "requested_method": requested_method,
+        "fallback": requested_method not in ("auto", method),
     }
+    if selection is not None:
+        # te same nazwy pól co w meta forecast_all(method="auto")
+        meta.update({k: selection[k] for k in ("xyz", "tier", "selection", "compute_s")})
 
-    return {
+    out = {
         "history": y,
         "forecast": fc_vals,
         "meta": meta,
     }
+    if quantiles or n_paths > 0:
+        out.update(_sku_distribution(y, fc_vals, method, freq, quantiles, n_paths))
+        meta["uncertainty_source"] = out.pop("source")
+    return out
+
+
+def _sku_distribution(
+    y: pd.Series,
+    fc_vals: pd.Series,
+    method: str,
+    freq: str,
+    quantiles: Optional[Sequence[float]],
+    n_paths: int,
+) -> Dict[str, Any]:
+    """Ścieżki / kwantyle wokół prognozy punktowej jednego SKU (metody spoza wsadu → błędy "ma")."""
+    from .probabilistic import DEFAULT_N_PATHS, forecast_paths, quantile_label
+
+    periods = len(fc_vals)
+    res = forecast_paths(
+        y.to_numpy(dtype=float)[None, :],
+        periods,
+        method=method,
+        n_paths=max(int(n_paths), DEFAULT_N_PATHS if quantiles else 0),
+        season_length=season_length_for(freq),
+        point=fc_vals.to_numpy(dtype=float)[None, :],
+    )
+    paths = res["paths"][0]
+    out: Dict[str, Any] = {"source": str(res["source"][0])}
+    if quantiles:
+        qs = list(quantiles)
+        out["quantiles"] = pd.DataFrame(
+            np.quantile(paths, qs, axis=0).T,
+            index=fc_vals.index,
+            columns=[quantile_label(q) for q in qs],
+        )
+    if n_paths > 0:
+        out["paths"] = paths[: int(n_paths)]
+    return out
+
+
+# ─────────────────────────────────────────────────────────────
+# Prognozy wsadowe – wszystkie szeregi jako jedna macierz
+# ─────────────────────────────────────────────────────────────
+# Wiersz macierzy = szereg (SKU × magazyn), kolumna = okres. Przed pierwszą
+# sprzedażą szeregu jest NaN, więc "ile mamy historii" to liczba nie-NaN w wierszu.
+# Każda metoda wsadowa daje te same liczby co jej odpowiednik z FORECASTERS
+# zastosowany do pojedynczego szeregu.
+
+def _n_valid(y: np.ndarray) -> np.ndarray:
+    return np.sum(~np.isnan(y), axis=1)
+
+
+def _row_nanmean(y: np.ndarray) -> np.ndarray:
+    """Średnia wiersza z pominięciem NaN; pusty wiersz = 0 (bez ostrzeżeń numpy)."""
+    n = _n_valid(y)
+    return np.nansum(y, axis=1) / np.where(n > 0, n, 1)
+
+
+def naive_forecast_matrix(y: np.ndarray, periods: int) -> np.ndarray:
+    """Wsadowy odpowiednik naive_forecast – ostatnia wartość każdego wiersza."""
+    last = np.nan_to_num(y[:, -1]) if y.shape[1] else np.zeros(y.shape[0])
+    return np.repeat(last[:, None], periods, axis=1)
+
+
+def moving_average_forecast_matrix(y: np.ndarray, periods: int, window: int = 4) -> np.ndarray:
+    """
+    Wsadowy odpowiednik moving_average_forecast.
+    Krótsza historia niż okno → NaN-y z przodu okna wypadają, więc to średnia ze wszystkiego.
+    """
+    avg = _row_nanmean(y[:, -window:])
+    return np.repeat(avg[:, None], periods, axis=1)
+
+
+def level_trend_forecast_matrix(y: np.ndarray, periods: int) -> np.ndarray:
+    """Wsadowy odpowiednik level_trend_forecast (poziom = ostatni punkt, trend = średnia z ostatnich różnic)."""
+    n = _n_valid(y)
+    out = np.repeat(_row_nanmean(y)[:, None], periods, axis=1)
+    long_rows = n >= 3
+    if not long_rows.any():
+        return out
+
+    tail = np.full((y.shape[0], 4), np.nan)
+    k = min(4, y.shape[1])
+    tail[:, 4 - k:] = y[:, -k:]
+    level = tail[:, -1]
+    # ≥ 4 punkty: średnia z 3 ostatnich różnic; dokładnie 3 punkty: z 2 różnic
+    trend = np.where(n >= 4, (level - tail[:, 0]) / 3.0, (level - tail[:, 1]) / 2.0)
+    steps = np.arange(1, periods + 1)
+    lt = np.maximum(level[:, None] + steps[None, :] * trend[:, None], 0.0)
+    out[long_rows] = lt[long_rows]
+    return out
+
+
+BATCH_FORECASTERS: Dict[str, Callable[..., np.ndarray]] = {
+    "naive": naive_forecast_matrix,
+    "ma": moving_average_forecast_matrix,
+    "level_trend": level_trend_forecast_matrix,
+}
+
+# ile ostatnich okresów metoda faktycznie czyta (None = cała historia).
+# Backtest tnie historię do tylu kolumn – wynik jest identyczny, a pamięć dużo mniejsza.
+BATCH_LOOKBACK: Dict[str, Optional[int]] = {
+    "naive": 1,
+    "ma": 4,
+    "level_trend": 4,
+}
+
+
+# metody, które potrzebują długości sezonu (liczba okresów w cyklu)
+SEASONAL_METHODS = {"hw_add", "hw_mul", "ets"}
+
+
+# ─────────────────────────────────────────────────────────────
+# Wygładzanie wykładnicze (ETS / Holt-Winters) – szczegóły w oi/ets.py
+# ─────────────────────────────────────────────────────────────
+
+def _ets_matrix_forecaster(model: str) -> Callable[..., np.ndarray]:
+    def forecaster(y: np.ndarray, periods: int, season_length: int = 1) -> np.ndarray:
+        return ets_fit_forecast(y, periods, model=model, season_length=season_length)["forecast"]
+
+    forecaster.__name__ = f"{model}_forecast_matrix"
+    return forecaster
+
+
+def ets_forecast(series: pd.Series, periods: int, model: str = "ets") -> pd.Series:
+    """
+    Pojedynczy szereg przez ten sam silnik co wersja macierzowa.
+    Długość sezonu bierzemy z częstotliwości indeksu (W → 52, D → 7, M → 12).
+    """
+    freq = None
+    if isinstance(series.index, pd.DatetimeIndex):
+        freq = series.index.freqstr if series.index.freq is not None else pd.infer_freq(series.index)
+    y = series.to_numpy(dtype=float)[None, :]
+    fc = ets_fit_forecast(y, periods, model=model, season_length=season_length_for(freq))["forecast"]
+    return pd.Series(fc[0], dtype="float")
+
+
+for _model in list(ETS_MODELS) + ["ets"]:
+    FORECASTERS[_model] = partial(ets_forecast, model=_model)
+    BATCH_FORECASTERS[_model] = _ets_matrix_forecaster(_model)
+    # rekursje czytają całą historię
+    BATCH_LOOKBACK[_model] = None
+
+
+# ─────────────────────────────────────────────────────────────
+# Popyt sporadyczny (Croston / SBA / TSB) – szczegóły w oi/intermittent.py
+# ─────────────────────────────────────────────────────────────
+
+def intermittent_forecast(series: pd.Series, periods: int, method: str = "sba") -> pd.Series:
+    """Pojedynczy szereg: tylko zdarzenia sprzedaży (CSR) → ten sam rdzeń co wersja wsadowa."""
+    fc = intermittent_forecast_sparse(sparse_from_series(series), periods, method=method)
+    return pd.Series(fc[0], dtype="float")
+
+
+for _method in INTERMITTENT_METHODS:
+    FORECASTERS[_method] = partial(intermittent_forecast, method=_method)
+    BATCH_FORECASTERS[_method] = partial(intermittent_forecast_matrix, method=_method)
+    BATCH_LOOKBACK[_method] = None
+
+
+def forecast_matrix(y: np.ndarray, periods: int, method: str = "ma", season_length: int = 1) -> np.ndarray:
+    """
+    Prognoza (n_series × periods) dla macierzy historii; nieznana metoda → fallback "ma".
+    season_length trafia tylko do metod sezonowych (SEASONAL_METHODS).
+    """
+    if method not in BATCH_FORECASTERS:
+        method = "ma"
+    kwargs = {"season_length": season_length} if method in SEASONAL_METHODS else {}
+    return BATCH_FORECASTERS[method](np.asarray(y, dtype=float), periods=periods, **kwargs)
+
+
+def _last_point_ape(y: np.ndarray, method: str, season_length: int = 1) -> np.ndarray:
+    """
+    APE (%) ostatniego okresu: prognoza 1 krok z historii bez ostatniego punktu vs. faktyczna wartość.
+    Jak w forecast_sku to tylko szybki podgląd, nie backtest. Brak oceny (krótka historia, zero) → NaN.
+    """
+    n_series = y.shape[0]
+    ape = np.full(n_series, np.nan)
+    if y.shape[1] < 2:
+        return ape
+    pseudo = forecast_matrix(y[:, :-1], 1, method, season_length)[:, 0]
+    actual = y[:, -1]
+    ok = (_n_valid(y) >= 3) & (actual != 0)
+    ape[ok] = np.abs((actual[ok] - pseudo[ok]) / actual[ok]) * 100.0
+    return ape
+
+
+def forecast_all(
+    df: pd.DataFrame,
+    periods: int = 8,
+    freq: str = "W",
+    method: str = "ma",
+    quantiles: Optional[Sequence[float]] = None,
+) -> Dict[str, Any]:
+    """
+    Prognoza dla WSZYSTKICH szeregów SKU (× magazyn) naraz.
+
+    Dane pivotujemy raz do macierzy (szeregi × okresy) i liczymy metodę
+    na całej macierzy – zamiast filtrować i resamplować ramkę osobno dla każdego SKU.
+
+    Różnica względem forecast_sku: wszystkie szeregi kończą się na wspólnym, ostatnim
+    okresie danych (SKU, które przestały się sprzedawać, mają zera na końcu),
+    więc prognoza startuje od tego samego okresu dla całego asortymentu.
+
+    Metody popytu sporadycznego (croston / sba / tsb) idą przez forecast_intermittent –
+    bez gęstej macierzy, tylko na zdarzeniach sprzedaży.
+
+    quantiles (np. (0.05, 0.5, 0.95)) dodaje do prognozy kolumny p5, p50, p95 – kwantyle
+    z bootstrapu błędów backtestu (oi/probabilistic.forecast_quantiles). Bootstrap potrzebuje
+    historii okresów, więc metody sporadyczne idą wtedy przez gęstą macierz; przy "auto" każdy
+    szereg bierze błędy wybranej dla niego metody (add_batch_quantiles).
+
+    Zwraca dict:
+    {
+        "forecast": DataFrame long – klucze, data, forecast (+ kolumny kwantyli),
+        "meta": DataFrame – jeden wiersz na szereg (method, freq, periods, n_history, mape_last, status),
+        "history": wynik preprocessing.pivot_sales_matrix (klucze, okresy, macierz),
+    }
+    """
+    if method == "auto":
+        from .model_selection import forecast_auto
+
+        result = forecast_auto(df, periods=periods, freq=freq)
+        return add_batch_quantiles(result, quantiles) if quantiles else result
+    if method in INTERMITTENT_METHODS and not quantiles:
+        return forecast_intermittent(df, periods=periods, freq=freq, method=method)
+    if method not in BATCH_FORECASTERS:
+        method = "ma"
+
+    pivot = pivot_sales_matrix(df, freq=freq)
+    keys = pivot["keys"]
+    key_cols = list(keys.columns) if len(keys.columns) else series_key_cols(df)
+    y = pivot["values"]
+    n_series = len(keys)
+
+    if n_series == 0:
+        return _batch_result(pivot, key_cols, np.empty((0, periods)), freq, method)
+
+    season_length = season_length_for(freq)
+    fc = forecast_matrix(y, periods, method, season_length)
+    result = _batch_result(pivot, key_cols, fc, freq, method, mape=_last_point_ape(y, method, season_length))
+    if quantiles:
+        add_batch_quantiles(result, quantiles)
+    return result
+
+
+def add_batch_quantiles(result: Dict[str, Any], quantiles: Sequence[float]) -> Dict[str, Any]:
+    """
+    Dokłada do wyniku wsadowego (forecast_all / forecast_auto / forecast_all_parallel) kolumny
+    kwantyli p5, p50, ... i meta["uncertainty_source"] – w miejscu, zwraca ten sam dict.
+
+    Szeregi grupujemy po metodzie z meta ("auto" ma różne metody per szereg); bootstrap błędów
+    liczymy tą metodą wokół prognozy, która faktycznie jest w wyniku. Metody bez wersji
+    wektorowej (np. Prophet) dostają profil błędów "ma" – backtest ciężkiego modelu z każdego
+    punktu startu kosztowałby tyle, co cała prognoza razy liczba origin-ów.
+    Wymaga gęstej historii (pivot_sales_matrix) w result["history"].
+    """
+    from .probabilistic import forecast_quantiles, quantile_label
+
+    meta, long = result["meta"], result["forecast"]
+    y = result["history"]["values"]
+    n_series = len(meta)
+    qs = [float(q) for q in quantiles]
+    if n_series == 0:
+        for q in qs:
+            long[quantile_label(q)] = pd.Series(dtype=float)
+        return result
+
+    periods = len(long) // n_series
+    fc = long["forecast"].to_numpy(dtype=float).reshape(n_series, periods)
+    season_length = season_length_for(str(meta["freq"].iloc[0]))
+    out = np.empty((n_series, len(qs), periods))
+    source = np.empty(n_series, dtype=object)
+    methods = meta["method"].astype(str).to_numpy()
+    for method in pd.unique(methods):
+        rows = np.flatnonzero(methods == method)
+        qres = forecast_quantiles(
+            y[rows], periods, method if method in BATCH_FORECASTERS else "ma", qs,
+            season_length=season_length, point=fc[rows],
+        )
+        out[rows] = qres["quantiles"]
+        source[rows] = qres["source"]
+    # long jest ułożony szereg po szeregu, okres po okresie – jak out[:, j, :].ravel()
+    for j, q in enumerate(qs):
+        long[quantile_label(q)] = out[:, j, :].ravel()
+    meta["uncertainty_source"] = source
+    return result
+
+
+def forecast_intermittent(
+    df: pd.DataFrame,
+    periods: int = 8,
+    freq: str = "D",
+    method: str = "sba",
+) -> Dict[str, Any]:
+    """
+    forecast_all dla metod popytu sporadycznego – prosto z długiej ramki do reprezentacji CSR
+    (intermittent.sparse_demand), bez gęstej macierzy szeregi × okresy. Pamięć rośnie z liczbą
+    zdarzeń sprzedaży, więc nadaje się do prognoz dziennych dla długiego ogona SKU.
+
+    Wynik ma kształt forecast_all; "history" to reprezentacja CSR (zamiast pivotu).
+    """
+    if method not in INTERMITTENT_METHODS:
+        method = "sba"
+    sp = sparse_demand(df, freq=freq)
+    keys = sp["keys"]
+    key_cols = list(keys.columns) if len(keys.columns) else series_key_cols(df)
+    history = {**sp, "periods": sparse_period_labels(sp)}
+    if len(keys) == 0:
+        return _batch_result(history, key_cols, np.empty((0, periods)), freq, method, n_history=sp["n_periods"])
+
+    fc = intermittent_forecast_sparse(sp, periods, method=method)
+
+    # APE ostatniego okresu – jak _last_point_ape, ale na zdarzeniach
+    n_periods = sp["n_periods"]
+    pseudo = intermittent_forecast_sparse(drop_last_period(sp), 1, method=method)[:, 0]
+    counts = np.diff(sp["indptr"])
+    last_idx = np.maximum(sp["indptr"][1:] - 1, 0)
+    actual = np.zeros(len(keys))
+    if sp["sizes"].size:
+        hit_last = (counts > 0) & (sp["positions"][last_idx] == n_periods - 1)
+        actual[hit_last] = sp["sizes"][last_idx[hit_last]]
+    ape = np.full(len(keys), np.nan)
+    ok = (n_periods >= 3) & (actual != 0)
+    ape[ok] = np.abs((actual[ok] - pseudo[ok]) / actual[ok]) * 100.0
+
+    return _batch_result(history, key_cols, fc, freq, method, mape=ape, n_history=n_periods)
+
+
+def _batch_result(
+    pivot: Dict[str, Any],
+    key_cols: List[str],
+    fc: np.ndarray,
+    freq: str,
+    method: str,
+    mape: Optional[np.ndarray] = None,
+    status: Optional[np.ndarray] = None,
+    methods_used: Optional[np.ndarray] = None,
+    n_history: Optional[np.ndarray] = None,
+) -> Dict[str, Any]:
+    """
+    Składa wynik wsadowy (long forecast + meta per szereg) z macierzy prognoz.
+    n_history podajemy, gdy pivot nie niesie pełnej historii (np. prognoza ze stanu).
+    """
+    keys = pivot["keys"]
+    n_series, periods = fc.shape
+    meta_cols = key_cols + ["status", "method", "freq", "periods", "n_history", "mape_last"]
+    if n_series == 0:
+        return {
+            "forecast": pd.DataFrame(columns=key_cols + [CONFIG.date_col, "forecast"]),
+            "meta": pd.DataFrame(columns=meta_cols),
+            "history": pivot,
+        }
+
+    last_period = pd.Period(pivot["periods"][-1], freq=freq)
+    future_index = period_labels(pd.period_range(start=last_period + 1, periods=periods))
+
+    long = keys.loc[np.repeat(np.arange(n_series), periods)].reset_index(drop=True)
+    long[CONFIG.date_col] = np.tile(future_index.to_numpy(), n_series)
+    long["forecast"] = fc.ravel()
+
+    if mape is None:
+        mape = np.full(n_series, np.nan)
+    meta = keys.copy()
+    meta["status"] = "ok" if status is None else status
+    meta["method"] = method if methods_used is None else methods_used
+    meta["freq"] = freq
+    meta["periods"] = int(periods)
+    if n_history is None:
+        n_history = _n_valid(pivot["values"])
+    meta["n_history"] = np.asarray(n_history).astype(np.int64)
+    meta["mape_last"] = pd.Series(mape).astype(object).where(~np.isnan(mape), None)
+
+    return {"forecast": long, "meta": meta, "history": pivot}
+
+
+def list_batch_forecasters() -> List[str]:
+    """Metody dostępne w trybie wsadowym (forecast_all)."""
+    return list(BATCH_FORECASTERS) + ["auto"]
@@ -0,0 +1,319 @@
+# oi/hierarchy.py
+from __future__ import annotations
+"""
+Hierarchia prognoz: SKU × magazyn → SKU / magazyn → całość – i uzgadnianie (reconciliation).
+
+Prognozy liczone osobno dla każdego poziomu się nie sumują (suma prognoz SKU ≠ prognoza
+całości). Tutaj:
+- build_hierarchy buduje rzadką macierz sumującą S (scipy.sparse): wiersz = węzeł hierarchii,
+  kolumna = szereg dolny (SKU × magazyn albo samo SKU), y_wszystkie = S · y_dolne,
+- reconcile_forecasts uzgadnia prognozy bazowe wszystkich węzłów:
+  - "bu"          – bottom-up: bierzemy prognozy dolne i sumujemy w górę,
+  - "td"          – top-down: prognoza całości rozdzielona wg historycznych udziałów szeregów,
+  - "mint_shrink" – MinT (Wickramasuriya i in.) z kowariancją błędów ściągniętą do diagonali
+    (λ Schäfera-Strimmera): ỹ = ŷ − W Cᵀ (C W Cᵀ)⁻¹ C ŷ, gdzie C = [I, −A] to więzy sumowania.
+
+Skala: przy 50k szeregów dolnych pełna macierz W (n × n) się nie mieści, więc korzystamy
+z jej struktury: W = λ·diag(σ²) + (1 − λ)·E Eᵀ / T to diagonala + niski rząd (T = liczba
+okresów reszt). C W Cᵀ = (rzadka macierz) + U Uᵀ odwracamy wzorem Woodbury'ego z jednym
+rozkładem LU (splu) macierzy rzadkiej – wszystkie okresy horyzontu liczymy naraz.
+"""
+
+from typing import Any, Dict, Optional
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from scipy.sparse.linalg import splu
+
+from .backtesting import _method_forecasts, rolling_origins
+from .config import CONFIG
+from .ets import season_length_for
+from .forecasting import BATCH_FORECASTERS, BATCH_LOOKBACK, forecast_matrix
+from .preprocessing import period_labels, pivot_sales_matrix, series_key_cols
+
+RECONCILIATION_METHODS = ("bu", "td", "mint_shrink")
+
+# poziomy hierarchii (kolumna "level" w nodes)
+LEVEL_TOTAL = "total"
+LEVEL_LOCATION = "location"
+LEVEL_SKU = "sku"
+LEVEL_BOTTOM = "sku_location"
+
+# ile ostatnich okresów bierzemy na reszty jednokrokowe do kowariancji MinT
+DEFAULT_RESIDUAL_PERIODS = 26
+
+
+# ─────────────────────────────────────────────────────────────
+# Struktura hierarchii
+# ─────────────────────────────────────────────────────────────
+
+def build_hierarchy(keys: pd.DataFrame) -> Dict[str, Any]:
+    """
+    Macierz sumująca z kluczy szeregów dolnych (np. pivot_sales_matrix(...)["keys"]).
+
+    Z kolumną magazynu: całość → magazyny → SKU (suma po magazynach) → SKU × magazyn.
+    Bez niej: całość → SKU.
+    Węzły zagregowane są na początku, dolne na końcu (S = [A; I]).
+
+    Zwraca dict:
+    {
+        "S": csr_matrix (n_nodes × n_bottom),
+        "A": csr_matrix (n_agg × n_bottom) – sama część zagregowana,
+        "nodes": DataFrame – level + klucze (None tam, gdzie poziom agreguje),
+        "n_agg": liczba węzłów zagregowanych,
+        "n_bottom": liczba szeregów dolnych,
+    }
+    """
+    keys = keys.reset_index(drop=True)
+    n_bottom = len(keys)
+    sku_col, loc_col = CONFIG.sku_col, CONFIG.location_col
+    has_location = loc_col in keys.columns
+
+    cols = np.arange(n_bottom)
+    row_blocks = [np.zeros(n_bottom, dtype=np.int64)]
+    node_frames = [pd.DataFrame({"level": [LEVEL_TOTAL], sku_col: [None]})]
+    offset = 1
+    if has_location:
+        loc_codes, loc_uniques = pd.factorize(keys[loc_col], sort=True, use_na_sentinel=False)
+        sku_codes, sku_uniques = pd.factorize(keys[sku_col], sort=True, use_na_sentinel=False)
+        row_blocks.append(offset + loc_codes)
+        node_frames.append(pd.DataFrame({"level": LEVEL_LOCATION, sku_col: None, loc_col: loc_uniques}))
+        offset += len(loc_uniques)
+        row_blocks.append(offset + sku_codes)
+        node_frames.append(pd.DataFrame({"level": LEVEL_SKU, sku_col: sku_uniques, loc_col: None}))
+        offset += len(sku_uniques)
+        node_frames[0][loc_col] = [None]
+    n_agg = offset
+
+    rows = np.concatenate(row_blocks)
+    data = np.ones(rows.shape[0])
+    A = sparse.csr_matrix(
+        (data, (rows, np.tile(cols, len(row_blocks)))), shape=(n_agg, n_bottom)
+    )
+    S = sparse.vstack([A, sparse.identity(n_bottom, format="csr")], format="csr")
+
+    bottom = keys.copy()
+    bottom.insert(0, "level", LEVEL_BOTTOM if has_location else LEVEL_SKU)
+    nodes = pd.concat(node_frames + [bottom], ignore_index=True)
+    nodes = nodes[["level"] + list(keys.columns)]
+    return {"S": S, "A": A, "nodes": nodes, "n_agg": n_agg, "n_bottom": n_bottom}
+
+
+def aggregate_history(hier: Dict[str, Any], y_bottom: np.ndarray) -> np.ndarray:
+    """
+    Historia wszystkich węzłów: S · y_dolne. Konwencja NaN jak w pivot_sales_matrix –
+    węzeł "istnieje" od okresu, w którym wystartował pierwszy z jego szeregów dolnych.
+    """
+    valid = ~np.isnan(y_bottom)
+    totals = hier["S"] @ np.nan_to_num(y_bottom)
+    started = (hier["S"] @ valid.astype(float)) > 0
+    return np.where(started, totals, np.nan)
+
+
+# ─────────────────────────────────────────────────────────────
+# Uzgadnianie
+# ─────────────────────────────────────────────────────────────
+
+def shrinkage_intensity(residuals: np.ndarray) -> float:
+    """
+    λ Schäfera-Strimmera (ściąganie korelacji do zera) – bez budowania macierzy n × n.
+    Sumy po wszystkich parach (i, j) liczymy przez macierz Grama T × T:
+    Σ_ij (Σ_t x_it x_jt)² = ‖XᵀX‖²_F, Σ_ij Σ_t x_it² x_jt² = Σ_t (Σ_i x_it²)².
+    """
+    e = np.asarray(residuals, dtype=float)
+    n, t = e.shape
+    if t < 3 or n < 2:
+        return 1.0
+    sd = e.std(axis=1, ddof=1)
+    ok = sd > 0
+    x = np.zeros_like(e)
+    x[ok] = (e[ok] - e[ok].mean(axis=1, keepdims=True)) / sd[ok, None]
+
+    sq = x * x
+    gram = x.T @ x                                        # (T × T)
+    sum_w_bar_sq = float(np.sum(gram * gram)) / t ** 2    # Σ_ij w̄_ij²
+    diag_w_bar_sq = float(np.sum(sq.mean(axis=1) ** 2))   # Σ_i w̄_ii²
+    sum_w_sq = float(np.sum(sq.sum(axis=0) ** 2))         # Σ_ij Σ_t w_ijt²
+    diag_w_sq = float(np.sum(sq * sq))                    # Σ_i Σ_t w_iit²
+
+    # Σ_{i≠j} Σ_t (w_ijt − w̄_ij)² = (Σ w² − T Σ w̄²) bez przekątnej
+    dev = (sum_w_sq - t * sum_w_bar_sq) - (diag_w_sq - t * diag_w_bar_sq)
+    var_r = t / (t - 1) ** 3 * dev
+    r_sq = (t / (t - 1)) ** 2 * (sum_w_bar_sq - diag_w_bar_sq)
+    if r_sq <= 0:
+        return 1.0
+    return float(np.clip(var_r / r_sq, 0.0, 1.0))
+
+
+def _mint_shrink(
+    hier: Dict[str, Any],
+    base: np.ndarray,
+    residuals: np.ndarray,
+) -> Dict[str, Any]:
+    """MinT-shrink przez więzy C = [I, −A], W = diag + niski rząd, Woodbury + splu."""
+    A = hier["A"]
+    n_agg = hier["n_agg"]
+    e = np.nan_to_num(np.asarray(residuals, dtype=float))
+    t = max(e.shape[1], 1)
+
+    lam = shrinkage_intensity(e)
+    var = np.sum(e * e, axis=1) / t
+    # szereg bez błędów (np. same zera) nie może mieć zerowej wariancji – W musi być odwracalne
+    var = np.maximum(var, 1e-6 * float(var.mean()) + 1e-12)
+    d = lam * var                                          # diagonala W
+    v = np.sqrt((1.0 - lam) / t) * e                       # W = diag(d) + V Vᵀ
+
+    def apply_c(x: np.ndarray) -> np.ndarray:              # C x = x_agg − A x_bottom
+        return x[:n_agg] - A @ x[n_agg:]
+
+    def apply_ct(z: np.ndarray) -> np.ndarray:             # Cᵀ z = [z; −Aᵀ z]
+        return np.concatenate([z, -(A.T @ z)])
+
+    d_agg, d_bottom = d[:n_agg], d[n_agg:]
+    m = sparse.diags(d_agg) + A @ sparse.diags(d_bottom) @ A.T
+    lu = splu(sparse.csc_matrix(m))
+
+    u = apply_c(v)                                         # (n_agg × T)
+    rhs = apply_c(base)                                    # (n_agg × h)
+    minv_rhs = lu.solve(np.asfortranarray(rhs))
+    if lam < 1.0:
+        minv_u = lu.solve(np.asfortranarray(u))
+        small = np.eye(u.shape[1]) + u.T @ minv_u
+        z = minv_rhs - minv_u @ np.linalg.solve(small, u.T @ minv_rhs)
+    else:
+        z = minv_rhs
+    ctz = apply_ct(z)
+    adjusted = base - (d[:, None] * ctz + v @ (v.T @ ctz))
+    return {"forecast": adjusted, "lambda": lam}
+
+
+def reconcile_forecasts(
+    hier: Dict[str, Any],
+    base: np.ndarray,
+    method: str = "mint_shrink",
+    history: Optional[np.ndarray] = None,
+    residuals: Optional[np.ndarray] = None,
+    nonnegative: bool = True,
+) -> Dict[str, Any]:
+    """
+    Uzgadnia prognozy bazowe wszystkich węzłów (n_nodes × h, kolejność jak hier["nodes"]).
+
+    - "bu": potrzebuje tylko prognoz dolnych,
+    - "td": potrzebuje historii szeregów dolnych (history, n_bottom × T) – udziały to
+      proporcje średnich historycznych (suma szeregu / suma całości),
+    - "mint_shrink": potrzebuje reszt jednokrokowych wszystkich węzłów (residuals, n_nodes × T);
+      bez reszt → "bu".
+    nonnegative: ujemne prognozy dolne zerujemy i sumujemy w górę jeszcze raz
+    (wynik dalej jest spójny).
+
+    Zwraca dict: forecast (n_nodes × h, spójny: górne = S · dolne), method, lambda (MinT).
+    """
+    base = np.nan_to_num(np.asarray(base, dtype=float))
+    S, n_agg = hier["S"], hier["n_agg"]
+    info: Dict[str, Any] = {"method": method, "lambda": None}
+
+    if method == "mint_shrink" and residuals is not None and np.asarray(residuals).shape[1] >= 2:
+        res = _mint_shrink(hier, base, residuals)
+        bottom = res["forecast"][n_agg:]
+        info["lambda"] = res["lambda"]
+    elif method == "td" and history is not None:
+        totals = np.nansum(np.asarray(history, dtype=float), axis=1)
+        grand = totals.sum()
+        share = totals / grand if grand > 0 else np.full(totals.shape, 1.0 / max(totals.size, 1))
+        bottom = share[:, None] * base[0][None, :]
+    else:
+        info["method"] = "bu"
+        bottom = base[n_agg:]
+
+    if nonnegative:
+        bottom = np.maximum(bottom, 0.0)
+    info["forecast"] = S @ bottom
+    return info
+
+
+# ─────────────────────────────────────────────────────────────
+# Cały proces: dane → prognozy bazowe → uzgodnienie
+# ─────────────────────────────────────────────────────────────
+
+def one_step_residuals(
+    y: np.ndarray,
+    method: str,
+    n_periods: int = DEFAULT_RESIDUAL_PERIODS,
+    season_length: int = 1,
+) -> np.ndarray:
+    """Reszty jednokrokowe (rzeczywistość − prognoza) z ostatnich n_periods okresów; brak danych → 0."""
+    origins = rolling_origins(y.shape[1], 1, n_periods)
+    if origins.size == 0:
+        return np.zeros((y.shape[0], 0))
+    fc = _method_forecasts(y, origins, 1, method, BATCH_LOOKBACK.get(method), season_length)[:, :, 0]
+    return np.nan_to_num(y[:, origins] - fc)
+
+
+def forecast_hierarchy(
+    df: pd.DataFrame,
+    periods: int = 8,
+    freq: str = "W",
+    method: str = "ma",
+    reconciliation: str = "mint_shrink",
+    residual_periods: int = DEFAULT_RESIDUAL_PERIODS,
+) -> Dict[str, Any]:
+    """
+    Prognozy spójne na wszystkich poziomach: całość, magazyny, SKU, SKU × magazyn.
+
+    Dane z aggregate_sales → macierz szeregów dolnych → historia wszystkich węzłów (S · y)
+    → prognozy bazowe metodą wsadową dla każdego węzłu → uzgodnienie.
+
+    Zwraca dict:
+    {
+        "forecast": DataFrame long – level, klucze, data, base (prognoza bazowa), forecast (uzgodniona),
+        "nodes": DataFrame węzłów,
+        "meta": {method, reconciliation, lambda, n_nodes, n_bottom, ...},
+    }
+    """
+    if method not in BATCH_FORECASTERS:
+        method = "ma"
+    if reconciliation not in RECONCILIATION_METHODS:
+        reconciliation = "mint_shrink"
+
+    pivot = pivot_sales_matrix(df, freq=freq)
+    keys = pivot["keys"]
+    if len(keys.columns) == 0:
+        keys = pd.DataFrame(columns=series_key_cols(df))
+    hier = build_hierarchy(keys)
+    nodes = hier["nodes"]
+    meta: Dict[str, Any] = {
+        "method": method,
+        "reconciliation": reconciliation,
+        "lambda": None,
+        "freq": freq,
+        "periods": int(periods),
+        "n_nodes": int(len(nodes)),
+        "n_bottom": int(hier["n_bottom"]),
+        "status": "ok",
+    }
+    if hier["n_bottom"] == 0:
+        meta["status"] = "empty"
+        cols = list(nodes.columns) + [CONFIG.date_col, "base", "forecast"]
+        return {"forecast": pd.DataFrame(columns=cols), "nodes": nodes, "meta": meta}
+
+    season_length = season_length_for(freq)
+    y_all = aggregate_history(hier, pivot["values"])
+    base = forecast_matrix(y_all, periods, method, season_length)
+    residuals = None
+    if reconciliation == "mint_shrink":
+        residuals = one_step_residuals(y_all, method, residual_periods, season_length)
+    rec = reconcile_forecasts(
+        hier, base, reconciliation, history=pivot["values"], residuals=residuals
+    )
+    meta["reconciliation"] = rec["method"]
+    meta["lambda"] = rec["lambda"]
+
+    last_period = pd.Period(pivot["periods"][-1], freq=freq)
+    future_index = period_labels(pd.period_range(start=last_period + 1, periods=periods))
+    n_nodes = len(nodes)
+    long = nodes.loc[np.repeat(np.arange(n_nodes), periods)].reset_index(drop=True)
+    long[CONFIG.date_col] = np.tile(future_index.to_numpy(), n_nodes)
+    long["base"] = base.ravel()
+    long["forecast"] = np.asarray(rec["forecast"]).ravel()
+    return {"forecast": long, "nodes": nodes, "meta": meta}
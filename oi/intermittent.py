@@ -0,0 +1,233 @@
+# oi/intermittent.py
+from __future__ import annotations
+"""
+Popyt sporadyczny (intermittent) – reprezentacja rzadka + metody z rodziny Crostona.
+
+Wiele SKU sprzedaje się kilka razy w roku. W gęstej macierzy (szeregi × dni) to prawie
+same zera, więc zamiast niej trzymamy tylko zdarzenia sprzedaży – układ jak w CSR:
+- indptr (S + 1)   – zdarzenia szeregu i to elementy indptr[i] : indptr[i + 1],
+- positions        – okres zdarzenia liczony od startu szeregu (0 = pierwszy okres),
+- sizes            – wielkość popytu w zdarzeniu (> 0),
+- intervals        – odstęp od poprzedniego zdarzenia (pierwsze: od startu szeregu, pos + 1),
+- n_periods        – długość szeregu: od startu do wspólnego ostatniego okresu danych.
+Pamięć rośnie z liczbą zdarzeń, a nie z liczbą dni × SKU.
+
+Metody (α – wygładzanie wielkości i odstępów, β – prawdopodobieństwa popytu):
+- "croston" – z / p (wielkość / odstęp, oba wygładzane tylko w okresach z popytem),
+- "sba"     – Syntetos-Boylan: (1 − α/2) · z / p, koryguje obciążenie Crostona w górę,
+- "tsb"     – Teunter-Syntetos-Babai: π · z, π wygładzane w każdym okresie, więc
+              prognoza wygasa, gdy SKU przestaje się sprzedawać (Croston tego nie widzi).
+
+Wygładzanie wykładnicze ze stałym α ma postać zamkniętą – stan końcowy to ważona suma
+zdarzeń z wagami α(1 − α)^k – więc wszystkie szeregi liczymy jednym bincount po zdarzeniach,
+bez pętli po SKU i bez pętli po okresach.
+Start wygładzania: średnia wielkość, średni odstęp (n_periods / liczba zdarzeń) i częstość
+zdarzeń z całej historii – przy kilku zdarzeniach w roku pierwszy odstęp (zwykle 1,
+bo szereg startuje od pierwszej sprzedaży) mocno zawyżałby prognozę.
+"""
+
+from typing import Any, Dict
+
+import numpy as np
+import pandas as pd
+
+from .config import CONFIG
+from .preprocessing import period_labels, series_key_cols
+
+INTERMITTENT_METHODS = ("croston", "sba", "tsb")
+
+DEFAULT_ALPHA = 0.1
+DEFAULT_BETA = 0.1
+
+
+# ─────────────────────────────────────────────────────────────
+# Reprezentacja rzadka
+# ─────────────────────────────────────────────────────────────
+
+def _sparse_from_events(
+    codes: np.ndarray,
+    positions: np.ndarray,
+    sizes: np.ndarray,
+    n_periods: np.ndarray,
+) -> Dict[str, Any]:
+    """Składa dict CSR ze zdarzeń posortowanych po (szereg, okres) – tylko sizes > 0."""
+    keep = sizes > 0
+    codes, positions, sizes = codes[keep], positions[keep], sizes[keep]
+    n_series = n_periods.shape[0]
+    counts = np.bincount(codes, minlength=n_series)
+    indptr = np.zeros(n_series + 1, dtype=np.int64)
+    np.cumsum(counts, out=indptr[1:])
+
+    intervals = np.empty(positions.shape[0], dtype=float)
+    if positions.size:
+        intervals[1:] = np.diff(positions)
+        intervals[0] = positions[0] + 1
+        # pierwsze zdarzenie każdego szeregu liczymy od jego startu
+        firsts = indptr[:-1][counts > 0]
+        intervals[firsts] = positions[firsts] + 1
+    return {
+        "indptr": indptr,
+        "positions": positions.astype(np.int64),
+        "sizes": sizes.astype(float),
+        "intervals": intervals,
+        "n_periods": n_periods.astype(np.int64),
+    }
+
+
+def sparse_from_matrix(y: np.ndarray) -> Dict[str, Any]:
+    """
+    Macierz historii (NaN przed startem szeregu, jak w pivot_sales_matrix) → dict CSR.
+    Start szeregu = pierwszy okres bez NaN; wiersz bez danych ma n_periods = 0.
+    """
+    y = np.asarray(y, dtype=float)
+    n_series, n_periods = y.shape
+    valid = ~np.isnan(y)
+    started = valid.any(axis=1)
+    first = np.where(started, np.argmax(valid, axis=1), n_periods)
+    rows, cols = np.nonzero(np.nan_to_num(y) > 0)
+    return _sparse_from_events(rows, cols - first[rows], y[rows, cols], n_periods - first)
+
+
+def sparse_from_series(series: pd.Series) -> Dict[str, Any]:
+    """Pojedynczy (gęsty) szereg z _ensure_datetime_index → dict CSR z jednym wierszem."""
+    return sparse_from_matrix(series.to_numpy(dtype=float)[None, :])
+
+
+def sparse_demand(df: pd.DataFrame, freq: str = "D") -> Dict[str, Any]:
+    """
+    Długa ramka sprzedaży (surowa po normalize_sales_df albo z aggregate_sales) → dict CSR
+    dla wszystkich szeregów SKU (× magazyn) – bez budowania gęstej macierzy i bez resamplingu.
+
+    Jak w pivot_sales_matrix: szereg startuje w okresie pierwszego wiersza, kończy się
+    na wspólnym ostatnim okresie danych. Dodatkowo w dict:
+    "keys" (klucze szeregów), "start" (ordinal okresu startu), "end_period" (pd.Period), "freq".
+    """
+    key_cols = series_key_cols(df)
+    out: Dict[str, Any] = {
+        "keys": pd.DataFrame(columns=key_cols),
+        **_sparse_from_events(np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64),
+                              np.empty(0), np.empty(0, dtype=np.int64)),
+        "start": np.empty(0, dtype=np.int64),
+        "end_period": None,
+        "freq": freq,
+    }
+    if df is None or df.empty or CONFIG.date_col not in df.columns or CONFIG.qty_col not in df.columns:
+        return out
+
+    dates = pd.to_datetime(df[CONFIG.date_col], errors="coerce")
+    ok = dates.notna().to_numpy()
+    if not ok.any():
+        return out
+    sdf = df.loc[ok, key_cols]
+    ordinals = dates[ok].dt.to_period(freq).array.asi8
+    qty = pd.to_numeric(df.loc[ok, CONFIG.qty_col], errors="coerce").fillna(0.0).to_numpy(dtype=float)
+
+    grouped = sdf.groupby(key_cols, sort=True, dropna=False)
+    codes = grouped.ngroup().to_numpy()
+    keys = grouped.size().index.to_frame(index=False)[key_cols]
+    n_series = len(keys)
+
+    start = np.full(n_series, np.iinfo(np.int64).max, dtype=np.int64)
+    np.minimum.at(start, codes, ordinals)
+    end = int(ordinals.max())
+
+    # sumujemy wiersze z tego samego (szereg, okres) – po sortowaniu to sąsiednie elementy
+    order = np.lexsort((ordinals, codes))
+    codes, ordinals, qty = codes[order], ordinals[order], qty[order]
+    boundary = np.ones(codes.shape[0], dtype=bool)
+    boundary[1:] = (codes[1:] != codes[:-1]) | (ordinals[1:] != ordinals[:-1])
+    heads = np.flatnonzero(boundary)
+    sizes = np.add.reduceat(qty, heads)
+    codes, ordinals = codes[heads], ordinals[heads]
+
+    out.update(_sparse_from_events(codes, ordinals - start[codes], sizes, end - start + 1))
+    out["keys"] = keys
+    out["start"] = start
+    out["end_period"] = pd.Period(ordinal=end, freq=freq)
+    return out
+
+
+def sparse_period_labels(sp: Dict[str, Any]) -> pd.DatetimeIndex:
+    """Etykieta ostatniego okresu danych (jak ostatni element pivot["periods"])."""
+    if sp.get("end_period") is None:
+        return pd.DatetimeIndex([])
+    return period_labels(pd.period_range(start=sp["end_period"], periods=1))
+
+
+def drop_last_period(sp: Dict[str, Any]) -> Dict[str, Any]:
+    """Ta sama reprezentacja bez ostatniego okresu (do szybkiego APE ostatniego punktu)."""
+    n_periods = sp["n_periods"]
+    codes = np.repeat(np.arange(n_periods.shape[0]), np.diff(sp["indptr"]))
+    keep = sp["positions"] < n_periods[codes] - 1
+    return _sparse_from_events(
+        codes[keep], sp["positions"][keep], sp["sizes"][keep], np.maximum(n_periods - 1, 0)
+    )
+
+
+# ─────────────────────────────────────────────────────────────
+# Croston / SBA / TSB – wektorowo po zdarzeniach
+# ─────────────────────────────────────────────────────────────
+
+def _smoothed_final(
+    values: np.ndarray,
+    codes: np.ndarray,
+    rank_from_end: np.ndarray,
+    counts: np.ndarray,
+    init: np.ndarray,
+    alpha: float,
+) -> np.ndarray:
+    """
+    Stan końcowy wygładzania s ← s + α(x − s) po zdarzeniach każdego szeregu:
+    (1 − α)^n · init + Σ α(1 − α)^k · x, k = ile zdarzeń szeregu było później.
+    """
+    decay = np.log1p(-alpha)
+    weights = alpha * np.exp(decay * rank_from_end)
+    total = np.bincount(codes, weights=weights * values, minlength=counts.shape[0])
+    return np.exp(decay * counts) * init + total
+
+
+def intermittent_forecast_sparse(
+    sp: Dict[str, Any],
+    periods: int,
+    method: str = "sba",
+    alpha: float = DEFAULT_ALPHA,
+    beta: float = DEFAULT_BETA,
+) -> np.ndarray:
+    """
+    Prognoza (S × periods) z reprezentacji CSR. Prognoza tych metod jest płaska (średni popyt
+    na okres). Szereg bez żadnego zdarzenia → 0.
+    """
+    indptr = sp["indptr"]
+    n_series = indptr.shape[0] - 1
+    counts = np.diff(indptr)
+    has = counts > 0
+    level = np.zeros(n_series)
+    if has.any():
+        codes = np.repeat(np.arange(n_series), counts)
+        rank_from_end = (indptr[1:][codes] - 1 - np.arange(indptr[-1])).astype(float)
+        n_periods = sp["n_periods"].astype(float)
+        n = np.maximum(counts, 1).astype(float)
+
+        size0 = np.bincount(codes, weights=sp["sizes"], minlength=n_series) / n
+        size = _smoothed_final(sp["sizes"], codes, rank_from_end, counts, size0, alpha)
+        if method == "tsb":
+            # π wygładzane w każdym okresie: zdarzenie to 1, pozostałe okresy to 0
+            decay = np.log1p(-beta)
+            since = n_periods[codes] - 1 - sp["positions"]
+            hits = np.bincount(codes, weights=beta * np.exp(decay * since), minlength=n_series)
+            prob = np.exp(decay * n_periods) * (counts / np.maximum(n_periods, 1)) + hits
+            rate = prob * size
+        else:
+            interval0 = n_periods / n
+            interval = _smoothed_final(sp["intervals"], codes, rank_from_end, counts, interval0, alpha)
+            rate = size / np.maximum(interval, 1e-9)
+            if method == "sba":
+                rate *= 1.0 - alpha / 2.0
+        level[has] = rate[has]
+    return np.repeat(np.maximum(level, 0.0)[:, None], periods, axis=1)
+
+
+def intermittent_forecast_matrix(y: np.ndarray, periods: int, method: str = "sba") -> np.ndarray:
+    """Wersja na gęstej macierzy historii (backtest, forecast_matrix) – konwersja do CSR + ten sam rdzeń."""
+    return intermittent_forecast_sparse(sparse_from_matrix(y), periods, method=method)
+
@@ -0,0 +1,354 @@
+# oi/lead_times.py
+from __future__ import annotations
+"""
+Empiryczne czasy dostaw (lead time) z wgranych plików dostaw.
+
+Rekomendacje i symulacje brały jedną liczbę lead time z UI. Tutaj liczymy rozkład
+faktycznego czasu dostawy per dostawca × SKU:
+- czas dostawy wiersza = data przyjęcia − data zamówienia (albo gotowa kolumna lead_time_days),
+- indeks to histogram: (dostawca, sku, dni) → liczba dostaw – jeden groupby na wszystkich
+  wierszach; średnia, wariancja i kwantyle wynikają wprost z histogramu,
+- histogramy się sumują, więc nowy plik dostaw dokłada tylko swoje wiersze (update);
+  pliki już widziane rozpoznajemy po odcisku treści i pomijamy,
+- lookup / pmf_matrix zwracają statystyki i rozkłady dla wielu SKU naraz (merge, bez pętli po SKU),
+  z fallbackiem: dostawca × SKU → SKU (wszyscy dostawcy) → dostawca → cały indeks.
+
+Konsumenci:
+- optimization.calc_safety_stock (odchylenie lead time w zapasie bezpieczeństwa),
+- optimization.build_inventory_recommendation(s) (lead_time_dist / lead_time_index),
+- simulation: simulate_portfolio / optimize_reorder_points (losowy lead time każdego zamówienia)
+  i monte_carlo_policy_events (suppliers_for → lista dostawców z rozkładem empirycznym).
+"""
+
+import os
+import pickle
+import tempfile
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from .config import CONFIG
+from .preprocessing import normalize_deliveries_df
+
+# kwantyle w tabeli statystyk
+LEAD_TIME_QUANTILES: Tuple[float, ...] = (0.5, 0.9, 0.95)
+
+# poziomy indeksu – od najdokładniejszego; lookup schodzi w dół, gdy brakuje danych
+LEAD_TIME_LEVELS: Tuple[str, ...] = ("supplier_sku", "sku", "supplier", "all")
+
+# czas dostawy dłuższy niż rok traktujemy jako błąd w datach
+_MAX_LEAD_TIME_DAYS = 365
+
+# podbij, gdy zmieni się format zapisu
+_INDEX_VERSION = 1
+
+# dostawy bez kolumny dostawcy
+_NO_SUPPLIER = "(brak)"
+
+
+def _level_cols(level: str) -> List[str]:
+    return {
+        "supplier_sku": [CONFIG.supplier_col, CONFIG.sku_col],
+        "sku": [CONFIG.sku_col],
+        "supplier": [CONFIG.supplier_col],
+        "all": [],
+    }[level]
+
+
+def delivery_lead_times(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Czas dostawy (pełne dni) każdego wiersza dostaw: kolumny supplier_col, sku_col, lead_time_days.
+    Wiersze bez SKU / dat albo z czasem < 0 lub > rok odrzucamy.
+    """
+    df = normalize_deliveries_df(df)
+    out_cols = [CONFIG.supplier_col, CONFIG.sku_col, "lead_time_days"]
+    if CONFIG.sku_col not in df.columns:
+        return pd.DataFrame(columns=out_cols)
+
+    if "lead_time_days" in df.columns:
+        lead = pd.to_numeric(df["lead_time_days"], errors="coerce")
+    elif CONFIG.date_col in df.columns and CONFIG.order_date_col in df.columns:
+        lead = (df[CONFIG.date_col] - df[CONFIG.order_date_col]).dt.days
+    else:
+        return pd.DataFrame(columns=out_cols)
+
+    supplier = df[CONFIG.supplier_col] if CONFIG.supplier_col in df.columns else pd.Series(_NO_SUPPLIER, index=df.index)
+    out = pd.DataFrame({
+        CONFIG.supplier_col: supplier.fillna(_NO_SUPPLIER).astype(str),
+        CONFIG.sku_col: df[CONFIG.sku_col],
+        "lead_time_days": lead.round(),
+    })
+    ok = out[CONFIG.sku_col].notna() & out["lead_time_days"].between(0, _MAX_LEAD_TIME_DAYS)
+    out = out.loc[ok].copy()
+    out["lead_time_days"] = out["lead_time_days"].astype(np.int64)
+    return out
+
+
+def _frame_fingerprint(df: pd.DataFrame) -> str:
+    """
+    Odcisk treści ramki – ten sam plik wgrany ponownie nie jest liczony drugi raz.
+
+    Hashe wierszy sumujemy (modulo 2^64) – wynik nie zależy od kolejności wierszy, a powtórzone
+    wiersze się nie znoszą (XOR dawał ten sam odcisk np. dla [A, A, C] i [B, B, C]):
+
+    >>> a = pd.DataFrame({"sku": ["A", "A", "C"], "dni": [3, 3, 5]})
+    >>> b = pd.DataFrame({"sku": ["B", "B", "C"], "dni": [4, 4, 5]})
+    >>> _frame_fingerprint(a) == _frame_fingerprint(b)
+    False
+    >>> _frame_fingerprint(a) == _frame_fingerprint(a.iloc[::-1])
+    True
+    """
+    hashed = pd.util.hash_pandas_object(df, index=False).to_numpy()
+    total = int(hashed.sum(dtype=np.uint64)) if hashed.size else 0
+    return f"{len(df)}:{'|'.join(map(str, df.columns))}:{total}"
+
+
+def _histogram_stats(hist: pd.DataFrame, cols: List[str], quantiles: Sequence[float]) -> pd.DataFrame:
+    """n, mean, var, std, min, max i kwantyle z histogramu (kolumny cols + lead_time_days + count)."""
+    if not cols:
+        hist = hist.assign(_all=0)
+        cols = ["_all"]
+    h = hist.groupby(cols + ["lead_time_days"], sort=True, observed=True)["count"].sum().reset_index()
+    v = h["lead_time_days"].to_numpy(dtype=float)
+    c = h["count"].to_numpy(dtype=float)
+    grouped = h.assign(_v=v * c, _v2=v * v * c).groupby(cols, sort=False, observed=True)
+    stats = grouped.agg(
+        n=("count", "sum"), _s=("_v", "sum"), _s2=("_v2", "sum"),
+        min=("lead_time_days", "min"), max=("lead_time_days", "max"),
+    )
+    n = stats["n"].to_numpy(dtype=float)
+    mean = stats["_s"].to_numpy() / n
+    # wariancja z próby (ddof=1); jedna dostawa → 0
+    var = np.where(n > 1, (stats["_s2"].to_numpy() - n * mean ** 2) / np.where(n > 1, n - 1, 1), 0.0)
+    stats["mean"] = mean
+    stats["var"] = np.maximum(var, 0.0)
+    stats["std"] = np.sqrt(stats["var"])
+
+    # kwantyl = pierwsza wartość, przy której skumulowany udział dostaw osiąga q
+    frac = h.groupby(cols, sort=False, observed=True)["count"].cumsum().to_numpy() / np.repeat(n, grouped.size().to_numpy())
+    for q in quantiles:
+        first = h.loc[frac >= q - 1e-12].drop_duplicates(cols, keep="first").set_index(cols)["lead_time_days"]
+        stats[f"p{q * 100:g}"] = first.reindex(stats.index).to_numpy(dtype=float)
+
+    stats = stats.drop(columns=["_s", "_s2"]).reset_index()
+    stats["n"] = stats["n"].astype(np.int64)
+    return stats.drop(columns=["_all"], errors="ignore")
+
+
+class LeadTimeIndex:
+    """
+    Indeks rozkładów czasu dostawy – histogram (dostawca, sku, dni) → liczba dostaw.
+
+    update(frames) dokłada nowe pliki dostaw (te same pliki ponownie → pomijane),
+    stats(level) daje tabelę statystyk, lookup / pmf_matrix / suppliers_for – rozkłady
+    dla konsumentów (zapas bezpieczeństwa, symulacje).
+    """
+
+    def __init__(self, hist: Optional[pd.DataFrame] = None, seen: Optional[Iterable[str]] = None) -> None:
+        cols = [CONFIG.supplier_col, CONFIG.sku_col, "lead_time_days", "count"]
+        self.hist = hist.reset_index(drop=True) if hist is not None else pd.DataFrame(columns=cols)
+        self.seen = set(seen or ())
+        self._stats: Dict[str, pd.DataFrame] = {}
+
+    def __len__(self) -> int:
+        return int(self.hist["count"].sum()) if len(self.hist) else 0
+
+    # ── aktualizacja
+
+    def is_stale(self, frames: Union[pd.DataFrame, Sequence[pd.DataFrame], None]) -> bool:
+        """
+        True, gdy indeks zawiera pliki, których nie ma już w frames (usunięte albo podmienione
+        na poprawioną wersję) – wtedy trzeba go zbudować od nowa, bo update tylko dokłada.
+        """
+        if frames is None:
+            frames = []
+        elif isinstance(frames, pd.DataFrame):
+            frames = [frames]
+        return not self.seen <= {_frame_fingerprint(df) for df in frames}
+
+    def update(self, frames: Union[pd.DataFrame, Sequence[pd.DataFrame], None]) -> Dict[str, int]:
+        """
+        Dokłada pliki dostaw (surowe ramki – normalizujemy je tutaj).
+        Zwraca podsumowanie: new_files, skipped_files, deliveries (użyte wiersze), ignored_rows.
+        """
+        if frames is None:
+            frames = []
+        elif isinstance(frames, pd.DataFrame):
+            frames = [frames]
+        summary = {"new_files": 0, "skipped_files": 0, "deliveries": 0, "ignored_rows": 0}
+        parts: List[pd.DataFrame] = []
+        for df in frames:
+            fp = _frame_fingerprint(df)
+            if fp in self.seen:
+                summary["skipped_files"] += 1
+                continue
+            self.seen.add(fp)
+            lt = delivery_lead_times(df)
+            summary["new_files"] += 1
+            summary["deliveries"] += len(lt)
+            summary["ignored_rows"] += len(df) - len(lt)
+            parts.append(lt)
+        if not parts or not any(len(p) for p in parts):
+            return summary
+
+        key_cols = [CONFIG.supplier_col, CONFIG.sku_col, "lead_time_days"]
+        fresh = pd.concat(parts, ignore_index=True).groupby(key_cols, sort=False).size().rename("count").reset_index()
+        combined = pd.concat([self.hist, fresh], ignore_index=True) if len(self.hist) else fresh
+        combined["count"] = combined["count"].astype(np.int64)
+        self.hist = combined.groupby(key_cols, sort=True)["count"].sum().reset_index()
+        self._stats.clear()
+        return summary
+
+    # ── statystyki
+
+    def stats(self, level: str = "supplier_sku") -> pd.DataFrame:
+        """Tabela: klucze poziomu + n, mean, var, std, min, max, p50, p90, p95 (w dniach)."""
+        if level not in LEAD_TIME_LEVELS:
+            raise ValueError(f"Nieznany poziom '{level}' – dostępne: {', '.join(LEAD_TIME_LEVELS)}.")
+        if level not in self._stats:
+            cols = _level_cols(level)
+            if not len(self.hist):
+                qcols = [f"p{q * 100:g}" for q in LEAD_TIME_QUANTILES]
+                self._stats[level] = pd.DataFrame(columns=cols + ["n", "min", "max", "mean", "var", "std", *qcols])
+            else:
+                self._stats[level] = _histogram_stats(self.hist, cols, LEAD_TIME_QUANTILES)
+        return self._stats[level]
+
+    def _match_level(self, keys: pd.DataFrame) -> Tuple[np.ndarray, List[Tuple[str, np.ndarray]]]:
+        """Dla każdego wiersza keys: najdokładniejszy poziom z danymi + indeks wiersza w stats(poziom)."""
+        n = len(keys)
+        level = np.full(n, "", dtype=object)
+        found: List[Tuple[str, np.ndarray]] = []
+        for lvl in LEAD_TIME_LEVELS:
+            cols = _level_cols(lvl)
+            if any(c not in keys.columns for c in cols):
+                continue
+            table = self.stats(lvl)
+            if table.empty:
+                continue
+            if cols:
+                idx = pd.MultiIndex.from_frame(table[cols].astype(str)).get_indexer(
+                    pd.MultiIndex.from_frame(keys[cols].astype(str))
+                )
+            else:
+                idx = np.zeros(n, dtype=np.int64)
+            take = (level == "") & (idx >= 0)
+            level[take] = lvl
+            found.append((lvl, np.where(take, idx, -1)))
+        return level, found
+
+    def lookup(self, keys: pd.DataFrame) -> pd.DataFrame:
+        """
+        Statystyki lead time dla wielu szeregów naraz (kolumny sku_col [+ supplier_col]).
+        Zwraca ramkę w kolejności keys: lead_time_mean, lead_time_std, lead_time_p95, lead_time_n,
+        lead_time_source (poziom indeksu albo "" – brak danych, wtedy NaN).
+        """
+        keys = keys.reset_index(drop=True)
+        out = pd.DataFrame({
+            "lead_time_mean": np.nan, "lead_time_std": np.nan, "lead_time_p95": np.nan, "lead_time_n": 0,
+        }, index=keys.index)
+        level, found = self._match_level(keys)
+        for lvl, idx in found:
+            rows = idx >= 0
+            table = self.stats(lvl)
+            out.loc[rows, "lead_time_mean"] = table["mean"].to_numpy()[idx[rows]]
+            out.loc[rows, "lead_time_std"] = table["std"].to_numpy()[idx[rows]]
+            out.loc[rows, "lead_time_p95"] = table["p95"].to_numpy()[idx[rows]]
+            out.loc[rows, "lead_time_n"] = table["n"].to_numpy()[idx[rows]]
+        out["lead_time_source"] = level
+        return out
+
+    def pmf_matrix(self, keys: pd.DataFrame) -> Dict[str, Any]:
+        """
+        Rozkłady lead time dla wielu szeregów jako macierz: values (0 … max dni),
+        probs (len(keys) × len(values)) – wiersz bez danych ma NaN. Fallback poziomów jak w lookup.
+        """
+        keys = keys.reset_index(drop=True)
+        n = len(keys)
+        if not len(self.hist):
+            return {"values": np.zeros(1, dtype=np.int64), "probs": np.full((n, 1), np.nan)}
+        values = np.arange(int(self.hist["lead_time_days"].max()) + 1)
+        probs = np.full((n, values.size), np.nan)
+        _, found = self._match_level(keys)
+        for lvl, idx in found:
+            rows = np.flatnonzero(idx >= 0)
+            if rows.size == 0:
+                continue
+            cols = _level_cols(lvl) or ["_all"]
+            h = self.hist.assign(_all=0)
+            table = self.stats(lvl).assign(_all=0)
+            code = pd.MultiIndex.from_frame(table[cols].astype(str)).get_indexer(
+                pd.MultiIndex.from_frame(h[cols].astype(str))
+            )
+            dense = np.zeros((len(table), values.size))
+            np.add.at(dense, (code, h["lead_time_days"].to_numpy()), h["count"].to_numpy(dtype=float))
+            dense /= dense.sum(axis=1, keepdims=True)
+            probs[rows] = dense[idx[rows]]
+        return {"values": values, "probs": probs}
+
+    def distribution(self, sku: Any, supplier: Optional[Any] = None) -> Optional[Dict[str, Any]]:
+        """Rozkład jednego SKU: {values, probs, mean, std, source} albo None, gdy brak danych."""
+        keys = pd.DataFrame({CONFIG.sku_col: [sku]})
+        if supplier is not None:
+            keys[CONFIG.supplier_col] = [supplier]
+        pmf = self.pmf_matrix(keys)
+        probs = pmf["probs"][0]
+        if np.isnan(probs).any():
+            return None
+        stat = self.lookup(keys).iloc[0]
+        nz = probs > 0
+        return {
+            "values": pmf["values"][nz],
+            "probs": probs[nz],
+            "mean": float(stat["lead_time_mean"]),
+            "std": float(stat["lead_time_std"]),
+            "source": stat["lead_time_source"],
+        }
+
+    def suppliers_for(self, sku: Any) -> List[Dict[str, Any]]:
+        """
+        Dostawcy SKU w formacie simulation.monte_carlo_policy_events(suppliers=...):
+        udział = udział w liczbie dostaw, lead time z rozkładu empirycznego dostawcy.
+        """
+        if not len(self.hist):
+            return []
+        rows = self.hist[self.hist[CONFIG.sku_col].astype(str) == str(sku)]
+        out: List[Dict[str, Any]] = []
+        total = float(rows["count"].sum())
+        for name, grp in rows.groupby(CONFIG.supplier_col, sort=True):
+            counts = grp["count"].to_numpy(dtype=float)
+            out.append({
+                "name": name,
+                "share": float(counts.sum() / total),
+                "lead_time_values": grp["lead_time_days"].to_numpy(),
+                "lead_time_probs": counts / counts.sum(),
+            })
+        return out
+
+    # ── zapis / odczyt
+
+    def save(self, path: str) -> None:
+        """Zapis atomowy (plik tymczasowy + rename) do pliku pickle."""
+        payload = {"version": _INDEX_VERSION, "hist": self.hist, "seen": sorted(self.seen)}
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        with os.fdopen(fd, "wb") as fh:
+            pickle.dump(payload, fh, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str) -> "LeadTimeIndex":
+        with open(path, "rb") as fh:
+            payload = pickle.load(fh)
+        if not isinstance(payload, dict) or payload.get("version") != _INDEX_VERSION:
+            raise ValueError(f"Nieobsługiwany format indeksu czasów dostaw: {path}")
+        return cls(hist=payload["hist"], seen=payload["seen"])
+
+
+def build_lead_time_index(frames: Union[pd.DataFrame, Sequence[pd.DataFrame], None]) -> LeadTimeIndex:
+    """Indeks od zera z listy ramek dostaw (np. st.session_state.uploaded_data["dostawy"])."""
+    index = LeadTimeIndex()
+    index.update(frames)
+    return index
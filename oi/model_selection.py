@@ -0,0 +1,274 @@
+# oi/model_selection.py
+from __future__ import annotations
+"""
+Automatyczny wybór metody prognozy per szereg – z budżetem liczenia zależnym od wartości SKU.
+
+Kroki (tryb method="auto"):
+1. klasyfikacja ABC / XYZ z tanich statystyk macierzy historii
+   - ABC: udział w wolumenie (A = pierwsze 80% sprzedaży, B = kolejne 15%, C = reszta),
+   - XYZ: zmienność (CV popytu okresowego: X ≤ 0.5 < Y ≤ 1.0 < Z),
+2. przydział do poziomu (tier):
+   - "cheap"    – C albo X (mało warte albo stabilne): od razu CHEAP_METHOD, bez backtestu,
+   - "standard" – B × (Y, Z): krótki backtest tanich metod wektorowych, wygrywa najniższe MAE,
+   - "premium"  – A × (Y, Z): dłuższy backtest, dodatkowo ETS / Holt-Winters i ciężkie modele
+     (np. Prophet) sprawdzone na ostatnim horyzoncie – tylko tutaj płacimy za dopasowania,
+3. prognoza: metody wektorowe liczymy grupami (jedno wywołanie na metodę),
+   ciężkie – przez forecast_executor tylko dla szeregów, które je wybrały.
+
+W meta każdego szeregu zapisujemy klasę, tier, wybraną metodę, wyniki kandydatów
+i przybliżony koszt liczenia (sekundy przypisane do szeregu).
+"""
+
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from .backtesting import backtest_mae_by_series
+from .ets import season_length_for
+from .forecasting import (
+    BATCH_FORECASTERS,
+    FORECASTERS,
+    _batch_result,
+    _n_valid,
+    forecast_matrix,
+)
+from .preprocessing import pivot_sales_matrix, series_key_cols
+
+# progi ABC (skumulowany udział wolumenu) i XYZ (współczynnik zmienności)
+ABC_THRESHOLDS = (0.80, 0.95)
+XYZ_THRESHOLDS = (0.5, 1.0)
+
+# metoda dla szeregów, na które nie warto wydawać liczenia
+CHEAP_METHOD = "ma"
+
+# ile punktów startu backtestu na poziom
+STANDARD_ORIGINS = 4
+PREMIUM_ORIGINS = 12
+
+# kandydaci backtestu: standard – tylko tanie metody, premium – dodatkowo wygładzanie wykładnicze
+STANDARD_METHODS = ("naive", "ma", "level_trend")
+PREMIUM_METHODS = STANDARD_METHODS + ("holt_damped", "hw_add")
+
+TIERS = ("cheap", "standard", "premium")
+
+
+# ─────────────────────────────────────────────────────────────
+# Klasyfikacja
+# ─────────────────────────────────────────────────────────────
+
+def classify_abc_xyz(y: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    ABC / XYZ dla każdego wiersza macierzy historii (NaN = przed startem szeregu).
+    Zwraca volume, cv, abc, xyz (tablice długości n_series).
+    """
+    y = np.asarray(y, dtype=float)
+    n = _n_valid(y)
+    volume = np.nansum(y, axis=1)
+    mean = volume / np.where(n > 0, n, 1)
+    sq = np.nansum((y - mean[:, None]) ** 2, axis=1)
+    std = np.sqrt(sq / np.where(n > 1, n - 1, 1))
+    cv = np.divide(std, mean, out=np.full_like(mean, np.inf), where=mean > 0)
+    cv[n < 2] = np.inf  # za krótka historia = nie wiemy, traktuj jak zmienny
+
+    order = np.argsort(-volume, kind="stable")
+    total = volume.sum()
+    share_before = np.empty_like(volume)
+    # udział wolumenu przed danym szeregiem – szereg, który "przekracza" 80%, jest jeszcze A
+    share_before[order] = (np.cumsum(volume[order]) - volume[order]) / total if total > 0 else 1.0
+    abc = np.where(share_before < ABC_THRESHOLDS[0], "A", np.where(share_before < ABC_THRESHOLDS[1], "B", "C"))
+    abc[volume <= 0] = "C"
+
+    xyz = np.where(cv <= XYZ_THRESHOLDS[0], "X", np.where(cv <= XYZ_THRESHOLDS[1], "Y", "Z"))
+    return {"volume": volume, "cv": cv, "abc": abc.astype(object), "xyz": xyz.astype(object)}
+
+
+def assign_tiers(abc: np.ndarray, xyz: np.ndarray) -> np.ndarray:
+    """C albo X → cheap, B × (Y, Z) → standard, A × (Y, Z) → premium."""
+    abc = np.asarray(abc)
+    xyz = np.asarray(xyz)
+    volatile = xyz != "X"
+    tiers = np.full(abc.shape, "cheap", dtype=object)
+    tiers[(abc == "B") & volatile] = "standard"
+    tiers[(abc == "A") & volatile] = "premium"
+    return tiers
+
+
+# ─────────────────────────────────────────────────────────────
+# Wybór metody
+# ─────────────────────────────────────────────────────────────
+
+def _heavy_holdout_mae(
+    y: np.ndarray,
+    first: np.ndarray,
+    index: pd.DatetimeIndex,
+    horizon: int,
+    method: str,
+    n_jobs: Optional[int],
+    timeout_s: Optional[float],
+) -> np.ndarray:
+    """MAE ciężkiego modelu na ostatnim horyzoncie (fit na historii bez niego)."""
+    from .forecast_executor import forecast_rows
+
+    n_periods = y.shape[1]
+    mae = np.full(y.shape[0], np.nan)
+    if n_periods <= horizon:
+        return mae
+    cut = n_periods - horizon
+    ok = first < cut - 2  # model potrzebuje choć kilku punktów historii
+    if not ok.any():
+        return mae
+    fc, _, statuses, _ = forecast_rows(
+        y[ok, :cut], first[ok], index[:cut], horizon, method, n_jobs=n_jobs, timeout_s=timeout_s
+    )
+    err = np.abs(fc - y[ok, cut:]).mean(axis=1)
+    # fallback (timeout / błąd) to nie jest wynik tego modelu – nie może wygrać wyboru
+    err[statuses != "ok"] = np.nan
+    mae[ok] = err
+    return mae
+
+
+def _pick_best(scores: Dict[str, np.ndarray], n_rows: int) -> np.ndarray:
+    """Metoda o najniższym MAE w każdym wierszu; brak ocen → CHEAP_METHOD."""
+    # CHEAP_METHOD na początku – przy remisie wygrywa najtańsza metoda
+    names = sorted(scores, key=lambda m: m != CHEAP_METHOD)
+    if not names:
+        return np.full(n_rows, CHEAP_METHOD, dtype=object)
+    stacked = np.vstack([np.where(np.isnan(scores[m]), np.inf, scores[m]) for m in names])
+    best = np.asarray(names, dtype=object)[np.argmin(stacked, axis=0)]
+    best[~np.isfinite(stacked.min(axis=0))] = CHEAP_METHOD
+    return best
+
+
+def forecast_auto(
+    df: pd.DataFrame,
+    periods: int = 8,
+    freq: str = "W",
+    heavy_methods: Optional[Sequence[str]] = None,
+    n_jobs: Optional[int] = -1,
+    timeout_s: Optional[float] = None,
+    progress_callback: Optional[Any] = None,
+) -> Dict[str, Any]:
+    """
+    forecast_all z method="auto": wybór metody per szereg wg ABC/XYZ i poziomu liczenia.
+
+    heavy_methods – ciężkie modele sprawdzane w tierze premium (domyślnie: wszystkie
+    z FORECASTERS bez wersji wektorowej, np. "prophet", jeśli zainstalowany).
+
+    Wynik jak forecast_all; meta ma dodatkowo: abc, xyz, tier, selection
+    (dict metoda → MAE z backtestu) i compute_s (sekundy liczenia przypisane do szeregu).
+    run_info podsumowuje liczność i koszt każdego tieru.
+    """
+    if heavy_methods is None:
+        heavy_methods = [m for m in FORECASTERS if m not in BATCH_FORECASTERS]
+    heavy_methods = [m for m in heavy_methods if m in FORECASTERS and m not in BATCH_FORECASTERS]
+    season_length = season_length_for(freq)
+
+    pivot = pivot_sales_matrix(df, freq=freq)
+    keys = pivot["keys"]
+    key_cols = list(keys.columns) if len(keys.columns) else series_key_cols(df)
+    y = pivot["values"]
+    first = pivot["first_period"]
+    index = pivot["periods"]
+    n_series = len(keys)
+    if n_series == 0:
+        return _batch_result(pivot, key_cols, np.empty((0, periods)), freq, "auto")
+
+    compute_s = np.zeros(n_series)
+    tier_cost: Dict[str, float] = {t: 0.0 for t in TIERS}
+
+    # ── 1. klasyfikacja (tanie statystyki całej macierzy)
+    t0 = time.perf_counter()
+    cls = classify_abc_xyz(y)
+    tiers = assign_tiers(cls["abc"], cls["xyz"])
+    compute_s += (time.perf_counter() - t0) / n_series
+
+    selected = np.full(n_series, CHEAP_METHOD, dtype=object)
+    selection: List[Optional[Dict[str, float]]] = [None] * n_series
+
+    # ── 2. wybór metody – backtesty tylko tam, gdzie tier na to zasługuje
+    plan = (
+        ("standard", STANDARD_ORIGINS, STANDARD_METHODS, []),
+        ("premium", PREMIUM_ORIGINS, PREMIUM_METHODS, heavy_methods),
+    )
+    for tier, n_origins, candidates, heavy in plan:
+        rows = np.flatnonzero(tiers == tier)
+        if rows.size == 0:
+            continue
+        t0 = time.perf_counter()
+        scores = backtest_mae_by_series(y[rows], periods, n_origins, candidates, season_length=season_length)
+        for method in heavy:
+            scores[method] = _heavy_holdout_mae(y[rows], first[rows], index, periods, method, n_jobs, timeout_s)
+        selected[rows] = _pick_best(scores, rows.size)
+        for j, r in enumerate(rows):
+            selection[r] = {m: float(v[j]) for m, v in scores.items() if np.isfinite(v[j])}
+        spent = time.perf_counter() - t0
+        compute_s[rows] += spent / rows.size
+        tier_cost[tier] += spent
+
+    # ── 3. prognozy – metody wektorowe grupami, ciężkie tylko dla szeregów, które je wybrały
+    fc = np.empty((n_series, periods))
+    status = np.full(n_series, "ok", dtype=object)
+    used = selected.copy()
+    done = 0
+    for method in pd.unique(selected):
+        rows = np.flatnonzero(selected == method)
+        t0 = time.perf_counter()
+        if method in BATCH_FORECASTERS:
+            fc[rows] = forecast_matrix(y[rows], periods, method, season_length)
+        else:
+            from .forecast_executor import forecast_rows
+
+            fc[rows], used[rows], status[rows], _ = forecast_rows(
+                y[rows], first[rows], index, periods, method, n_jobs=n_jobs, timeout_s=timeout_s
+            )
+        spent = time.perf_counter() - t0
+        compute_s[rows] += spent / rows.size
+        for tier in TIERS:
+            tier_cost[tier] += spent * float(np.mean(tiers[rows] == tier))
+        done += rows.size
+        if progress_callback is not None:
+            progress_callback(done, n_series)
+
+    res = _batch_result(pivot, key_cols, fc, freq, "auto", status=status, methods_used=used)
+    meta = res["meta"]
+    meta["abc"] = cls["abc"]
+    meta["xyz"] = cls["xyz"]
+    meta["tier"] = tiers
+    meta["selection"] = selection
+    meta["compute_s"] = compute_s
+
+    res["run_info"] = {
+        "requested_method": "auto",
+        "tiers": {t: int(np.sum(tiers == t)) for t in TIERS},
+        "tier_compute_s": tier_cost,
+        "heavy_methods": list(heavy_methods),
+        "elapsed_s": float(compute_s.sum()),
+    }
+    return res
+
+
+def select_method_for_series(y: pd.Series, periods: int) -> Dict[str, Any]:
+    """
+    Wybór metody dla pojedynczego szeregu (forecast_sku z method="auto").
+    Bez kontekstu portfela nie ma ABC, więc decyduje tylko XYZ:
+    stabilny (X) → CHEAP_METHOD, zmienny → backtest metod wektorowych (jak tier "standard").
+    """
+    t0 = time.perf_counter()
+    row = np.asarray(y, dtype=float)[None, :]
+    cls = classify_abc_xyz(row)
+    xyz = str(cls["xyz"][0])
+    if xyz == "X":
+        method, scores = CHEAP_METHOD, {}
+    else:
+        mae = backtest_mae_by_series(row, periods, STANDARD_ORIGINS, STANDARD_METHODS)
+        method = str(_pick_best(mae, 1)[0])
+        scores = {m: float(v[0]) for m, v in mae.items() if np.isfinite(v[0])}
+    return {
+        "method": method,
+        "xyz": xyz,
+        "tier": "cheap" if xyz == "X" else "standard",
+        "selection": scores,
+        "compute_s": time.perf_counter() - t0,
+    }
@@ -0,0 +1,228 @@
+# oi/multi_echelon.py
+from __future__ import annotations
+"""
+Zapas bezpieczeństwa w sieci dwupoziomowej: centrum dystrybucji (DC) → magazyny regionalne.
+
+optimization liczy każdy magazyn osobno – jakby każdy sam czekał na dostawcę. Tutaj zapas
+rozkładamy wspólnie modelem gwarantowanego czasu obsługi (guaranteed service, Graves–Willems):
+- DC dostaje towar od dostawcy po T_dc dniach i obiecuje magazynom czas obsługi S ∈ [0, T_dc],
+- magazyn i czeka na towar S + T_i dni (T_i – przerzut DC → magazyn) i sam obiecuje klientom
+  S_i (zwykle 0 – towar od ręki),
+- każdy węzeł chroni się zapasem na swój "czas netto" τ: DC τ = T_dc − S, magazyn τ = S + T_i − S_i,
+  zapas bezpieczeństwa = z · σ · √τ, koszt = Σ koszt utrzymania · zapas bezpieczeństwa.
+S = 0 to klasyczny układ "każdy poziom chroni swój lead time" (bufor w DC), S = T_dc – DC jako
+przeładownia bez zapasu. Dobre S zależy od tego, ile daje łączenie popytu w DC (σ DC < Σ σ magazynów)
+i od różnicy kosztów utrzymania.
+
+Popyt DC to suma popytu magazynów – liczymy go z długiej ramki sprzedaży groupby (SKU, okres),
+więc korelacja między magazynami jest w σ DC, a gęstej macierzy SKU × magazyn × okres nie budujemy.
+Solver: dla każdego SKU przegląd wszystkich całkowitych S od 0 do T_dc naraz – jeden krok to
+bincount kosztów magazynów do SKU (koszt w S jest wklęsły, więc optimum bywa na końcach przedziału,
+ale pełna siatka jest tania i nie zależy od tego założenia).
+"""
+
+from typing import Any, Dict, Optional
+
+import numpy as np
+import pandas as pd
+from scipy.special import ndtri
+
+from .config import CONFIG
+
+# parametry magazynów regionalnych, które można podać w network_df (brak → wartości domyślne)
+NETWORK_PARAM_COLS = ("lead_time_days", "holding_cost", "service_level", "service_time")
+
+
+def _group_demand_stats(
+    codes: np.ndarray,
+    col: np.ndarray,
+    qty: np.ndarray,
+    n_groups: int,
+    n_periods: int,
+    period_days: float,
+) -> Dict[str, np.ndarray]:
+    """
+    Dzienna średnia i odchylenie popytu grup z długich danych (kod grupy, okres, ilość).
+    Konwencja jak w pivot_sales_matrix: szereg istnieje od pierwszej sprzedaży, dalej brak = 0.
+    """
+    cell = codes * n_periods + col
+    uniq, inv = np.unique(cell, return_inverse=True)
+    summed = np.bincount(inv, weights=qty, minlength=uniq.size)
+    g = uniq // n_periods
+    first = np.full(n_groups, n_periods, dtype=np.int64)
+    np.minimum.at(first, g, uniq % n_periods)
+    n_obs = (n_periods - first).astype(float)
+    s1 = np.bincount(g, weights=summed, minlength=n_groups)
+    s2 = np.bincount(g, weights=summed * summed, minlength=n_groups)
+    mean = s1 / np.maximum(n_obs, 1.0)
+    var = np.where(n_obs > 1, (s2 - n_obs * mean ** 2) / np.maximum(n_obs - 1.0, 1.0), 0.0)
+    return {
+        "mean": mean / period_days,
+        "std": np.sqrt(np.maximum(var, 0.0)) / np.sqrt(period_days),
+        "n_obs": n_obs,
+    }
+
+
+def optimize_multi_echelon(
+    agg: pd.DataFrame,
+    freq: str = "W",
+    network_df: Optional[pd.DataFrame] = None,
+    dc_lead_time_days: Optional[int] = None,
+    dc_holding_cost: Optional[float] = None,
+    dc_service_level: Optional[float] = None,
+    lead_time_index: Optional[Any] = None,
+) -> Dict[str, Any]:
+    """
+    Wspólne rozmieszczenie zapasu bezpieczeństwa DC + magazyny regionalne (guaranteed service).
+
+    Wejście:
+    - agg: wynik preprocessing.aggregate_sales z kolumną magazynu (sku, magazyn, data, ilosc) –
+      sprzedaż magazynów regionalnych,
+    - network_df: opcjonalnie parametry magazynów – kolumna magazynu + dowolne z NETWORK_PARAM_COLS:
+      lead_time_days (przerzut z DC, domyślnie CONFIG.default_transfer_days), holding_cost (miesięczny
+      koszt utrzymania 1 szt.), service_level, service_time (czas obsługi obiecany klientom, domyślnie 0),
+    - dc_lead_time_days / dc_holding_cost / dc_service_level: parametry DC (None → CONFIG),
+    - lead_time_index: opcjonalnie oi.lead_times.LeadTimeIndex – czas dostawy do DC per SKU
+      (średnia z dostaw, zaokrąglona do dni) zamiast jednej liczby.
+
+    Zwraca dict:
+    {
+        "dc": DataFrame per SKU – popyt zagregowany, lead_time_days, service_time (S wybrane dla DC),
+              net_replenishment_days, safety_stock, base_stock, safety_stock_cost, total_cost,
+              cost_dc_buffer (S = 0), cost_cross_dock (S = T_dc), savings_vs_dc_buffer,
+        "locations": DataFrame per SKU × magazyn – popyt, lead_time_days, inbound_service_time,
+              service_time, net_replenishment_days, safety_stock, base_stock, safety_stock_cost,
+        "meta": {status, n_skus, n_locations, n_series, total_cost, dc_buffer_cost, freq},
+    }
+    base_stock = μ · τ + zapas bezpieczeństwa (poziom zamawiania do). Koszty – PLN / miesiąc.
+    status: "ok", "empty" albo "no_locations" (dane bez kolumny magazynu – nie ma sieci).
+    """
+    sku_col, loc_col = CONFIG.sku_col, CONFIG.location_col
+    empty: Dict[str, Any] = {
+        "dc": pd.DataFrame(),
+        "locations": pd.DataFrame(),
+        "meta": {"status": "empty", "n_skus": 0, "n_locations": 0, "n_series": 0,
+                 "total_cost": 0.0, "dc_buffer_cost": 0.0, "freq": freq},
+    }
+    if agg is None or agg.empty or CONFIG.date_col not in agg.columns or CONFIG.qty_col not in agg.columns:
+        return empty
+    if loc_col not in agg.columns:
+        empty["meta"]["status"] = "no_locations"
+        return empty
+
+    dates = pd.to_datetime(agg[CONFIG.date_col], errors="coerce")
+    ok = (dates.notna() & agg[sku_col].notna() & agg[loc_col].notna()).to_numpy()
+    if not ok.any():
+        return empty
+    df = agg.loc[ok, [sku_col, loc_col]]
+    ordinals = dates[ok].dt.to_period(freq).array.asi8
+    p_min, p_max = int(ordinals.min()), int(ordinals.max())
+    n_periods = p_max - p_min + 1
+    col = ordinals - p_min
+    periods = pd.period_range(start=pd.Period(ordinal=p_min, freq=freq), periods=n_periods)
+    period_days = float((periods[-1].end_time.normalize() - periods[0].start_time).days + 1) / n_periods
+    qty = pd.to_numeric(agg.loc[ok, CONFIG.qty_col], errors="coerce").fillna(0.0).to_numpy(dtype=float)
+
+    # ── 1. Popyt: szeregi SKU × magazyn i agregat per SKU (poziom DC) – bez gęstej macierzy
+    series = df.groupby([sku_col, loc_col], sort=True)
+    series_code = series.ngroup().to_numpy()
+    keys = series.size().index.to_frame(index=False)
+    n_series = len(keys)
+    sku_codes, skus = pd.factorize(keys[sku_col], sort=True)
+    n_sku = len(skus)
+
+    loc_stats = _group_demand_stats(series_code, col, qty, n_series, n_periods, period_days)
+    dc_stats = _group_demand_stats(sku_codes[series_code], col, qty, n_sku, n_periods, period_days)
+
+    # ── 2. Parametry węzłów
+    table = keys.copy()
+    if network_df is not None and not network_df.empty and loc_col in network_df.columns:
+        cols = [loc_col] + [c for c in NETWORK_PARAM_COLS if c in network_df.columns]
+        table = table.merge(network_df[cols].drop_duplicates(loc_col, keep="last"), on=loc_col, how="left")
+    defaults = {
+        "lead_time_days": CONFIG.default_transfer_days,
+        "holding_cost": CONFIG.default_holding_cost,
+        "service_level": CONFIG.default_service_level,
+        "service_time": 0.0,
+    }
+    par: Dict[str, np.ndarray] = {}
+    for name, default in defaults.items():
+        arr = (
+            pd.to_numeric(table[name], errors="coerce").to_numpy(dtype=float)
+            if name in table.columns else np.full(n_series, np.nan)
+        )
+        par[name] = np.where(np.isnan(arr), default, arr)
+    t_loc = np.maximum(np.round(par["lead_time_days"]), 0.0)
+    s_out = np.maximum(par["service_time"], 0.0)
+    z_loc = ndtri(np.clip(par["service_level"], 1e-6, 1 - 1e-6))
+    weight_loc = par["holding_cost"] * z_loc * loc_stats["std"]
+
+    t_dc = np.full(n_sku, float(CONFIG.default_lead_time_days if dc_lead_time_days is None else dc_lead_time_days))
+    if lead_time_index is not None:
+        lt = lead_time_index.lookup(pd.DataFrame({sku_col: skus}))["lead_time_mean"].to_numpy(dtype=float)
+        t_dc = np.where(np.isnan(lt), t_dc, np.round(lt))
+    t_dc = np.maximum(t_dc, 0.0)
+    h_dc = CONFIG.default_holding_cost if dc_holding_cost is None else float(dc_holding_cost)
+    z_dc = float(ndtri(np.clip(CONFIG.default_service_level if dc_service_level is None else dc_service_level,
+                               1e-6, 1 - 1e-6)))
+    weight_dc = h_dc * z_dc * dc_stats["std"]
+
+    # ── 3. Siatka czasów obsługi DC: koszt (SKU × kandydaci), redukcja magazynów przez bincount
+    n_cand = int(t_dc.max()) + 1
+    cost = np.empty((n_sku, n_cand))
+    for c in range(n_cand):
+        s_dc = np.minimum(float(c), t_dc)
+        tau_loc = np.maximum(s_dc[sku_codes] + t_loc - s_out, 0.0)
+        cost[:, c] = weight_dc * np.sqrt(t_dc - s_dc) + np.bincount(
+            sku_codes, weights=weight_loc * np.sqrt(tau_loc), minlength=n_sku
+        )
+    best = np.argmin(cost, axis=1)
+    s_best = np.minimum(best.astype(float), t_dc)
+    sku_idx = np.arange(n_sku)
+
+    # ── 4. Wynik per węzeł
+    tau_dc = t_dc - s_best
+    ss_dc = z_dc * dc_stats["std"] * np.sqrt(tau_dc)
+    inbound = s_best[sku_codes]
+    tau_loc = np.maximum(inbound + t_loc - s_out, 0.0)
+    ss_loc = z_loc * loc_stats["std"] * np.sqrt(tau_loc)
+
+    locations = keys.copy()
+    locations["daily_demand_mean"] = loc_stats["mean"]
+    locations["daily_demand_std"] = loc_stats["std"]
+    locations["lead_time_days"] = t_loc.astype(np.int64)
+    locations["inbound_service_time"] = inbound
+    locations["service_time"] = s_out
+    locations["net_replenishment_days"] = tau_loc
+    locations["safety_stock"] = ss_loc
+    locations["base_stock"] = loc_stats["mean"] * tau_loc + ss_loc
+    locations["safety_stock_cost"] = par["holding_cost"] * ss_loc
+
+    dc = pd.DataFrame({sku_col: skus})
+    dc["n_locations"] = np.bincount(sku_codes, minlength=n_sku)
+    dc["daily_demand_mean"] = dc_stats["mean"]
+    dc["daily_demand_std"] = dc_stats["std"]
+    dc["lead_time_days"] = t_dc.astype(np.int64)
+    dc["service_time"] = s_best
+    dc["net_replenishment_days"] = tau_dc
+    dc["safety_stock"] = ss_dc
+    dc["base_stock"] = dc_stats["mean"] * tau_dc + ss_dc
+    dc["safety_stock_cost"] = h_dc * ss_dc
+    dc["total_cost"] = cost[sku_idx, best]
+    dc["cost_dc_buffer"] = cost[:, 0]
+    dc["cost_cross_dock"] = cost[sku_idx, t_dc.astype(np.int64)]
+    dc["savings_vs_dc_buffer"] = dc["cost_dc_buffer"] - dc["total_cost"]
+
+    return {
+        "dc": dc,
+        "locations": locations,
+        "meta": {
+            "status": "ok",
+            "n_skus": int(n_sku),
+            "n_locations": int(keys[loc_col].nunique()),
+            "n_series": int(n_series),
+            "total_cost": float(dc["total_cost"].sum()),
+            "dc_buffer_cost": float(dc["cost_dc_buffer"].sum()),
+            "freq": freq,
+        },
+    }
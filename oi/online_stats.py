@@ -0,0 +1,165 @@
+# oi/online_stats.py
+from __future__ import annotations
+"""
+Statystyki liczone "w locie" – bez trzymania wszystkich próbek w pamięci.
+
+Używane przez symulacje Monte Carlo:
+- RunningMoments – średnia / wariancja (Welford, łączenie paczek wzorem Chana),
+- przedziały ufności dla średniej i dla proporcji (Wilson),
+- TDigest – kwantyle strumienia w stałej pamięci,
+- helpery do zamiany poziomu ufności na kwantyl z.
+
+Wszystko przyjmuje całe paczki wartości (np. wynik jednego bloku symulacji),
+więc aktualizacja to kilka operacji NumPy, a nie pętla po próbkach.
+"""
+
+from typing import Any, Dict, Tuple
+
+import numpy as np
+from scipy.special import ndtri
+
+
+def z_for_confidence(confidence: float) -> float:
+    """0.95 -> 1.96 (dwustronny kwantyl rozkładu normalnego)."""
+    return float(ndtri(0.5 + confidence / 2.0))
+
+
+def wilson_half_width(successes: float, n: int, confidence: float = 0.95) -> float:
+    """
+    Połowa szerokości przedziału Wilsona dla proporcji.
+    W przeciwieństwie do wzoru p ± z·sqrt(p(1-p)/n) nie zeruje się przy p = 0 albo 1,
+    więc nadaje się jako kryterium stopu dla rzadkich stock-outów.
+    """
+    if n <= 0:
+        return float("inf")
+    z = z_for_confidence(confidence)
+    p = successes / n
+    denom = 1.0 + z * z / n
+    return float(z * np.sqrt(p * (1.0 - p) / n + z * z / (4.0 * n * n)) / denom)
+
+
+class RunningMoments:
+    """
+    Średnia i wariancja liczone przyrostowo (Welford), aktualizowane całymi paczkami.
+
+    Paczka ma kształt (n, *shape) – statystyki liczymy po osi 0,
+    więc można śledzić np. skalar (ending stock) albo wektor (profil per dzień).
+    """
+
+    def __init__(self) -> None:
+        self.count: int = 0
+        self.mean: Any = 0.0
+        self._m2: Any = 0.0
+
+    def update(self, values: np.ndarray) -> None:
+        """Dokłada paczkę wartości (łączenie momentów wzorem Chana)."""
+        values = np.asarray(values, dtype=float)
+        n_b = int(values.shape[0]) if values.ndim else 1
+        if n_b == 0:
+            return
+        mean_b = values.mean(axis=0)
+        m2_b = ((values - mean_b) ** 2).sum(axis=0)
+
+        n_a = self.count
+        n = n_a + n_b
+        delta = mean_b - self.mean
+        self.mean = self.mean + delta * (n_b / n)
+        self._m2 = self._m2 + m2_b + delta * delta * (n_a * n_b / n)
+        self.count = n
+
+    @property
+    def variance(self) -> Any:
+        """Wariancja z próby (ddof=1); przy < 2 obserwacjach zwraca 0."""
+        if self.count < 2:
+            return np.zeros_like(self.mean) if np.ndim(self.mean) else 0.0
+        return self._m2 / (self.count - 1)
+
+    @property
+    def std(self) -> Any:
+        return np.sqrt(self.variance)
+
+    @property
+    def sem(self) -> Any:
+        """Błąd standardowy średniej."""
+        if self.count < 2:
+            return np.full_like(self.mean, np.inf) if np.ndim(self.mean) else float("inf")
+        return np.sqrt(self.variance / self.count)
+
+    def ci_half_width(self, confidence: float = 0.95) -> Any:
+        """Połowa szerokości przedziału ufności dla średniej (przybliżenie normalne)."""
+        return z_for_confidence(confidence) * self.sem
+
+    def ci(self, confidence: float = 0.95) -> Tuple[Any, Any]:
+        hw = self.ci_half_width(confidence)
+        return self.mean - hw, self.mean + hw
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Zrzut do dict – np. do pokazania w UI albo zapisu w meta."""
+        return {
+            "count": int(self.count),
+            "mean": self.mean,
+            "std": self.std,
+        }
+
+
+class TDigest:
+    """
+    Uproszczony, scalający t-digest do kwantyli strumienia.
+
+    Trzymamy posortowane centroidy (średnia, waga). Każda paczka jest doklejana,
+    sortowana i kompresowana naraz: centroidy sąsiadujące w skali
+    k(q) = δ / (2π) · asin(2q − 1) łączymy w jeden (np.add.reduceat),
+    więc ogony rozkładu zostają drobne, a środek grubszy. Pamięć ~ δ/2 centroidów,
+    niezależnie od liczby obserwacji.
+    """
+
+    def __init__(self, compression: float = 200.0) -> None:
+        self.compression = float(compression)
+        self._means = np.empty(0)
+        self._weights = np.empty(0)
+        self.count: int = 0
+        self.min: float = float("inf")
+        self.max: float = float("-inf")
+
+    def update(self, values: np.ndarray) -> None:
+        """Dokłada paczkę obserwacji i od razu kompresuje digest."""
+        values = np.asarray(values, dtype=float).ravel()
+        values = values[~np.isnan(values)]
+        if values.size == 0:
+            return
+        self.count += int(values.size)
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+
+        means = np.concatenate([self._means, values])
+        weights = np.concatenate([self._weights, np.ones(values.size)])
+        order = np.argsort(means, kind="stable")
+        means = means[order]
+        weights = weights[order]
+        self._means, self._weights = self._compress(means, weights)
+
+    def _compress(self, means: np.ndarray, weights: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        total = weights.sum()
+        cum = np.cumsum(weights)
+        q_mid = (cum - 0.5 * weights) / total
+        k = self.compression / (2.0 * np.pi) * np.arcsin(2.0 * q_mid - 1.0)
+        cluster = np.floor(k - k[0]).astype(np.int64)
+        starts = np.flatnonzero(np.r_[True, np.diff(cluster) != 0])
+        w = np.add.reduceat(weights, starts)
+        m = np.add.reduceat(means * weights, starts) / w
+        return m, w
+
+    def quantile(self, q: Any) -> Any:
+        """Kwantyl(e) q ∈ [0, 1] – interpolacja między centroidami i min/max."""
+        if self.count == 0:
+            return np.full(np.shape(q), np.nan) if np.ndim(q) else float("nan")
+        cum = np.cumsum(self._weights)
+        centers = (cum - 0.5 * self._weights) / cum[-1]
+        xp = np.r_[0.0, centers, 1.0]
+        fp = np.r_[self.min, self._means, self.max]
+        out = np.interp(q, xp, fp)
+        return out if np.ndim(q) else float(out)
+
+    @property
+    def n_centroids(self) -> int:
+        return int(self._means.size)
@@ -6,7 +6,8 @@ Moduł optymalizacji zapasu
 Cele:
 - na podstawie prognozy popytu wyznaczyć: zapas bezpieczeństwa, punkt ponownego zamówienia (ROP),
   ekonomiczną wielkość zamówienia (EOQ) i finalną sugerowaną ilość zamówienia,
-- uwzględnić niepewność prognozy (std, krótka historia),
+- uwzględnić niepewność prognozy (std, krótka historia) albo – gdy są – ścieżki popytu
+  z oi.probabilistic (ROP = kwantyl popytu w czasie dostawy zamiast z · σ),
 - uwzględnić ograniczenia biznesowe (MOQ, wielkość partii, pojemność),
 - oddać w wyniku komplet informacji do pokazania w UI i do wyjaśnień przez AI.
 
@@ -15,10 +16,12 @@ Współpracuje bezpośrednio z:
 - oi.config (domyślne parametry logistyczne)
 """
 
-from typing import Dict, Any, Optional, Literal
+import re
+from typing import Dict, Any, Optional, Literal, Union
 
 import numpy as np
 import pandas as pd
+from scipy.special import ndtri
 from scipy.stats import norm
 
 from .config import CONFIG
@@ -38,13 +41,20 @@ def calc_safety_stock(
     lead_time_days: int,
     service_level: float,
     volatility_factor: float = 1.0,
+    lead_time_std_days: float = 0.0,
+    avg_daily_demand: float = 0.0,
 ) -> float:
     """
     Zapas bezpieczeństwa wg klasycznej formuły, z opcjonalnym wzmocnieniem
     volatility_factor – jeśli prognoza była robiona na małej próbce albo model mówi, że jest niepewna.
+
+    Przy losowym czasie dostawy (lead_time_std_days > 0, np. z oi.lead_times) dochodzi
+    wariancja lead time: SS = z · sqrt(L · σ_d² + μ_d² · σ_L²). Działa też na tablicach.
     """
     z = z_value(service_level)
-    return z * demand_std_daily * np.sqrt(lead_time_days) * volatility_factor
+    demand_part = (demand_std_daily * volatility_factor) ** 2 * lead_time_days
+    lead_part = (avg_daily_demand * lead_time_std_days) ** 2
+    return z * np.sqrt(demand_part + lead_part)
 
 
 def calc_reorder_point(
@@ -130,6 +140,46 @@ def _to_daily_demand_stats(
     return {"daily_mean": daily_mean, "daily_std": daily_std}
 
 
+def _period_days(freq: str) -> float:
+    """Ile dni ma okres prognozy – te same przybliżenia co w _to_daily_demand_stats."""
+    return {"D": 1.0, "W": 7.0, "M": 30.0}.get(freq, 7.0)
+
+
+def lead_time_demand_samples(
+    demand_paths: np.ndarray,
+    lead_time_days: Union[float, np.ndarray],
+    period_days: float,
+) -> np.ndarray:
+    """
+    Popyt w czasie dostawy dla każdej ścieżki (n_paths × okresy → n_paths).
+
+    Skumulowany popyt ścieżki interpolujemy liniowo w punkcie L / długość okresu
+    (dostawa w połowie tygodnia = część tygodnia). Gdy czas dostawy wychodzi poza horyzont
+    ścieżek, sumę całego horyzontu skalujemy proporcjonalnie.
+    lead_time_days może być tablicą (n_paths,) – osobny czas dostawy dla każdej ścieżki.
+    """
+    paths = np.atleast_2d(np.asarray(demand_paths, dtype=float))
+    n_paths, horizon = paths.shape
+    cum = np.zeros((n_paths, horizon + 1))
+    np.cumsum(paths, axis=1, out=cum[:, 1:])
+    if horizon == 0:
+        return np.zeros(n_paths)
+    x = np.broadcast_to(np.maximum(np.asarray(lead_time_days, dtype=float), 0.0) / period_days, (n_paths,))
+    k = np.minimum(np.floor(x).astype(np.int64), horizon - 1)
+    rows = np.arange(n_paths)
+    inside = cum[rows, k] + (x - k) * (cum[rows, k + 1] - cum[rows, k])
+    return np.where(x >= horizon, cum[:, horizon] * (x / horizon), inside)
+
+
+def _lead_time_strata(lead_time_dist: Dict[str, Any], n: int) -> np.ndarray:
+    """n czasów dostawy z rozkładu empirycznego – warstwowo (kwantyle (i + 0.5) / n), bez losowania."""
+    values = np.asarray(lead_time_dist["values"], dtype=float)
+    probs = np.asarray(lead_time_dist["probs"], dtype=float)
+    cdf = np.cumsum(probs) / probs.sum()
+    pick = np.searchsorted(cdf, (np.arange(n) + 0.5) / n)
+    return values[np.minimum(pick, values.size - 1)]
+
+
 # ─────────────────────────────────────────────────────────────
 # Główna funkcja – gotowa dla UI
 # ─────────────────────────────────────────────────────────────
@@ -145,6 +195,9 @@ def build_inventory_recommendation(
     min_order_qty: float = 0.0,
     lot_size: float = 0.0,
     max_storage_qty: Optional[float] = None,
+    demand_paths: Optional[np.ndarray] = None,
+    lead_time_std_days: float = 0.0,
+    lead_time_dist: Optional[Dict[str, Any]] = None,
 ) -> Dict[str, Any]:
     """
     Wyznacza komplet rekomendacji magazynowej.
@@ -160,11 +213,23 @@ def build_inventory_recommendation(
     - min_order_qty: minimalna wielkość zamówienia (MOQ)
     - lot_size: zaokrąglanie do wielkości partii (np. 10, 50, karton)
     - max_storage_qty: górne ograniczenie pojemności magazynu
+    - demand_paths: opcjonalne ścieżki popytu (n_paths × okresy prognozy, np. forecast_sku(n_paths=...)) –
+      wtedy ROP to kwantyl service_level popytu w czasie dostawy, a zapas bezpieczeństwa
+      to jego nadwyżka nad prognozą punktową; std prognozy i volatility_factor nie są używane
+      (ścieżki już niosą realny błąd metody, także dla płaskich prognoz naive / ma)
+    - lead_time_std_days: odchylenie czasu dostawy – dokłada wariancję lead time do zapasu bezpieczeństwa
+    - lead_time_dist: rozkład empiryczny czasu dostawy (np. LeadTimeIndex.distribution – values, probs,
+      mean, std); daje lead_time_std_days i – gdy lead_time_days nie podano – średni czas dostawy,
+      a przy demand_paths każda ścieżka dostaje własny czas dostawy z tego rozkładu
 
     Zwraca dict gotowy do pokazania w UI.
     """
 
-    # ── 1. Domyślne wartości z configu
+    # ── 1. Domyślne wartości z configu (albo z rozkładu lead time z dostaw)
+    if lead_time_dist is not None:
+        lead_time_std_days = float(lead_time_dist["std"])
+        if not lead_time_days:
+            lead_time_days = max(int(round(float(lead_time_dist["mean"]))), 1)
     lead_time_days = lead_time_days or CONFIG.default_lead_time_days
     service_level = service_level or CONFIG.default_service_level
     order_cost = order_cost or CONFIG.default_order_cost
@@ -196,13 +261,27 @@ def build_inventory_recommendation(
         if mape_last and mape_last > 15:
             volatility_factor *= 1.15
 
-    # ── 5. Safety stock
-    safety_stock = calc_safety_stock(
-        demand_std_daily=demand_std_daily,
-        lead_time_days=lead_time_days,
-        service_level=service_level,
-        volatility_factor=volatility_factor,
-    )
+    # ── 5. Safety stock – z rozkładu ścieżek albo z klasycznej formuły
+    uncertainty_source = "forecast_std"
+    paths = None if demand_paths is None else np.atleast_2d(np.asarray(demand_paths, dtype=float))
+    if paths is not None and paths.size and paths.shape[1] > 0:
+        uncertainty_source = "paths"
+        path_lead = lead_time_days
+        if lead_time_dist is not None:
+            path_lead = _lead_time_strata(lead_time_dist, paths.shape[0])
+        ltd = lead_time_demand_samples(paths, path_lead, _period_days(freq))
+        demand_std_daily = float(np.std(ltd)) / np.sqrt(lead_time_days)
+        volatility_factor = 1.0
+        safety_stock = max(float(np.quantile(ltd, service_level)) - daily_demand_est * lead_time_days, 0.0)
+    else:
+        safety_stock = calc_safety_stock(
+            demand_std_daily=demand_std_daily,
+            lead_time_days=lead_time_days,
+            service_level=service_level,
+            volatility_factor=volatility_factor,
+            lead_time_std_days=lead_time_std_days,
+            avg_daily_demand=daily_demand_est,
+        )
 
     # ── 6. ROP
     reorder_point = calc_reorder_point(
@@ -257,6 +336,7 @@ def build_inventory_recommendation(
         "daily_demand_est": daily_demand_est,
         "demand_std_daily": demand_std_daily,
         "volatility_factor": volatility_factor,
+        "uncertainty_source": uncertainty_source,
         "safety_stock": float(safety_stock),
         "reorder_point": float(reorder_point),
         "eoq": float(eoq),
@@ -264,6 +344,7 @@ def build_inventory_recommendation(
         "suggested_order_qty": float(suggested_order_qty),
         "service_level": float(service_level),
         "lead_time_days": int(lead_time_days),
+        "lead_time_std_days": float(lead_time_std_days),
         "order_cost": float(order_cost),
         "holding_cost": float(holding_cost),
         "annual_demand_est": float(annual_demand),
@@ -276,3 +357,253 @@ def build_inventory_recommendation(
         },
         "raw_forecast_len": int(len(forecast_df)),
     }
+
+
+# ─────────────────────────────────────────────────────────────
+# Wersja portfelowa – wszystkie szeregi jedną ramką
+# ─────────────────────────────────────────────────────────────
+
+# parametry, które można podać per szereg w params_df (brak / NaN → wartość domyślna)
+RECOMMENDATION_PARAM_COLS = (
+    "current_stock",
+    "lead_time_days",
+    "service_level",
+    "order_cost",
+    "holding_cost",
+    "min_order_qty",
+    "lot_size",
+    "max_storage_qty",
+    "lead_time_std_days",
+)
+
+
+def _infer_long_freq(dates: pd.Series) -> Literal["D", "W", "M"]:
+    """Częstotliwość prognozy long – z unikalnych dat (jak _infer_forecast_freq dla serii)."""
+    uniq = pd.DatetimeIndex(pd.to_datetime(dates.drop_duplicates())).sort_values()
+    return _infer_forecast_freq(pd.Series(0.0, index=uniq))
+
+
+def _quantile_levels(columns: Any) -> Dict[str, float]:
+    """Kolumny kwantyli prognozy (nazwy jak probabilistic.quantile_label: p5, p50, p97.5) → poziom."""
+    levels = {}
+    for col in columns:
+        m = re.fullmatch(r"p(\d+(?:\.\d+)?)", str(col))
+        if m and 0.0 < float(m.group(1)) < 100.0:
+            levels[col] = float(m.group(1)) / 100.0
+    return levels
+
+
+def _quantile_daily_std(
+    forecast_long: pd.DataFrame,
+    codes: np.ndarray,
+    n_series: int,
+    lead: np.ndarray,
+    period_days: float,
+) -> np.ndarray:
+    """
+    Dzienne σ popytu per szereg z kolumn kwantyli prognozy long (NaN = szereg bez kwantyli).
+
+    σ wiersza z dwóch najwyższych kwantyli (górny ogon – to on wyznacza zapas), potem średnia
+    wariancji po okresach w czasie dostawy szeregu (min. jeden okres).
+    """
+    levels = _quantile_levels(forecast_long.columns)
+    out = np.full(n_series, np.nan)
+    if len(levels) < 2:
+        return out
+    (lo_col, lo), (hi_col, hi) = sorted(levels.items(), key=lambda kv: kv[1])[-2:]
+    upper = pd.to_numeric(forecast_long[hi_col], errors="coerce").to_numpy(dtype=float)
+    lower = pd.to_numeric(forecast_long[lo_col], errors="coerce").to_numpy(dtype=float)
+    sigma = np.maximum(upper - lower, 0.0) / (ndtri(hi) - ndtri(lo))
+
+    # pozycja wiersza w horyzoncie szeregu – okresy w czasie dostawy
+    order = pd.to_datetime(forecast_long[CONFIG.date_col], errors="coerce").groupby(codes).rank(method="first")
+    step = order.to_numpy(dtype=float) - 1.0
+    n_lead = np.maximum(np.ceil(lead / period_days), 1.0)
+    use = ~np.isnan(sigma) & (step < n_lead[codes])
+    cnt = np.bincount(codes[use], minlength=n_series).astype(float)
+    var = np.bincount(codes[use], weights=sigma[use] ** 2, minlength=n_series)
+    has = cnt > 0
+    out[has] = np.sqrt(var[has] / cnt[has] / period_days)
+    return out
+
+
+def build_inventory_recommendations(
+    forecast_long: pd.DataFrame,
+    params_df: Optional[pd.DataFrame] = None,
+    freq: Optional[str] = None,
+    forecast_meta: Optional[pd.DataFrame] = None,
+    current_stock: float = 0.0,
+    lead_time_days: Optional[int] = None,
+    service_level: Optional[float] = None,
+    order_cost: Optional[float] = None,
+    holding_cost: Optional[float] = None,
+    min_order_qty: float = 0.0,
+    lot_size: float = 0.0,
+    max_storage_qty: Optional[float] = None,
+    lead_time_index: Optional[Any] = None,
+) -> pd.DataFrame:
+    """
+    build_inventory_recommendation dla całego asortymentu naraz – operacje na kolumnach zamiast
+    pętli po SKU.
+
+    Wejście:
+    - forecast_long: prognoza long jak z forecasting.forecast_all (klucze, data, forecast),
+    - params_df: opcjonalnie parametry per szereg – kolumny kluczy + dowolne z RECOMMENDATION_PARAM_COLS,
+    - freq: częstotliwość prognozy (None → rozpoznajemy z dat),
+    - forecast_meta: opcjonalnie meta z forecast_all (n_history, mape_last) – volatility_factor jak w wersji pojedynczej,
+    - lead_time_index: opcjonalnie oi.lead_times.LeadTimeIndex – szeregi bez własnego lead_time_days /
+      lead_time_std_days w params_df dostają średnią (zaokrągloną do dni) i odchylenie z dostaw,
+    - pozostałe argumenty: wartości domyślne dla szeregów bez własnego parametru
+      (None / 0 przy lead time, poziomie obsługi i kosztach → CONFIG, tak jak w build_inventory_recommendation).
+
+    Gdy prognoza ma kolumny kwantyli (forecast_all(quantiles=...) – p5, p50, p95, ...), niepewność
+    bierzemy z nich, a nie z rozrzutu prognozy punktowej (płaska "ma" / "naive" ma std = 0):
+    σ okresu = (dwa najwyższe kwantyle: różnica wartości / różnica z), uśredniona (po wariancji)
+    po okresach w czasie dostawy, σ dzienne = σ okresu / √dni okresu – jak demand_std_daily
+    ze ścieżek w wersji pojedynczej (L · σ_d² = wariancja popytu w czasie dostawy przy
+    niezależnych okresach). volatility_factor = 1, uncertainty_source = "quantiles".
+
+    Bez kwantyli liczby są te same co z build_inventory_recommendation dla każdej serii osobno;
+    jedyna różnica: prognoza z jednego okresu ma std = 0 (a nie NaN).
+
+    Zwraca DataFrame: klucze + pola wyniku build_inventory_recommendation (ograniczenia jako płaskie kolumny).
+    """
+    key_cols = [c for c in forecast_long.columns if c not in (CONFIG.date_col, "forecast")]
+    key_cols = [c for c in key_cols if c in (CONFIG.sku_col, CONFIG.location_col)]
+    out_cols = key_cols + [
+        "status", "freq", "daily_demand_est", "demand_std_daily", "volatility_factor", "uncertainty_source",
+        "safety_stock", "reorder_point", "eoq", "current_stock", "suggested_order_qty", "service_level",
+        "lead_time_days", "order_cost", "holding_cost", "annual_demand_est", "days_of_cover", "stockout_risk",
+        *RECOMMENDATION_PARAM_COLS[5:], "raw_forecast_len",
+    ]
+    if forecast_long is None or forecast_long.empty:
+        return pd.DataFrame(columns=out_cols)
+
+    # ── 1. Statystyki prognozy per szereg – bincount po kodach grup
+    grouped = forecast_long.groupby(key_cols, sort=False, dropna=False)
+    codes = grouped.ngroup().to_numpy()
+    table = grouped.size().index.to_frame(index=False)[key_cols]
+    n_series = len(table)
+    values = pd.to_numeric(forecast_long["forecast"], errors="coerce").to_numpy(dtype=float)
+    ok = ~np.isnan(values)
+    count = np.bincount(codes[ok], minlength=n_series).astype(float)
+    total = np.bincount(codes[ok], weights=values[ok], minlength=n_series)
+    mean = total / np.where(count > 0, count, 1.0)
+    sq = np.bincount(codes[ok], weights=(values[ok] - mean[codes[ok]]) ** 2, minlength=n_series)
+    std = np.sqrt(sq / np.where(count > 1, count - 1, 1.0))
+    std[count < 2] = 0.0
+
+    if freq is None:
+        freq = _infer_long_freq(forecast_long[CONFIG.date_col])
+    period_days = _period_days(freq)
+    daily_mean = mean / period_days
+    daily_std = std / period_days
+
+    # ── 2. Parametry per szereg (braki → wartości domyślne)
+    if params_df is not None and not params_df.empty:
+        on = [c for c in key_cols if c in params_df.columns]
+        cols = on + [c for c in RECOMMENDATION_PARAM_COLS + (CONFIG.supplier_col,) if c in params_df.columns]
+        table = table.merge(params_df[cols].drop_duplicates(on, keep="last"), on=on, how="left")
+    defaults = {
+        "current_stock": current_stock,
+        "lead_time_days": lead_time_days or CONFIG.default_lead_time_days,
+        "service_level": service_level or CONFIG.default_service_level,
+        "order_cost": order_cost or CONFIG.default_order_cost,
+        "holding_cost": holding_cost or CONFIG.default_holding_cost,
+        "min_order_qty": min_order_qty,
+        "lot_size": lot_size,
+        "max_storage_qty": np.nan if max_storage_qty is None else max_storage_qty,
+        "lead_time_std_days": 0.0,
+    }
+    if lead_time_index is not None:
+        # jeden merge dla całego asortymentu – statystyki z indeksu zamiast liczenia per SKU
+        lt = lead_time_index.lookup(table[[c for c in key_cols + [CONFIG.supplier_col] if c in table.columns]])
+        for col, src in (("lead_time_days", np.maximum(np.round(lt["lead_time_mean"].to_numpy()), 1.0)),
+                         ("lead_time_std_days", lt["lead_time_std"].to_numpy())):
+            given = pd.to_numeric(table[col], errors="coerce").to_numpy(dtype=float) if col in table.columns else None
+            table[col] = src if given is None else np.where(np.isnan(given), src, given)
+    par: Dict[str, np.ndarray] = {}
+    for col, default in defaults.items():
+        if col in table.columns:
+            arr = pd.to_numeric(table[col], errors="coerce").to_numpy(dtype=float, copy=True)
+        else:
+            arr = np.full(n_series, np.nan)
+        if col in ("lead_time_days", "service_level", "order_cost", "holding_cost"):
+            # jak `x or CONFIG...` w wersji pojedynczej – 0 też oznacza "weź domyślne"
+            arr[arr == 0] = np.nan
+        par[col] = np.where(np.isnan(arr), default, arr)
+    lead = np.trunc(par["lead_time_days"])
+    stock = par["current_stock"]
+
+    # ── 2b. Niepewność z kwantyli prognozy (gdy są)
+    q_std = _quantile_daily_std(forecast_long, codes, n_series, lead, period_days)
+    from_quantiles = ~np.isnan(q_std)
+    daily_std = np.where(from_quantiles, q_std, daily_std)
+
+    # ── 3. Volatility factor z meta prognozy
+    vol = np.ones(n_series)
+    if forecast_meta is not None and not forecast_meta.empty:
+        meta = table[key_cols].merge(
+            forecast_meta[key_cols + [c for c in ("n_history", "mape_last") if c in forecast_meta.columns]]
+            .drop_duplicates(key_cols, keep="last"),
+            on=key_cols, how="left",
+        )
+        if "n_history" in meta.columns:
+            n_hist = pd.to_numeric(meta["n_history"], errors="coerce").fillna(0).to_numpy()
+            vol[(n_hist > 0) & (n_hist < 6)] *= 1.2
+        if "mape_last" in meta.columns:
+            mape = pd.to_numeric(meta["mape_last"], errors="coerce").fillna(0).to_numpy()
+            vol[mape > 15] *= 1.15
+    # kwantyle już niosą realny błąd metody – jak ścieżki w wersji pojedynczej
+    vol[from_quantiles] = 1.0
+
+    # ── 4. Safety stock, ROP, EOQ
+    safety = ndtri(par["service_level"]) * np.sqrt(
+        lead * (daily_std * vol) ** 2 + (daily_mean * par["lead_time_std_days"]) ** 2
+    )
+    rop = daily_mean * lead + safety
+    annual = daily_mean * 365.0
+    k, h = par["order_cost"], par["holding_cost"]
+    valid_eoq = (annual > 0) & (k > 0) & (h > 0)
+    eoq = np.sqrt(np.divide(2.0 * annual * k, h, out=np.zeros(n_series), where=valid_eoq))
+
+    # ── 5. Propozycja zamówienia + MOQ / partia / pojemność
+    qty = np.where(stock < rop, np.maximum(eoq, rop - stock), 0.0)
+    moq, lot, cap = par["min_order_qty"], par["lot_size"], par["max_storage_qty"]
+    qty = np.where((qty > 0) & (moq > 0) & (qty < moq), moq, qty)
+    use_lot = (qty > 0) & (lot > 0)
+    qty = np.where(use_lot, np.ceil(np.divide(qty, lot, out=np.zeros(n_series), where=use_lot)) * lot, qty)
+    capped = ~np.isnan(cap) & (qty > 0)
+    free = cap - stock
+    qty = np.where(capped, np.where(free < 0, 0.0, np.minimum(qty, free)), qty)
+
+    # ── 6. Dni pokrycia i ryzyko
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cover = np.where(daily_mean > 0, stock / np.where(daily_mean > 0, daily_mean, 1.0), np.inf)
+        risk = np.where(cover < lead, np.minimum(1.0, (lead - cover) / lead), 0.0)
+
+    res = table[key_cols].copy()
+    res["status"] = "ok"
+    res["freq"] = freq
+    res["daily_demand_est"] = daily_mean
+    res["demand_std_daily"] = daily_std
+    res["volatility_factor"] = vol
+    res["uncertainty_source"] = np.where(from_quantiles, "quantiles", "forecast_std")
+    res["safety_stock"] = safety
+    res["reorder_point"] = rop
+    res["eoq"] = eoq
+    res["current_stock"] = stock
+    res["suggested_order_qty"] = qty
+    res["service_level"] = par["service_level"]
+    res["lead_time_days"] = lead.astype(np.int64)
+    res["order_cost"] = k
+    res["holding_cost"] = h
+    res["annual_demand_est"] = annual
+    res["days_of_cover"] = cover
+    res["stockout_risk"] = risk
+    res["min_order_qty"] = moq
+    res["lot_size"] = lot
+    res["max_storage_qty"] = cap
+    res["lead_time_std_days"] = par["lead_time_std_days"]
+    res["raw_forecast_len"] = count.astype(np.int64)
+    return res[out_cols]
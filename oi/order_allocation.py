@@ -0,0 +1,396 @@
+# oi/order_allocation.py
+from __future__ import annotations
+"""
+Zamówienia dla wielu SKU przy wspólnych ograniczeniach – budżet, miejsce na półkach, limit sztuk.
+
+build_inventory_recommendation liczy każde SKU osobno, a max_storage_qty to limit jednego SKU.
+Tutaj wszystkie szeregi dzielą zasoby:
+- "budget"   – Σ unit_cost · q ≤ budget (budżet zakupowy),
+- "capacity" – Σ unit_volume · (stan + q) ≤ capacity (miejsce w magazynie, razem z tym, co już leży),
+- "units"    – Σ q ≤ max_units (np. przepustowość przyjęć).
+
+Model per SKU to newsvendor na okresie ochrony T = lead time + okres przeglądu:
+popyt D ~ N(μ, σ) (σ z wariancją lead time, jeśli tabela ma lead_time_std_days),
+koszt = h · E[(stan + q − D)+] + p · E[(D − stan − q)+].
+Bez ograniczeń optimum to kwantyl p / (p + h) popytu (jedna operacja na wektorach).
+Z ograniczeniami koszt każdego SKU przybliżamy łamaną na odcinku [0, zamówienie bez ograniczeń]
+– punkty załamania w równych krokach dystrybuanty, więc koszt krańcowy rośnie równymi skokami.
+Kawałek zamówienia ma wtedy stały zysk na sztukę (spadek kosztu), a problem to ciągły
+plecak z kilkoma zasobami. Rozwiązujemy go relaksacją Lagrange'a: przy cenach zasobów λ
+opłaca się każdy kawałek o zysku > λ · zużycie (jedna operacja na wektorach dla wszystkich SKU),
+a λ to minimum wypukłej funkcji dualnej w ≤ 3 zmiennych (metoda płaszczyzn tnących).
+
+Sama bisekcja ceny i zamówienie do kwantyla (p − λ·a) / (p + h) tu nie wystarcza: przy małym
+σ / μ zamówienie SKU spada do zera prawie skokowo, gdy cena zasobu przekroczy koszt braku,
+i część limitu zostaje niewykorzystana – stąd kawałki, które można brać częściowo.
+Ogólny solver LP (linprog / HiGHS) na wszystkich kawałkach liczy to samo, ale jego czas
+rośnie z kwadratem liczby SKU.
+
+shadow_price – cena λ zasobu: o ile spadłby koszt przy limicie większym o 1 jednostkę.
+Zasób jest "wiążący", gdy jego cena > 0 i limit jest wyczerpany.
+
+Na końcu ilości zaokrąglamy w dół do partii (to nie psuje żadnego ograniczenia) i zachłannie
+dopełniamy luz po zaokrągleniu.
+"""
+
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from scipy.optimize import linprog
+from scipy.special import ndtr, ndtri
+
+from .config import CONFIG
+
+# kolumny, które optymalizator czyta z tabeli (poza kluczami); brakujące → domyślne
+ALLOCATION_COLS = (
+    "daily_demand_est",
+    "demand_std_daily",
+    "volatility_factor",
+    "current_stock",
+    "lead_time_days",
+    "lead_time_std_days",
+    "holding_cost",
+    "shortage_cost",
+    "unit_cost",
+    "unit_volume",
+    "lot_size",
+)
+
+# na ile odcinków dzielimy krzywą kosztu każdego SKU
+DEFAULT_SEGMENTS = 16
+# metoda płaszczyzn tnących na funkcji dualnej: limit iteracji i względna luka dualna
+_DUAL_MAX_ITER = 200
+_DUAL_TOL = 1e-7
+# ile rund dopełniania partiami po zaokrągleniu
+_FILL_ROUNDS = 20
+
+
+def _normal_loss(z: np.ndarray) -> np.ndarray:
+    """Standardowa funkcja straty E[(Z − z)+] dla Z ~ N(0, 1)."""
+    return np.exp(-0.5 * z * z) / np.sqrt(2.0 * np.pi) - z * (1.0 - ndtr(z))
+
+
+def _expected_costs(
+    target: np.ndarray,
+    mu: np.ndarray,
+    sigma: np.ndarray,
+    h: np.ndarray,
+    p: np.ndarray,
+) -> Dict[str, np.ndarray]:
+    """Oczekiwany brak i nadmiar na koniec okresu dla poziomu docelowego target (stan + zamówienie)."""
+    safe = np.where(sigma > 0, sigma, 1.0)
+    z = (target - mu) / safe
+    shortage = np.where(sigma > 0, sigma * _normal_loss(z), np.maximum(mu - target, 0.0))
+    excess = target - mu + shortage
+    return {
+        "expected_shortage": shortage,
+        "expected_excess": excess,
+        "holding_cost_exp": h * excess,
+        "shortage_cost_exp": p * shortage,
+    }
+
+
+def _column(table: pd.DataFrame, col: str, default: float) -> np.ndarray:
+    if col not in table.columns:
+        return np.full(len(table), float(default))
+    arr = pd.to_numeric(table[col], errors="coerce").to_numpy(dtype=float, copy=True)
+    arr[np.isnan(arr)] = default
+    return arr
+
+
+def _fill_rounding_slack(
+    qty: np.ndarray,
+    step: np.ndarray,
+    resources: Dict[str, Any],
+    stock: np.ndarray,
+    mu: np.ndarray,
+    sigma: np.ndarray,
+    h: np.ndarray,
+    p: np.ndarray,
+) -> np.ndarray:
+    """
+    Zachłanne dopełnienie po zaokrągleniu w dół: w każdej rundzie każde SKU może dostać
+    jedną partię więcej – kolejność wg spadku kosztu na jednostkę zużytych zasobów
+    (zużycie liczone względem pozostałego limitu), bierzemy najdłuższy prefiks, który się mieści.
+    """
+    usages = np.stack([usage for usage, _ in resources.values()])          # (K, S)
+    remaining = np.array([limit for _, limit in resources.values()]) - usages @ qty
+    for _ in range(_FILL_ROUNDS):
+        now = _expected_costs(stock + qty, mu, sigma, h, p)
+        nxt = _expected_costs(stock + qty + step, mu, sigma, h, p)
+        gain = (now["holding_cost_exp"] + now["shortage_cost_exp"]) - (nxt["holding_cost_exp"] + nxt["shortage_cost_exp"])
+        need = usages * step                                                # (K, S)
+        ok = (gain > 1e-12) & np.all(need <= remaining[:, None] + 1e-9, axis=0)
+        if not ok.any():
+            break
+        cand = np.flatnonzero(ok)
+        weight = np.sum(need[:, cand] / np.maximum(remaining[:, None], 1e-12), axis=0)
+        cand = cand[np.argsort(-gain[cand] / np.maximum(weight, 1e-12), kind="stable")]
+        cum = np.cumsum(need[:, cand], axis=1)
+        fits = np.logical_and.accumulate(np.all(cum <= remaining[:, None] + 1e-9, axis=0))
+        take = cand[fits]
+        if take.size == 0:
+            break
+        qty[take] += step[take]
+        remaining -= need[:, take].sum(axis=1)
+    return qty
+
+
+def _cost_segments(
+    stock: np.ndarray,
+    unconstrained: np.ndarray,
+    mu: np.ndarray,
+    sigma: np.ndarray,
+    h: np.ndarray,
+    p: np.ndarray,
+    n_segments: int,
+) -> Dict[str, np.ndarray]:
+    """
+    Łamana kosztu per SKU: szerokości (S × K) i nachylenia odcinków (S × K) na [0, zamówienie bez ograniczeń].
+    Punkty załamania to poziomy docelowe dla równych kroków dystrybuanty między F(stan) i p / (p + h);
+    przy σ = 0 koszt jest liniowy, więc dzielimy odcinek po równo.
+    """
+    frac = np.linspace(0.0, 1.0, n_segments + 1)[None, :]
+    safe = np.where(sigma > 0, sigma, 1.0)
+    f0 = ndtr((stock - mu) / safe)[:, None]
+    f1 = ndtr((stock + unconstrained - mu) / safe)[:, None]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        levels = mu[:, None] + sigma[:, None] * ndtri(f0 + (f1 - f0) * frac)
+    linear = stock[:, None] + unconstrained[:, None] * frac
+    levels = np.where((sigma > 0)[:, None] & np.isfinite(levels), levels, linear)
+    # końce dokładnie na stanie i na zamówieniu bez ograniczeń, po drodze monotonicznie
+    levels[:, 0] = stock
+    levels[:, -1] = stock + unconstrained
+    levels = np.maximum.accumulate(np.clip(levels, stock[:, None], (stock + unconstrained)[:, None]), axis=1)
+
+    shape = levels.shape
+    cost = _expected_costs(
+        levels.ravel(), np.repeat(mu, shape[1]), np.repeat(sigma, shape[1]),
+        np.repeat(h, shape[1]), np.repeat(p, shape[1]),
+    )
+    total = (cost["holding_cost_exp"] + cost["shortage_cost_exp"]).reshape(shape)
+    widths = np.diff(levels, axis=1)
+    slopes = np.divide(np.diff(total, axis=1), widths, out=np.zeros_like(widths), where=widths > 0)
+    return {"widths": widths, "slopes": slopes}
+
+
+def _dual_allocate(
+    rate: np.ndarray,
+    widths: np.ndarray,
+    usage: np.ndarray,
+    limits: np.ndarray,
+) -> Dict[str, Any]:
+    """
+    Ciągły plecak z kilkoma zasobami przez funkcję dualną (R ≤ 3 zmiennych).
+
+    rate / widths (S × K) – zysk na sztukę i długość kawałków łamanej, usage (R × S) – zużycie
+    zasobu na sztukę, limits (R,) > 0. Przy cenach λ (w jednostkach limitu) opłaca się każdy
+    kawałek z rate > λ · usage / limits, a funkcja dualna
+        D(λ) = Σ λ + Σ długość · max(0, rate − λ · usage / limits)
+    jest wypukła i kawałkami liniowa. Minimalizujemy ją metodą płaszczyzn tnących (Kelley):
+    każde wyliczenie D to jedna operacja na wszystkich kawałkach, a problem główny to małe LP
+    w R + 1 zmiennych. Zamówienia to kombinacja wypukła rozwiązań z kolejnych cen,
+    z wagami = zmienne dualne cięć problemu głównego – tak odzyskujemy częściowe kawałki.
+    Zwraca qty (S,) i ceny zasobów (R,) w jednostkach zasobu (spadek kosztu na 1 jednostkę limitu).
+    """
+    rel = usage / limits[:, None]                                            # (R, S)
+    n_res = limits.size
+    upper = np.array([
+        float(np.max(rate.max(axis=1)[rel[r] > 0] / rel[r][rel[r] > 0], initial=0.0)) for r in range(n_res)
+    ])
+
+    def evaluate(lam: np.ndarray) -> Tuple[float, np.ndarray, np.ndarray]:
+        reduced = rate - (lam @ rel)[:, None]
+        qty = np.sum(widths * (reduced > 0), axis=1)
+        value = float(lam.sum() + np.sum(widths * np.maximum(reduced, 0.0)))
+        return value, 1.0 - rel @ qty, qty
+
+    lam = np.zeros(n_res)
+    cuts_a: List[np.ndarray] = []
+    cuts_b: List[float] = []
+    sols: List[np.ndarray] = []
+    best_value, best_lam = np.inf, lam
+    weights = np.array([1.0])
+    for _ in range(_DUAL_MAX_ITER):
+        value, grad, qty = evaluate(lam)
+        sols.append(qty)
+        if value < best_value:
+            best_value, best_lam = value, lam
+        # cięcie: t ≥ D(λ_i) + g_i · (λ − λ_i)  ⇔  g_i · λ − t ≤ g_i · λ_i − D(λ_i)
+        cuts_a.append(np.append(grad, -1.0))
+        cuts_b.append(float(grad @ lam - value))
+        master = linprog(
+            np.append(np.zeros(n_res), 1.0),
+            A_ub=np.array(cuts_a),
+            b_ub=np.array(cuts_b),
+            bounds=[(0.0, u) for u in upper] + [(None, None)],
+            method="highs",
+        )
+        if master.status != 0:
+            break
+        weights = -master.ineqlin.marginals
+        lam = master.x[:n_res]
+        lower = float(master.x[-1])
+        if best_value - lower <= _DUAL_TOL * max(abs(best_value), 1.0):
+            break
+
+    # kombinacja wypukła rozwiązań z wagami z problemu głównego (suma wag = 1)
+    weights = np.maximum(np.asarray(weights, dtype=float), 0.0)
+    if weights.size != len(sols) or weights.sum() <= 0:
+        qty = evaluate(best_lam)[2]
+    else:
+        qty = np.stack(sols).T @ (weights / weights.sum())
+    return {"qty": qty, "prices": best_lam / limits}
+
+
+def optimize_orders(
+    table: pd.DataFrame,
+    budget: Optional[float] = None,
+    capacity: Optional[float] = None,
+    max_units: Optional[float] = None,
+    review_period_days: Optional[int] = None,
+    shortage_cost: Optional[float] = None,
+    n_segments: int = DEFAULT_SEGMENTS,
+) -> Dict[str, Any]:
+    """
+    Rozdziela zamówienia między SKU przy wspólnym budżecie / pojemności / limicie sztuk.
+
+    Wejście:
+    - table: jeden wiersz na szereg – np. wynik optimization.build_inventory_recommendations
+      (daily_demand_est, demand_std_daily, volatility_factor, current_stock, lead_time_days,
+      holding_cost – miesięczny koszt utrzymania 1 szt.) + opcjonalnie shortage_cost, unit_cost
+      (cena zakupu, wymagana przy budget), unit_volume (miejsce na 1 szt., domyślnie 1), lot_size,
+    - budget / capacity / max_units: limity (None = brak ograniczenia); capacity obejmuje też
+      towar, który już leży – w tabeli ograniczeń "limit" to miejsce wolne na zamówienia,
+    - review_period_days: okres przeglądu (None → CONFIG), shortage_cost: domyślny koszt braku,
+    - n_segments: na ile odcinków dzielimy krzywą kosztu SKU (dokładność przybliżenia).
+
+    Zwraca dict:
+    {
+        "orders": DataFrame – klucze, order_qty, unconstrained_qty, target_level, critical_ratio,
+                  protection_days, expected_shortage, expected_excess, expected_cost, fill_rate_est,
+        "constraints": DataFrame – zasób, limit, zużycie, luz, cena (shadow_price), binding,
+        "meta": {status, n_series, total_cost, unconstrained_cost, review_period_days, solver},
+    }
+    status: "ok" albo "infeasible" (np. towar na stanie już przekracza pojemność – wtedy nic nie zamawiamy).
+    """
+    if budget is not None and "unit_cost" not in table.columns:
+        raise ValueError("Ograniczenie budżetu wymaga kolumny 'unit_cost' (cena zakupu 1 szt.).")
+    review = CONFIG.default_review_period_days if review_period_days is None else int(review_period_days)
+    key_cols = [c for c in (CONFIG.sku_col, CONFIG.location_col) if c in table.columns]
+
+    n = len(table)
+    lead = _column(table, "lead_time_days", CONFIG.default_lead_time_days)
+    horizon = np.maximum(lead + review, 1.0)
+    daily = _column(table, "daily_demand_est", 0.0)
+    mu = daily * horizon
+    # losowy czas dostawy (lead_time_std_days, np. z oi.lead_times) dokłada μ_d² · σ_L² do wariancji
+    sigma = np.sqrt(
+        horizon * (_column(table, "demand_std_daily", 0.0) * _column(table, "volatility_factor", 1.0)) ** 2
+        + (daily * _column(table, "lead_time_std_days", 0.0)) ** 2
+    )
+    stock = _column(table, "current_stock", 0.0)
+    # koszt utrzymania jest miesięczny (jak w UI) → na okres ochrony
+    h = np.maximum(_column(table, "holding_cost", CONFIG.default_holding_cost), 0.0) / 30.0 * horizon
+    p = np.maximum(
+        _column(table, "shortage_cost", CONFIG.default_shortage_cost if shortage_cost is None else shortage_cost), 0.0
+    )
+    lot = _column(table, "lot_size", 0.0)
+    step = np.where(lot > 0, lot, 1.0)
+
+    # zasoby: nazwa → (zużycie na 1 zamówioną szt., limit dla zamówień)
+    resources: Dict[str, Any] = {}
+    if budget is not None:
+        resources["budget"] = (np.maximum(_column(table, "unit_cost", 0.0), 0.0), float(budget))
+    if capacity is not None:
+        vol = np.maximum(_column(table, "unit_volume", 1.0), 0.0)
+        resources["capacity"] = (vol, float(capacity) - float(np.sum(vol * np.maximum(stock, 0.0))))
+    if max_units is not None:
+        resources["units"] = (np.ones(n), float(max_units))
+
+    # ── 1. Bez ograniczeń: kwantyl p / (p + h) (h = 0 → nie zamawiamy ponad μ + 8σ)
+    denom = np.where(p + h > 0, p + h, 1.0)
+    ratio = np.where(p + h > 0, p / denom, 0.0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        target = mu + sigma * ndtri(np.clip(ratio, 0.0, ndtr(8.0)))
+    target = np.where(sigma > 0, target, mu)
+    continuous = np.where(ratio > 0, np.maximum(target - stock, 0.0), 0.0)
+    unconstrained = np.floor(continuous / step + 1e-9) * step
+
+    # ── 2. Z ograniczeniami: LP na łamanych kosztu
+    status, solver = "ok", "none"
+    duals = {name: 0.0 for name in resources}
+    qty = unconstrained.copy()
+    violated = [name for name, (usage, limit) in resources.items() if float(usage @ continuous) > limit]
+    if any(limit < 0 for _, limit in resources.values()):
+        status = "infeasible"
+        qty = np.zeros(n)
+    elif violated:
+        seg = _cost_segments(stock, continuous, mu, sigma, h, p, max(int(n_segments), 1))
+        names = list(resources)
+        usage = np.stack([resources[m][0] for m in names])
+        limits = np.array([resources[m][1] for m in names])
+        rate, widths = -seg["slopes"], seg["widths"]
+        # zasób z zerowym limitem: SKU, które go zużywają, nie zamawiają nic
+        closed = np.any(usage[limits <= 0] > 0, axis=0)
+        rate = np.where(closed[:, None], 0.0, rate)
+        open_res = limits > 0
+        best = _dual_allocate(rate, widths, usage[open_res], limits[open_res])
+        solver = "dual_cutting_plane"
+        qty = best["qty"]
+        duals.update(zip([m for m, o in zip(names, open_res) if o], best["prices"]))
+        # kombinacja wypukła może minimalnie przekroczyć limit – skalujemy do dopuszczalności
+        over = (usage @ qty) / np.where(limits > 0, limits, 1.0)
+        qty = qty / max(float(over.max(initial=0.0)), 1.0)
+        # zaokrąglenie w dół do partii – zużycie zasobów może tylko spaść
+        qty = _fill_rounding_slack(np.floor(qty / step + 1e-9) * step, step, resources, stock, mu, sigma, h, p)
+
+    # ── 3. Wynik
+    target = stock + qty
+    costs = _expected_costs(target, mu, sigma, h, p)
+    base = _expected_costs(stock + unconstrained, mu, sigma, h, p)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        fill = np.where(mu > 0, 1.0 - costs["expected_shortage"] / np.where(mu > 0, mu, 1.0), 1.0)
+
+    orders = table[key_cols].reset_index(drop=True).copy()
+    orders["order_qty"] = qty
+    orders["unconstrained_qty"] = unconstrained
+    orders["target_level"] = target
+    orders["critical_ratio"] = ratio
+    orders["protection_days"] = horizon.astype(np.int64)
+    orders["expected_shortage"] = costs["expected_shortage"]
+    orders["expected_excess"] = costs["expected_excess"]
+    orders["expected_cost"] = costs["holding_cost_exp"] + costs["shortage_cost_exp"]
+    orders["fill_rate_est"] = np.clip(fill, 0.0, 1.0)
+
+    rows = []
+    for name, (usage, limit) in resources.items():
+        used = float(usage @ qty)
+        # po zaokrągleniu do partii luz mniejszy niż jedna partia to nadal wyczerpany limit
+        exhausted = limit - used <= 1e-6 * max(abs(limit), 1.0) + float(np.max(usage * step, initial=0.0))
+        rows.append({
+            "constraint": name,
+            "limit": limit,
+            "used": used,
+            "slack": limit - used,
+            "shadow_price": duals[name],
+            "binding": bool(limit < 0 or (duals[name] > 0 and exhausted)),
+            "unconstrained_use": float(usage @ unconstrained),
+        })
+    constraints = pd.DataFrame(
+        rows, columns=["constraint", "limit", "used", "slack", "shadow_price", "binding", "unconstrained_use"]
+    )
+
+    return {
+        "orders": orders,
+        "constraints": constraints,
+        "meta": {
+            "status": status,
+            "n_series": int(n),
+            "total_cost": float(orders["expected_cost"].sum()),
+            "unconstrained_cost": float((base["holding_cost_exp"] + base["shortage_cost_exp"]).sum()),
+            "review_period_days": review,
+            "solver": solver,
+        },
+    }
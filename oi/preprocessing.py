@@ -16,6 +16,7 @@ Współpracuje z:
 - oi.data_ingestion (tam wgrywamy kilka plików)
 """
 
+import numpy as np
 import pandas as pd
 from typing import Optional, Dict, List, Tuple, Any
 
@@ -47,6 +48,25 @@ LOCATION_CANDIDATES = [
     "miejsce", "miejsce_skladowania",
 ]
 
+# dostawy – data przyjęcia (trafia do date_col), data zamówienia, dostawca, gotowy lead time
+RECEIPT_DATE_CANDIDATES = [
+    "data_dostawy", "data_przyjecia", "data przyjęcia", "data_pz", "receipt_date", "delivery_date",
+    "received_date", "goods_receipt_date",
+]
+
+ORDER_DATE_CANDIDATES = [
+    "data_zamowienia", "data zamówienia", "data_zam", "data_zlozenia", "order_date", "po_date",
+    "purchase_order_date", "orderdate",
+]
+
+SUPPLIER_CANDIDATES = [
+    "dostawca", "kontrahent", "producent", "supplier", "vendor", "supplier_id", "vendor_id",
+]
+
+LEAD_TIME_CANDIDATES = [
+    "lead_time_days", "lead_time", "czas_dostawy", "czas dostawy", "leadtime", "lt_dni",
+]
+
 
 # ─────────────────────────────────────────────────────────────
 # Funkcje rozpoznające
@@ -117,6 +137,34 @@ def normalize_sales_df(df: pd.DataFrame) -> pd.DataFrame:
     return df
 
 
+def normalize_deliveries_df(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Normalizacja dostaw: data przyjęcia → date_col, data zamówienia → order_date_col,
+    dostawca → supplier_col, gotowy czas dostawy w dniach → "lead_time_days".
+    Datę przyjęcia szukamy przed ogólnym auto-rename, żeby "data" nie złapała daty zamówienia.
+    """
+    df = df.copy()
+    rename_map: Dict[str, str] = {}
+    for target, candidates in (
+        (CONFIG.date_col, RECEIPT_DATE_CANDIDATES),
+        (CONFIG.order_date_col, ORDER_DATE_CANDIDATES),
+        (CONFIG.supplier_col, SUPPLIER_CANDIDATES),
+        ("lead_time_days", LEAD_TIME_CANDIDATES),
+    ):
+        if target not in df.columns:
+            found = _find_col(df, candidates)
+            if found and found not in rename_map:
+                rename_map[found] = target
+    if rename_map:
+        df = df.rename(columns=rename_map)
+    df = _auto_rename(df)
+
+    for col in (CONFIG.date_col, CONFIG.order_date_col):
+        if col in df.columns:
+            df[col] = pd.to_datetime(df[col], errors="coerce")
+    return df
+
+
 def normalize_any(df: pd.DataFrame, *, expect_qty: bool = True) -> pd.DataFrame:
     """
     Bardziej ogólna normalizacja – do użycia dla dostaw, produkcji, stanów.
@@ -197,6 +245,77 @@ def aggregate_sales(df: pd.DataFrame, freq: str = "W") -> pd.DataFrame:
     return agg
 
 
+def series_key_cols(df: pd.DataFrame) -> List[str]:
+    """Kolumny identyfikujące szereg: SKU (+ magazyn, jeśli jest)."""
+    cols = [CONFIG.sku_col]
+    if CONFIG.location_col in df.columns:
+        cols.append(CONFIG.location_col)
+    return cols
+
+
+def pivot_sales_matrix(agg: pd.DataFrame, freq: str = "W") -> Dict[str, Any]:
+    """
+    Zamienia długą ramkę z aggregate_sales na gęstą macierz (szeregi × okresy) – jednym przebiegiem.
+
+    Zwraca dict:
+    {
+        "keys": DataFrame z kolumnami SKU (+ magazyn) – wiersz i opisuje szereg i,
+        "periods": DatetimeIndex okresów (etykiety jak w aggregate_sales),
+        "values": ndarray float (n_series × n_periods),
+        "first_period": ndarray int – pierwszy okres ze sprzedażą dla każdego szeregu,
+    }
+
+    Konwencja: przed pierwszą sprzedażą szeregu jest NaN (szereg jeszcze "nie istniał"),
+    od niej do końca wspólnego horyzontu brakujące okresy to 0 – brak sprzedaży też jest informacją.
+    """
+    key_cols = series_key_cols(agg)
+    date_col = CONFIG.date_col
+    empty = {
+        "keys": pd.DataFrame(columns=key_cols),
+        "periods": pd.DatetimeIndex([]),
+        "values": np.empty((0, 0)),
+        "first_period": np.empty(0, dtype=np.int64),
+    }
+    if agg is None or agg.empty or date_col not in agg.columns or CONFIG.qty_col not in agg.columns:
+        return empty
+
+    dates = pd.to_datetime(agg[date_col], errors="coerce")
+    ok = dates.notna().to_numpy()
+    if not ok.any():
+        return empty
+    df = agg.loc[ok, key_cols + [CONFIG.qty_col]]
+    ordinals = dates[ok].dt.to_period(freq).array.asi8
+    p_min, p_max = int(ordinals.min()), int(ordinals.max())
+    n_periods = p_max - p_min + 1
+    col = ordinals - p_min
+
+    grouped = df.groupby(key_cols, sort=True, dropna=False)
+    codes = grouped.ngroup().to_numpy()
+    keys = grouped.size().index.to_frame(index=False)[key_cols]
+    n_series = len(keys)
+
+    qty = pd.to_numeric(df[CONFIG.qty_col], errors="coerce").fillna(0.0).to_numpy(dtype=float)
+    values = np.bincount(codes * n_periods + col, weights=qty, minlength=n_series * n_periods)
+    values = values.reshape(n_series, n_periods)
+
+    first = np.full(n_series, n_periods, dtype=np.int64)
+    np.minimum.at(first, codes, col)
+    values[np.arange(n_periods)[None, :] < first[:, None]] = np.nan
+
+    periods = pd.period_range(start=pd.Period(ordinal=p_min, freq=freq), periods=n_periods)
+    return {"keys": keys, "periods": period_labels(periods), "values": values, "first_period": first}
+
+
+def period_labels(periods: pd.PeriodIndex) -> pd.DatetimeIndex:
+    """
+    Etykiety okresów zgodne z aggregate_sales: dzień dla D, koniec tygodnia / miesiąca dla W / M.
+    Działa też dla okresów w przyszłości (indeks prognozy).
+    """
+    if periods.freqstr.upper().startswith("D"):
+        return pd.DatetimeIndex(periods.to_timestamp())
+    return pd.DatetimeIndex(periods.to_timestamp(how="end").normalize())
+
+
 # ─────────────────────────────────────────────────────────────
 # Łączenie wielu dataframe’ów tego samego typu
 # ─────────────────────────────────────────────────────────────
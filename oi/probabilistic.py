@@ -0,0 +1,197 @@
+# oi/probabilistic.py
+from __future__ import annotations
+"""
+Prognozy probabilistyczne – kwantyle i ścieżki popytu z bootstrapu reszt.
+
+Prognoza punktowa (np. "ma") to płaska linia – jej std po okresach jest zerowe i nie mówi
+nic o niepewności. Tutaj niepewność bierzemy z tego, jak metoda faktycznie się myliła:
+- rolling-origin backtest (jak w oi/backtesting.py) daje dla każdego szeregu wektory błędów
+  całego horyzontu: e[o, 1..H] = rzeczywistość − prognoza z origin o,
+- ścieżka = prognoza punktowa + e[o] dla losowego origin o – bierzemy cały wektor naraz,
+  więc ścieżka zachowuje rosnącą z horyzontem niepewność i korelację błędów między okresami,
+- losujemy jednym wywołaniem RNG dla wszystkich szeregów (indeksy origin-ów),
+  bez pętli po SKU; popyt przycinamy do zera.
+
+Szereg bez żadnego ocenialnego origin-u (za krótka historia) dostaje szum normalny
+z odchylenia własnej historii (źródło "history_std"), a bez historii – brak szumu ("none").
+
+Błędów nie centrujemy: systematyczne niedoszacowanie metody (np. średnia krocząca przy
+trendzie) przesuwa rozkład w górę – i dobrze, bo tak wygląda prawdziwy popyt vs ta prognoza.
+"""
+
+from typing import Any, Dict, Optional, Sequence
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from .backtesting import _method_forecasts, rolling_origins
+from .forecasting import BATCH_FORECASTERS, BATCH_LOOKBACK, forecast_matrix
+
+# domyślne kwantyle (ułamki) i liczba ścieżek
+DEFAULT_QUANTILES: Sequence[float] = (0.05, 0.5, 0.95)
+DEFAULT_N_PATHS = 500
+# ile ostatnich origin-ów backtestu daje błędy do bootstrapu
+DEFAULT_RESIDUAL_ORIGINS = 24
+
+# ile elementów tensora ścieżek (szeregi × ścieżki × okresy) trzymamy naraz
+_PATHS_CHUNK_ELEMENTS = 20_000_000
+
+
+def quantile_label(q: float) -> str:
+    """0.05 → 'p5', 0.975 → 'p97.5' – te same nazwy co percentyle w simulation."""
+    return f"p{q * 100:g}"
+
+
+def horizon_residuals(
+    y: np.ndarray,
+    periods: int,
+    method: str,
+    n_origins: int = DEFAULT_RESIDUAL_ORIGINS,
+    season_length: int = 1,
+    min_history: int = 2,
+) -> Dict[str, np.ndarray]:
+    """
+    Błędy prognozy całego horyzontu z rolling-origin backtestu.
+
+    Przy krótkiej historii backtest liczymy na krótszym horyzoncie (ile się da), a dalsze
+    okresy ścieżki dostają błąd ostatniego policzonego kroku.
+    Zwraca dict:
+    residuals (S × O × H_res, NaN = origin nieoceniany), n_valid (S,) – ile ostatnich origin-ów
+    szeregu jest ocenialnych (ocenialne origin-y szeregu zawsze tworzą końcówkę osi O),
+    step_map (periods,) – który krok błędu odpowiada okresowi prognozy.
+    """
+    y = np.asarray(y, dtype=float)
+    n_series, n_periods = y.shape
+    h_res = int(min(periods, max(n_periods - min_history, 1)))
+    origins = rolling_origins(n_periods, h_res, n_origins)
+    step_map = np.minimum(np.arange(periods), h_res - 1)
+    if n_series == 0 or origins.size == 0:
+        return {
+            "residuals": np.empty((n_series, 0, h_res)),
+            "n_valid": np.zeros(n_series, dtype=np.int64),
+            "step_map": step_map,
+        }
+
+    fc = _method_forecasts(y, origins, h_res, method, BATCH_LOOKBACK.get(method), season_length)
+    actual = sliding_window_view(y, h_res, axis=1)[:, origins]
+    n_hist = np.cumsum(~np.isnan(y), axis=1)[:, origins - 1]
+    ok = n_hist >= min_history
+    residuals = np.where(ok[:, :, None], actual - fc, np.nan)
+    return {"residuals": residuals, "n_valid": ok.sum(axis=1), "step_map": step_map}
+
+
+def _history_std(y: np.ndarray) -> np.ndarray:
+    """Odchylenie standardowe okresu z historii szeregu (NaN-y pomijamy, < 2 punkty → 0)."""
+    n = np.sum(~np.isnan(y), axis=1)
+    mean = np.nansum(y, axis=1) / np.where(n > 0, n, 1)
+    sq = np.nansum((y - mean[:, None]) ** 2, axis=1)
+    return np.where(n >= 2, np.sqrt(sq / np.where(n > 1, n - 1, 1)), 0.0)
+
+
+def _sample_paths(
+    point: np.ndarray,
+    res: Dict[str, np.ndarray],
+    sigma: np.ndarray,
+    n_paths: int,
+    rng: np.random.Generator,
+) -> np.ndarray:
+    """Ścieżki (S × n_paths × H) dla paczki szeregów: punkt + wylosowany wektor błędów."""
+    n_series, periods = point.shape
+    residuals, n_valid = res["residuals"], res["n_valid"]
+    n_orig = residuals.shape[1]
+
+    noise = np.zeros((n_series, n_paths, periods))
+    boot = n_valid > 0
+    if boot.any():
+        # ocenialne origin-y to ostatnie n_valid → indeks liczymy od końca osi
+        u = rng.random((int(boot.sum()), n_paths))
+        pick = n_orig - 1 - np.floor(u * n_valid[boot, None]).astype(np.int64)
+        rows = np.flatnonzero(boot)[:, None, None]
+        noise[boot] = residuals[rows, pick[:, :, None], res["step_map"][None, None, :]]
+    normal = ~boot & (sigma > 0)
+    if normal.any():
+        noise[normal] = sigma[normal, None, None] * rng.standard_normal((int(normal.sum()), n_paths, periods))
+    paths = point[:, None, :] + np.nan_to_num(noise)
+    np.maximum(paths, 0.0, out=paths)
+    return paths
+
+
+def forecast_paths(
+    y: np.ndarray,
+    periods: int,
+    method: str = "ma",
+    n_paths: int = DEFAULT_N_PATHS,
+    season_length: int = 1,
+    n_origins: int = DEFAULT_RESIDUAL_ORIGINS,
+    seed: Optional[int] = None,
+    point: Optional[np.ndarray] = None,
+) -> Dict[str, Any]:
+    """
+    Ścieżki popytu dla macierzy historii (NaN przed startem szeregu).
+
+    Zwraca dict:
+    {
+        "point": (S × periods) prognoza punktowa (podaj point, jeśli już ją masz),
+        "paths": (S × n_paths × periods) – nieujemne ścieżki popytu,
+        "source": (S,) "bootstrap" / "history_std" / "none",
+    }
+    Pamięć to S · n_paths · periods – dla całego asortymentu używaj forecast_quantiles.
+    """
+    y = np.asarray(y, dtype=float)
+    if method not in BATCH_FORECASTERS:
+        method = "ma"
+    if point is None:
+        point = forecast_matrix(y, periods, method, season_length)
+    res = horizon_residuals(y, periods, method, n_origins, season_length)
+    sigma = _history_std(y)
+    rng = np.random.default_rng(seed)
+    return {
+        "point": point,
+        "paths": _sample_paths(point, res, sigma, int(n_paths), rng),
+        "source": _path_source(res["n_valid"], sigma),
+    }
+
+
+def forecast_quantiles(
+    y: np.ndarray,
+    periods: int,
+    method: str = "ma",
+    quantiles: Sequence[float] = DEFAULT_QUANTILES,
+    n_paths: int = DEFAULT_N_PATHS,
+    season_length: int = 1,
+    n_origins: int = DEFAULT_RESIDUAL_ORIGINS,
+    seed: Optional[int] = None,
+    point: Optional[np.ndarray] = None,
+) -> Dict[str, Any]:
+    """
+    Kwantyle prognozy (S × len(quantiles) × periods) – ścieżki liczymy paczkami szeregów
+    i od razu zwijamy do kwantyli, więc pamięć nie rośnie z n_paths × liczba SKU.
+    """
+    y = np.asarray(y, dtype=float)
+    if method not in BATCH_FORECASTERS:
+        method = "ma"
+    qs = np.asarray(list(quantiles), dtype=float)
+    n_series = y.shape[0]
+    if point is None:
+        point = forecast_matrix(y, periods, method, season_length)
+    res = horizon_residuals(y, periods, method, n_origins, season_length)
+    sigma = _history_std(y)
+    rng = np.random.default_rng(seed)
+
+    out = np.empty((n_series, qs.size, periods))
+    chunk = max(1, _PATHS_CHUNK_ELEMENTS // max(int(n_paths) * periods, 1))
+    for lo in range(0, n_series, chunk):
+        sl = slice(lo, min(lo + chunk, n_series))
+        part = {"residuals": res["residuals"][sl], "n_valid": res["n_valid"][sl], "step_map": res["step_map"]}
+        paths = _sample_paths(point[sl], part, sigma[sl], int(n_paths), rng)
+        out[sl] = np.moveaxis(np.quantile(paths, qs, axis=1), 0, 1)
+    return {
+        "point": point,
+        "quantiles": out,
+        "levels": qs,
+        "source": _path_source(res["n_valid"], sigma),
+    }
+
+
+def _path_source(n_valid: np.ndarray, sigma: np.ndarray) -> np.ndarray:
+    return np.where(n_valid > 0, "bootstrap", np.where(sigma > 0, "history_std", "none")).astype(object)
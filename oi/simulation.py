@@ -7,102 +7,793 @@ Pozwala:
 - zasymulować zużycie zapasu przy danym forecastcie i zmienności,
 - przetestować prostą politykę uzupełniania (ROP + qty),
 - oszacować prawdopodobieństwo stock-outu (service level),
-- uruchomić kilka scenariuszy na raz (np. różne poziomy ROP albo lead time).
+- uruchomić kilka scenariuszy na raz (np. różne poziomy ROP albo lead time),
+- zasymulować cały asortyment (SKU × magazyn) jednym przebiegiem (simulate_portfolio),
+- znaleźć per SKU najmniejszy ROP dający docelowy CSL / fill rate (optimize_reorder_points).
 
 Do użycia z zakładką "🧪 Symulacje".
 """
 
-from typing import Dict, List, Any, Optional, Sequence
+import hashlib
+from collections import OrderedDict
+import time
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from multiprocessing import shared_memory
+from typing import Callable, Dict, List, Any, Optional, Sequence, Tuple, Union
+
 import numpy as np
 import pandas as pd
+from scipy.special import ndtri
+from scipy.stats import qmc
 
-from .config import CONFIG
+from .config import CONFIG, _resolve_n_jobs
+from .optimization import calc_reorder_point, calc_safety_stock
+from .preprocessing import pivot_sales_matrix
+from .online_stats import RunningMoments, TDigest, wilson_half_width, z_for_confidence
 
 
 # ─────────────────────────────────────────────────────────────
 # Helpery
 # ─────────────────────────────────────────────────────────────
 
-def _to_daily_series(forecast: pd.Series) -> pd.Series:
+# seed akceptowany przez symulacje: int, SeedSequence, gotowy Generator albo None
+SeedLike = Union[None, int, np.random.SeedSequence, np.random.Generator]
+
+# domyślne percentyle zapasu końcowego (w %)
+DEFAULT_PERCENTILES: Tuple[float, ...] = (5.0, 50.0, 95.0)
+
+
+def _resolve_rng(seed: SeedLike = None) -> np.random.Generator:
     """
-    Jeśli prognoza jest tygodniowa/miesięczna, spróbuj ją rozbić na dni
-    proporcjonalnie (po równo). To daje lepszą symulację “dzień po dniu”.
+    Zamienia to, co przyszło z zewnątrz, na `np.random.Generator`.
+    Gotowy Generator przepuszczamy bez zmian – wtedy wywołujący kontroluje strumień.
     """
-    if forecast.empty:
-        return forecast
+    if isinstance(seed, np.random.Generator):
+        return seed
+    return np.random.default_rng(seed)
 
-    idx = forecast.index
-    # jeśli to już jest dzienne – zostaw
-    if idx.freq is not None and str(idx.freq).upper().startswith("D"):
-        return forecast
 
-    # spróbuj zgadnąć interwał
-    diffs = idx.to_series().diff().dropna()
-    if diffs.empty:
-        return forecast
+# strategie redukcji wariancji dostępne w symulacjach
+VARIANCE_REDUCTION: Tuple[str, ...] = ("none", "antithetic", "sobol")
+
+
+def _sample_standard_normals(
+    n_sim: int,
+    n_days: int,
+    rng: np.random.Generator,
+    variance_reduction: str = "none",
+    day_major: bool = False,
+) -> np.ndarray:
+    """
+    Losuje macierz N(0, 1) o kształcie (n_sim × n_days) wg wybranej strategii:
+    - "none"       – zwykłe pseudolosowe próbki,
+    - "antithetic" – pary (z, -z): wiersz i oraz i + n_sim // 2 są lustrzane
+                     (przy nieparzystym n_sim ostatni wiersz zostaje bez pary),
+    - "sobol"      – scramblowany ciąg Sobola (quasi-MC) przepuszczony przez odwrotną dystrybuantę;
+                     najlepiej działa, gdy n_sim jest potęgą dwójki.
+
+    day_major=True – ta sama macierz, ale w pamięci dzień po dniu (transpozycja tablicy
+    n_days × n_sim, porządek Fortran). _simulate_policy_core czyta popyt dniami, więc nie musi
+    go wtedy przepisywać; strumień RNG jest ułożony inaczej niż przy day_major=False.
+    """
+    if variance_reduction not in VARIANCE_REDUCTION:
+        raise ValueError(
+            f"Nieznana strategia redukcji wariancji: {variance_reduction!r} "
+            f"(dostępne: {', '.join(VARIANCE_REDUCTION)})"
+        )
+
+    if variance_reduction == "antithetic":
+        half = n_sim // 2
+        if day_major:
+            z = rng.standard_normal((n_days, half))
+            parts = [z, -z]
+            if n_sim % 2:
+                parts.append(rng.standard_normal((n_days, 1)))
+            return np.concatenate(parts, axis=1).T
+        z = rng.standard_normal((half, n_days))
+        parts = [z, -z]
+        if n_sim % 2:
+            parts.append(rng.standard_normal((1, n_days)))
+        return np.concatenate(parts, axis=0)
+
+    if variance_reduction == "sobol":
+        sampler = qmc.Sobol(d=n_days, scramble=True, seed=rng)
+        with warnings.catch_warnings():
+            # Sobol ostrzega, gdy n nie jest potęgą 2 – to tylko gorsze pokrycie, nie błąd
+            warnings.simplefilter("ignore", category=UserWarning)
+            u = sampler.random(n_sim)
+        np.clip(u, 1e-12, 1.0 - 1e-12, out=u)
+        return np.asfortranarray(ndtri(u)) if day_major else ndtri(u)
+
+    if day_major:
+        return rng.standard_normal((n_days, n_sim)).T
+    return rng.standard_normal((n_sim, n_days))
+
+
+def _demand_from_normals(
+    daily: np.ndarray,
+    normals: np.ndarray,
+    demand_volatility: float,
+) -> np.ndarray:
+    """
+    Zamienia N(0, 1) na popyt: prognoza + N(0, volatility * prognoza), przycięty do zera.
+    Nie modyfikuje `normals` – ta sama macierz może obsłużyć wiele scenariuszy (CRN).
+    """
+    demand = normals * (demand_volatility * np.abs(daily))
+    demand += daily
+    np.maximum(demand, 0.0, out=demand)
+    return demand
+
+
+def _sample_demand_matrix(
+    daily: np.ndarray,
+    n_sim: int,
+    demand_volatility: float,
+    rng: np.random.Generator,
+    variance_reduction: str = "none",
+    day_major: bool = False,
+) -> np.ndarray:
+    """
+    Losuje cały blok popytu (n_sim × n_days) jednym wywołaniem RNG.
+    Model jak wcześniej: popyt = prognoza + N(0, volatility * prognoza), przycięty do zera.
+    day_major – układ pamięci jak w _sample_standard_normals (dla _simulate_policy_core).
+    """
+    demand = _sample_standard_normals(n_sim, daily.size, rng, variance_reduction, day_major)
+    demand *= demand_volatility * np.abs(daily)
+    demand += daily
+    np.maximum(demand, 0.0, out=demand)
+    return demand
+
+
+def _mean_standard_error(values: np.ndarray, variance_reduction: str = "none") -> float:
+    """
+    Błąd standardowy średniej z metryk per przebieg.
+    Dla "antithetic" liczymy go na średnich z par (z, -z) – pary nie są niezależne.
+    Dla "sobol" wzór iid jest zachowawczy (zawyża błąd), ale daje bezpieczną górną granicę.
+    """
+    n = values.size
+    if variance_reduction == "antithetic" and n >= 4:
+        half = n // 2
+        values = 0.5 * (values[:half] + values[half:2 * half])
+        n = values.size
+    if n < 2:
+        return 0.0
+    return float(values.std(ddof=1) / np.sqrt(n))
+
+
+def _format_pct(p: float) -> str:
+    """5.0 -> '5', 97.5 -> '97.5' – do kluczy typu 'p5', 'p97.5'."""
+    return f"{p:g}"
+
+
+# offsety, w których pandas etykietuje okres jego KOŃCEM (resample "W", "M", "Q", "Y")
+_END_ANCHORED_OFFSETS = (
+    pd.offsets.MonthEnd,
+    pd.offsets.QuarterEnd,
+    pd.offsets.YearEnd,
+    pd.offsets.BusinessMonthEnd,
+)
+
+# cache rozbić na dni: klucz (hash prognozy, profil) → dzienna seria
+_DAILY_CACHE: "OrderedDict[Tuple[Any, ...], pd.Series]" = OrderedDict()
+_DAILY_CACHE_MAX = 256
+
+
+def _infer_offset(idx: pd.DatetimeIndex) -> Optional[pd.DateOffset]:
+    """Częstotliwość indeksu: z idx.freq, a jak jej brak – z pd.infer_freq (min. 3 punkty)."""
+    if idx.freq is not None:
+        return idx.freq
+    if len(idx) < 3:
+        return None
+    try:
+        freq = pd.infer_freq(idx)
+    except (TypeError, ValueError):
+        return None
+    return pd.tseries.frequencies.to_offset(freq) if freq else None
+
+
+def _period_bounds(idx: pd.DatetimeIndex) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Dla każdego okresu prognozy zwraca (pierwszy dzień jako datetime64[D], liczba dni).
+
+    - offsety "końcowe" (W-SUN, ME, QE, YE): okres i to (ts_{i-1}, ts_i],
+      a dla pierwszego okresu poprzedni koniec liczymy jako ts_0 − offset,
+    - pozostałe (MS, D, ...): okres i to [ts_i, ts_{i+1}), ostatni kończy się na ts_n + offset,
+    - brak rozpoznanej częstotliwości: długości z różnic między kolejnymi punktami,
+      ostatni okres jak przedostatni (okresy liczone od etykiety w przód).
+
+    Długości okresów są więc prawdziwe dla każdego okresu – miesiąc ma 28–31 dni.
+    """
+    days = idx.normalize().values.astype("datetime64[D]")
+    offset = _infer_offset(idx)
+
+    if offset is not None:
+        end_anchored = isinstance(offset, _END_ANCHORED_OFFSETS) or (
+            isinstance(offset, pd.offsets.Week) and offset.weekday is not None
+        )
+        if end_anchored:
+            first_prev = (idx[0].normalize() - offset).to_datetime64().astype("datetime64[D]")
+            prev_ends = np.concatenate([[first_prev], days[:-1]])
+            return prev_ends + 1, (days - prev_ends).astype(np.int64)
+        last_next = (idx[-1].normalize() + offset).to_datetime64().astype("datetime64[D]")
+        next_starts = np.concatenate([days[1:], [last_next]])
+        return days, (next_starts - days).astype(np.int64)
+
+    if len(days) < 2:
+        return days, np.ones(len(days), dtype=np.int64)
+    lengths = np.diff(days).astype(np.int64)
+    return days, np.append(lengths, lengths[-1])
+
+
+def _daily_cache_key(forecast: pd.Series, weekday_profile: Optional[Sequence[float]]) -> Tuple[Any, ...]:
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(np.ascontiguousarray(forecast.to_numpy(dtype=float)).tobytes())
+    digest.update(np.ascontiguousarray(forecast.index.asi8).tobytes())
+    freq = forecast.index.freqstr if isinstance(forecast.index, pd.DatetimeIndex) else None
+    profile = tuple(float(w) for w in weekday_profile) if weekday_profile is not None else None
+    return digest.hexdigest(), freq, profile
+
+
+def _daily_split(
+    idx: pd.DatetimeIndex,
+    weekday_profile: Optional[Sequence[float]] = None,
+) -> Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+    """
+    Rozbicie okresów (posortowany indeks) na dni: (dni jako datetime64[D], okres dnia, udział dnia w okresie).
+    None, gdy indeks jest już dzienny – każdy okres to jeden dzień.
+    """
+    starts, lengths = _period_bounds(idx)
+    if np.all(lengths <= 1):
+        return None
+    lengths = np.maximum(lengths, 1)
+    period_id = np.repeat(np.arange(lengths.size), lengths)
+    first_pos = np.cumsum(lengths) - lengths
+    day_idx = starts[period_id] + (np.arange(period_id.size) - first_pos[period_id])
+
+    if weekday_profile is not None:
+        profile = np.asarray(weekday_profile, dtype=float)
+        # datetime64[D]: 1970-01-01 to czwartek → (d + 3) % 7 daje 0 = poniedziałek
+        weights = profile[(day_idx.astype(np.int64) + 3) % 7]
+        period_weight = np.add.reduceat(weights, first_pos)
+        uniform = period_weight[period_id] <= 0
+        share = np.where(uniform, 1.0 / lengths[period_id], weights / np.where(uniform, 1.0, period_weight[period_id]))
+    else:
+        share = 1.0 / lengths[period_id]
+    return day_idx, period_id, share
 
-    days = int(diffs.iloc[0].days)
-    if days <= 1:
+
+def _daily_path_sampler(
+    forecast: pd.Series,
+    demand_paths: np.ndarray,
+    weekday_profile: Optional[Sequence[float]] = None,
+) -> Callable[[int, np.random.Generator], np.ndarray]:
+    """
+    Losowanie popytu dziennego ze ścieżek prognozy (n_paths × okresy, np. forecast_sku(n_paths=...)):
+    każdy przebieg dostaje losową ścieżkę (ze zwracaniem), rozbitą na dni jak prognoza
+    w _to_daily_series. Kolejność okresów ścieżek = kolejność indeksu prognozy.
+    """
+    paths = np.atleast_2d(np.asarray(demand_paths, dtype=float))
+    if paths.shape[1] != len(forecast):
+        raise ValueError(
+            f"demand_paths ma {paths.shape[1]} okresów, a prognoza {len(forecast)} – muszą się zgadzać."
+        )
+    split = None
+    if isinstance(forecast.index, pd.DatetimeIndex):
+        order = np.argsort(forecast.index.asi8, kind="stable")
+        paths = paths[:, order]
+        split = _daily_split(forecast.index[order], weekday_profile)
+    if split is None:
+        period_id, share = np.arange(paths.shape[1]), np.ones(paths.shape[1])
+    else:
+        _, period_id, share = split
+    daily_paths = np.maximum(paths[:, period_id] * share, 0.0)
+
+    def sample(n: int, rng: np.random.Generator) -> np.ndarray:
+        return daily_paths[rng.integers(0, daily_paths.shape[0], size=n)]
+
+    return sample
+
+
+def _to_daily_series(
+    forecast: pd.Series,
+    weekday_profile: Optional[Sequence[float]] = None,
+) -> pd.Series:
+    """
+    Jeśli prognoza jest tygodniowa/miesięczna, rozbij ją na dni.
+
+    Wektorowo: długości okresów z _period_bounds, indeks dzienny przez np.repeat,
+    wartości dzielone po równo albo wg profilu dnia tygodnia
+    (weekday_profile – 7 wag, pon..nd, np. z weekday_profile_from_sales).
+    Suma dni w każdym okresie = wartość okresu.
+
+    Wynik jest cache'owany per (dane prognozy, profil), więc kolejne symulacje
+    dla tej samej prognozy nie przeliczają go od nowa.
+    """
+    if forecast.empty or not isinstance(forecast.index, pd.DatetimeIndex):
         return forecast
 
-    # rozbij każdy okres na 'days' dni
-    daily_values = []
-    daily_index = []
-    for i, (ts, val) in enumerate(forecast.items()):
-        per_day = val / days
-        for d in range(days):
-            daily_index.append(ts + pd.Timedelta(days=d))
-            daily_values.append(per_day)
+    key = _daily_cache_key(forecast, weekday_profile)
+    cached = _DAILY_CACHE.get(key)
+    if cached is not None:
+        _DAILY_CACHE.move_to_end(key)
+        return cached.copy()
+
+    forecast = forecast.sort_index()
+    split = _daily_split(forecast.index, weekday_profile)
+    if split is None:
+        # już dzienne (albo nie da się sensownie rozbić) – zostaw
+        daily = forecast
+    else:
+        day_idx, period_id, share = split
+        values = forecast.to_numpy(dtype=float)
+        daily = pd.Series(values[period_id] * share, index=pd.DatetimeIndex(day_idx.astype("datetime64[ns]")))
+
+    _DAILY_CACHE[key] = daily
+    if len(_DAILY_CACHE) > _DAILY_CACHE_MAX:
+        _DAILY_CACHE.popitem(last=False)
+    return daily.copy()
+
+
+def weekday_profile_from_sales(
+    df: pd.DataFrame,
+    sku: Optional[str] = None,
+    location: Optional[str] = None,
+) -> Optional[np.ndarray]:
+    """
+    Uczy profil dnia tygodnia z dziennej historii sprzedaży (kolumny z CONFIG).
+    Zwraca 7 wag (pon..nd) o średniej 1 – np. [0.9, 1.0, 1.1, 1.2, 1.4, 0.3, 0.1].
+    Brak danych → None (symulacja rozbije okresy po równo).
+    """
+    needed = [CONFIG.date_col, CONFIG.qty_col]
+    if df is None or df.empty or any(col not in df.columns for col in needed):
+        return None
 
-    return pd.Series(daily_values, index=pd.DatetimeIndex(daily_index)).sort_index()
+    cond = pd.Series(True, index=df.index)
+    if sku is not None and CONFIG.sku_col in df.columns:
+        cond &= df[CONFIG.sku_col] == sku
+    if location and CONFIG.location_col in df.columns:
+        cond &= df[CONFIG.location_col] == location
+
+    dates = pd.to_datetime(df.loc[cond, CONFIG.date_col], errors="coerce")
+    qty = pd.to_numeric(df.loc[cond, CONFIG.qty_col], errors="coerce")
+    ok = dates.notna() & qty.notna()
+    if not ok.any():
+        return None
+
+    day = dates[ok].values.astype("datetime64[D]").astype(np.int64)
+    first, last = day.min(), day.max()
+    # dzienne sumy na pełnym kalendarzu (dni bez sprzedaży też się liczą)
+    totals = np.bincount(day - first, weights=qty[ok].to_numpy(dtype=float), minlength=int(last - first + 1))
+    weekday = (np.arange(first, last + 1) + 3) % 7
+    per_weekday = np.bincount(weekday, weights=totals, minlength=7) / np.maximum(np.bincount(weekday, minlength=7), 1)
+    if per_weekday.sum() <= 0:
+        return None
+    return per_weekday / per_weekday.mean()
 
 
 # ─────────────────────────────────────────────────────────────
-# 1) Prosta symulacja – Twoja, tylko z minimalnymi usprawnieniami
+# Tryb adaptacyjny – symulujemy paczkami aż do żądanej precyzji
 # ─────────────────────────────────────────────────────────────
 
+# wielkość paczki w trybie adaptacyjnym (parzysta – pary antytetyczne się nie rozjeżdżają)
+DEFAULT_ADAPTIVE_BATCH = 250
+# tyle paczek musi przejść, zanim zatrzymamy się na tolerancji – pierwsza paczka
+# bez żadnej zmienności (same 0 / same 1, stały fill rate) dałaby przedział o szerokości 0
+_ADAPTIVE_MIN_BATCHES = 3
+
+
+def _run_adaptive(
+    simulate_batch: Callable[[int], Dict[str, np.ndarray]],
+    metric_key: str,
+    max_sim: int,
+    batch_size: int,
+    ci_tolerance: Optional[float],
+    confidence: float,
+    time_budget_s: Optional[float],
+    binary_metric: bool,
+    variance_reduction: str = "none",
+) -> Tuple[Dict[str, np.ndarray], Dict[str, Any]]:
+    """
+    Woła `simulate_batch(n)` paczkami i po każdej aktualizuje statystyki bieżące metryki
+    `metric_key` (tablica per przebieg). Kończy, gdy:
+    - połowa szerokości przedziału ufności <= ci_tolerance ("tolerance"),
+    - minął budżet czasu ("time_budget"),
+    - doszliśmy do max_sim przebiegów ("max_sim").
+
+    Dla metryk 0/1 (np. czy był stock-out) używamy przedziału Wilsona – nie zeruje się
+    przy p = 0, więc nie zatrzymamy się za wcześnie na SKU bez braków.
+    Przy "antithetic" statystyki liczymy na średnich z par (z, -z); dla metryk 0/1 przedział t
+    z par ma wtedy dolną granicę – Wilsona liczonego na liczbie par (para to jedna niezależna próba).
+    Na tolerancji kończymy najwcześniej po _ADAPTIVE_MIN_BATCHES paczkach.
+
+    Zwraca (sklejone metryki per przebieg, info o precyzji).
+    """
+    batch_size = max(2, int(batch_size) + int(batch_size) % 2)
+    stats = RunningMoments()
+    successes = 0.0
+    batches: List[Dict[str, np.ndarray]] = []
+    runs = 0
+    pairs = 0
+    half_width = float("inf")
+    stop_reason = "max_sim"
+    t0 = time.perf_counter()
+
+    while runs < max_sim:
+        n = min(batch_size, max_sim - runs)
+        out = simulate_batch(n)
+        batches.append(out)
+        runs += n
+
+        values = np.asarray(out[metric_key], dtype=float)
+        if variance_reduction == "antithetic" and values.size >= 2:
+            half = values.size // 2
+            stats.update(0.5 * (values[:half] + values[half:2 * half]))
+            pairs += half
+        else:
+            stats.update(values)
+        successes += float(values.sum())
+
+        if binary_metric and variance_reduction != "antithetic":
+            half_width = wilson_half_width(successes, runs, confidence)
+        elif binary_metric:
+            # paczka z samymi 0 / 1 daje t-przedział 0 – Wilson na parach trzyma podłogę
+            floor = wilson_half_width(successes * pairs / max(runs, 1), pairs, confidence)
+            half_width = max(float(stats.ci_half_width(confidence)), floor)
+        else:
+            half_width = float(stats.ci_half_width(confidence))
+
+        if ci_tolerance is not None and len(batches) >= _ADAPTIVE_MIN_BATCHES and half_width <= ci_tolerance:
+            stop_reason = "tolerance"
+            break
+        if time_budget_s is not None and time.perf_counter() - t0 >= time_budget_s:
+            stop_reason = "time_budget"
+            break
+
+    merged = {key: np.concatenate([b[key] for b in batches]) for key in batches[0]} if batches else {}
+    info = {
+        "adaptive": True,
+        "ci_metric": metric_key,
+        "ci_confidence": float(confidence),
+        "ci_half_width": float(half_width),
+        "ci_tolerance": None if ci_tolerance is None else float(ci_tolerance),
+        "stop_reason": stop_reason,
+        "elapsed_s": float(time.perf_counter() - t0),
+        "runs": int(runs),
+    }
+    return merged, info
+
+
+# ─────────────────────────────────────────────────────────────
+# 1) Prosta symulacja – cały blok (n_sim × n_days) losowany naraz
+# ─────────────────────────────────────────────────────────────
+
+def _simulate_stockout_batch(
+    daily: np.ndarray,
+    current_stock: float,
+    n_sim: int,
+    demand_volatility: float,
+    rng: np.random.Generator,
+    variance_reduction: str = "none",
+    path_sampler: Optional[Callable[[int, np.random.Generator], np.ndarray]] = None,
+) -> Dict[str, np.ndarray]:
+    """
+    Jeden blok symulacji bez zamówień – metryki per przebieg.
+    days_to_stockout = pierwszy dzień z ujemnym stanem (1 = pierwszy dzień), NaN gdy brak.
+    """
+    if path_sampler is not None:
+        demand = path_sampler(n_sim, rng)
+    else:
+        demand = _sample_demand_matrix(daily, n_sim, demand_volatility, rng, variance_reduction)
+
+    # stan po każdym dniu – popyt jest nieujemny, więc stan tylko spada
+    np.cumsum(demand, axis=1, out=demand)
+    stock_path = float(current_stock) - demand
+    ending_stocks = stock_path[:, -1]
+
+    stockout = ending_stocks < 0
+    days_to_stockout = np.full(n_sim, np.nan)
+    if stockout.any():
+        days_to_stockout[stockout] = np.argmax(stock_path[stockout] < 0, axis=1) + 1
+
+    return {
+        "ending_stock": ending_stocks,
+        "prob_stockout": stockout.astype(float),
+        "days_to_stockout": days_to_stockout,
+    }
+
+
+def _summarize_stockout_runs(
+    per_run: Dict[str, np.ndarray],
+    percentiles: Sequence[float],
+) -> Dict[str, Any]:
+    """Zwija metryki per przebieg symulacji bez zamówień do słownika dla UI."""
+    ending_stocks = per_run["ending_stock"]
+    stockout = per_run["prob_stockout"] > 0
+
+    avg_days_to_stockout: Optional[float] = None
+    if stockout.any():
+        avg_days_to_stockout = float(per_run["days_to_stockout"][stockout].mean())
+
+    pct_values = np.percentile(ending_stocks, list(percentiles)) if percentiles else []
+    ending_pct = {
+        f"p{_format_pct(p)}": float(v) for p, v in zip(percentiles, pct_values)
+    }
+
+    return {
+        "prob_stockout": float(stockout.mean()),
+        "avg_ending_stock": float(ending_stocks.mean()),
+        "min_ending_stock": float(ending_stocks.min()),
+        "max_ending_stock": float(ending_stocks.max()),
+        "ending_stock_percentiles": ending_pct,
+        "avg_days_to_stockout": avg_days_to_stockout,
+        "runs": int(ending_stocks.size),
+    }
+
+
 def monte_carlo_stockout(
     forecast: pd.Series,
     current_stock: float,
     lead_time_days: int,
     n_sim: int = 500,
     demand_volatility: float = 0.15,
-) -> Dict[str, float]:
+    seed: SeedLike = None,
+    percentiles: Sequence[float] = DEFAULT_PERCENTILES,
+    variance_reduction: str = "none",
+    ci_tolerance: Optional[float] = None,
+    time_budget_s: Optional[float] = None,
+    confidence: float = 0.95,
+    batch_size: int = DEFAULT_ADAPTIVE_BATCH,
+    weekday_profile: Optional[Sequence[float]] = None,
+    demand_paths: Optional[np.ndarray] = None,
+) -> Dict[str, Any]:
     """
     Bardzo prosty MC: losujemy zapotrzebowanie wokół prognozy
     i patrzymy, ile symulacji skończyło z ujemnym stanem.
     Nie ma tu jeszcze zamówień – to “worst case” jeśli nic nie robimy.
+
+    Cała macierz popytu (n_sim × n_days) jest losowana jednym wywołaniem
+    z `np.random.Generator`, przycinana do zera i sumowana skumulowanie –
+    zamiast pętli po przebiegach i dniach.
+
+    seed – int / Generator, żeby wynik dało się powtórzyć (None → losowo).
+    percentiles – które percentyle zapasu końcowego zwrócić (w %).
+    variance_reduction – "none" / "antithetic" / "sobol" (patrz _sample_standard_normals).
+    weekday_profile – 7 wag dnia tygodnia do rozbicia prognozy na dni (patrz _to_daily_series).
+    demand_paths – ścieżki popytu (n_paths × okresy prognozy, oi.probabilistic): przebieg losuje
+    ścieżkę zamiast szumu N(0, volatility · prognoza); demand_volatility i variance_reduction
+    są wtedy pomijane.
+
+    Tryb adaptacyjny (gdy podasz ci_tolerance albo time_budget_s):
+    symulujemy paczkami po batch_size, aż przedział ufności prawdopodobieństwa
+    stock-outu będzie węższy niż ±ci_tolerance, skończy się budżet czasu
+    albo dojdziemy do n_sim (wtedy n_sim jest górnym limitem).
+    Wynik dostaje wtedy ci_half_width, stop_reason i faktyczną liczbę przebiegów.
     """
     # urealnij forecast do dni
-    daily_forecast = _to_daily_series(forecast)
+    daily_forecast = _to_daily_series(forecast, weekday_profile)
+    daily = daily_forecast.to_numpy(dtype=float)
 
-    stockouts = 0
-    ending_stocks: List[float] = []
+    if n_sim <= 0 or daily.size == 0:
+        return {
+            "prob_stockout": 0.0,
+            "avg_ending_stock": float(current_stock) if n_sim > 0 else 0.0,
+            "min_ending_stock": float(current_stock) if n_sim > 0 else 0.0,
+            "max_ending_stock": float(current_stock) if n_sim > 0 else 0.0,
+            "ending_stock_percentiles": {},
+            "avg_days_to_stockout": None,
+            "runs": int(max(n_sim, 0)),
+        }
 
-    for _ in range(n_sim):
-        stock = float(current_stock)
-        for val in daily_forecast:
-            noise = np.random.normal(loc=0.0, scale=demand_volatility * val)
-            demand = max(val + noise, 0.0)
-            stock -= demand
-        ending_stocks.append(stock)
-        if stock < 0:
-            stockouts += 1
+    rng = _resolve_rng(seed)
+    path_sampler = None
+    if demand_paths is not None:
+        path_sampler = _daily_path_sampler(forecast, demand_paths, weekday_profile)
+        variance_reduction = "none"
 
-    prob_stockout = stockouts / n_sim if n_sim > 0 else 0.0
+    def simulate_batch(n: int) -> Dict[str, np.ndarray]:
+        return _simulate_stockout_batch(
+            daily, current_stock, n, demand_volatility, rng, variance_reduction, path_sampler
+        )
 
-    return {
-        "prob_stockout": float(prob_stockout),
-        "avg_ending_stock": float(np.mean(ending_stocks)) if ending_stocks else 0.0,
-        "min_ending_stock": float(np.min(ending_stocks)) if ending_stocks else 0.0,
-        "max_ending_stock": float(np.max(ending_stocks)) if ending_stocks else 0.0,
-    }
+    if ci_tolerance is None and time_budget_s is None:
+        return _summarize_stockout_runs(simulate_batch(n_sim), percentiles)
+
+    per_run, info = _run_adaptive(
+        simulate_batch,
+        metric_key="prob_stockout",
+        max_sim=n_sim,
+        batch_size=batch_size,
+        ci_tolerance=ci_tolerance,
+        confidence=confidence,
+        time_budget_s=time_budget_s,
+        binary_metric=True,
+        variance_reduction=variance_reduction,
+    )
+    res = _summarize_stockout_runs(per_run, percentiles)
+    res.update(info)
+    return res
 
 
 # ─────────────────────────────────────────────────────────────
 # 2) Zaawansowana symulacja z polityką uzupełnień
 # ─────────────────────────────────────────────────────────────
 
+def _simulate_policy_core(
+    demand: np.ndarray,
+    current_stock: Union[float, np.ndarray],
+    reorder_point: Union[float, np.ndarray],
+    order_qty: Union[float, np.ndarray],
+    lead_time_days: Union[int, np.ndarray],
+) -> Dict[str, np.ndarray]:
+    """
+    Silnik polityki (ROP, Q) – wszystkie przebiegi idą naprzód razem, dzień po dniu.
+
+    Stan trzymamy w tablicach NumPy o kształcie "przebiegów":
+    - stock     – stan netto (ujemny = zaległości / backorder),
+    - position  – pozycja zapasu = stan netto + zamówione w drodze,
+    - ring      – bufor pierścieniowy przyjęć (lead_time + 1 slotów × kształt przebiegów),
+                  slot (t + lead_time) % len(ring) trzyma dostawy na dzień t + lead_time.
+
+    Kolejność w dniu: przyjęcie dostaw → decyzja o zamówieniu → zużycie.
+    Zamawiamy, gdy pozycja zapasu spadnie poniżej ROP,
+    więc kilka zachodzących na siebie zamówień jest liczonych poprawnie.
+
+    demand ma kształt (..., n_sim, n_days); current_stock / reorder_point / order_qty
+    mogą być skalarami albo tablicami, które broadcastują się z (..., n_sim) –
+    np. ROP o kształcie (G, 1) liczy G polityk na tych samych ścieżkach popytu.
+
+    lead_time_days może być tablicą całkowitą o kształcie demand (albo broadcastującą się do niego) –
+    czas dostawy zamówienia złożonego danego dnia w danym przebiegu (losowy lead time, np. z oi.lead_times).
+    Zamówienia mogą się wtedy wyprzedzać; bufor ma max(lead time) + 1 slotów.
+
+    Zwraca metryki per przebieg (tablice o kształcie przebiegów); stockout_events to liczba
+    epizodów braku (wejść na minus) – zapas rośnie tylko przy dostawie, więc ≈ liczba cykli z brakiem.
+    """
+    n_days = demand.shape[-1]
+    shape = np.broadcast_shapes(
+        demand.shape[:-1], np.shape(current_stock), np.shape(reorder_point), np.shape(order_qty)
+    )
+    lead_draws: Optional[np.ndarray] = None
+    if np.ndim(lead_time_days) > 0:
+        draws = np.asarray(lead_time_days)
+        if not np.issubdtype(draws.dtype, np.integer):
+            draws = np.rint(draws).astype(np.int64)
+        lead_draws = np.broadcast_to(draws, shape + (n_days,))
+        lead_by_day = np.moveaxis(lead_draws, -1, 0)
+        lead = max(int(lead_draws.max(initial=0)), 0)
+    else:
+        lead = max(int(lead_time_days), 0)
+    n_slots = lead + 1
+
+    stock = np.empty(shape)
+    stock[...] = current_stock
+    start_stock = stock.copy()
+    # pozycję zapasu trzymamy wprost, żeby nie dodawać pipeline co dzień
+    position = stock.copy()
+    ring = np.zeros((n_slots,) + shape)
+
+    stockout_days = np.zeros(shape, dtype=np.int64)
+    stockout_events = np.zeros(shape, dtype=np.int64)
+    was_ok = np.empty(shape, dtype=bool)
+    short = np.empty(shape, dtype=bool)
+    need = np.empty(shape, dtype=bool)
+    on_hand_before_sum = np.zeros(shape)
+    inventory_sum = np.zeros(shape)
+    order_buf = np.empty(shape)
+    on_hand = np.empty(shape)
+
+    # dni czytamy w pętli – układ "dzień-major" daje ciągłą pamięć
+    # (popyt z _sample_demand_matrix(day_major=True) już tak leży – wtedy bez kopii)
+    demand_by_day = np.ascontiguousarray(np.moveaxis(demand, -1, 0))
+
+    can_order = bool(np.any(np.asarray(order_qty) > 0))
+    for t in range(n_days):
+        # przyjęcie dostaw
+        if lead > 0:
+            arriving = ring[t % n_slots]
+            stock += arriving
+            arriving[...] = 0.0
+
+        # decyzja o zamówieniu na podstawie pozycji zapasu
+        if can_order:
+            np.less(position, reorder_point, out=need)
+            np.multiply(need, order_qty, out=order_buf)
+            position += order_buf
+            if lead == 0:
+                stock += order_buf
+            elif lead_draws is not None:
+                # każdy przebieg ma własny slot przyjęcia; lead time 0 → od razu na stan
+                lt = np.maximum(lead_by_day[t], 0)
+                now = lt == 0
+                stock += np.where(now, order_buf, 0.0)
+                slots = ((t + lt) % n_slots).ravel()
+                ring.reshape(n_slots, -1)[slots, np.arange(slots.size)] += np.where(now, 0.0, order_buf).ravel()
+            else:
+                ring[(t + lead) % n_slots] += order_buf
+
+        # zużycie – obsłużone jest tylko to, co było fizycznie na półce:
+        # served = max(stan przed, 0) - max(stan po, 0)
+        d = demand_by_day[t]
+        np.maximum(stock, 0.0, out=on_hand)
+        on_hand_before_sum += on_hand
+        np.greater_equal(stock, 0.0, out=was_ok)
+        stock -= d
+        position -= d
+
+        np.less(stock, 0.0, out=short)
+        stockout_days += short
+        # nowy epizod braku: przed zużyciem półka nie była na minusie – do poziomu obsługi cyklu
+        np.logical_and(short, was_ok, out=was_ok)
+        stockout_events += was_ok
+        np.maximum(stock, 0.0, out=on_hand)
+        inventory_sum += on_hand
+
+    total_demand = np.broadcast_to(demand_by_day.sum(axis=0), shape)
+    # pozycja_końcowa = start + zamówione - popyt → liczba zamówień bez licznika w pętli
+    orders = np.zeros(shape, dtype=np.int64)
+    if can_order:
+        qty = np.broadcast_to(np.asarray(order_qty, dtype=float), shape)
+        ordered = position - start_stock + total_demand
+        orders = np.rint(np.divide(ordered, qty, out=np.zeros(shape), where=qty > 0)).astype(np.int64)
+
+    return {
+        "stockout_days": stockout_days,
+        "stockout_events": stockout_events,
+        "demand": np.array(total_demand),
+        "served": on_hand_before_sum - inventory_sum,
+        "inventory_sum": inventory_sum,
+        "orders": orders,
+        "ending_stock": stock,
+    }
+
+
+def _per_run_fill_rate(per_run: Dict[str, np.ndarray]) -> np.ndarray:
+    """Fill rate każdego przebiegu osobno (przebieg bez popytu = 1.0)."""
+    demand = per_run["demand"]
+    safe = np.where(demand > 0, demand, 1.0)
+    return np.where(demand > 0, per_run["served"] / safe, 1.0)
+
+
+def _summarize_policy_runs(
+    per_run: Dict[str, np.ndarray],
+    n_days: int,
+    service_level_target: Optional[float] = None,
+    variance_reduction: str = "none",
+) -> Dict[str, Any]:
+    """Zwija metryki per przebieg do słownika wyników pokazywanego w UI."""
+    stockout_days = per_run["stockout_days"]
+    n_sim = int(stockout_days.size)
+    if n_sim == 0:
+        return {"prob_any_stockout": 0.0, "avg_stockouts_per_run": 0.0, "runs": 0}
+
+    any_stockout = stockout_days > 0
+    total_demand = float(per_run["demand"].sum())
+    fill_rate = float(per_run["served"].sum() / total_demand) if total_demand > 0 else 1.0
+
+    res: Dict[str, Any] = {
+        "prob_any_stockout": float(any_stockout.mean()),
+        "avg_stockouts_per_run": float(stockout_days.mean()),
+        "fill_rate": fill_rate,
+        "avg_inventory": float(per_run["inventory_sum"].mean() / n_days) if n_days else 0.0,
+        "avg_orders_per_run": float(per_run["orders"].mean()),
+        "avg_ending_stock": float(per_run["ending_stock"].mean()),
+        "fill_rate_se": _mean_standard_error(_per_run_fill_rate(per_run), variance_reduction),
+        "avg_stockouts_per_run_se": _mean_standard_error(
+            stockout_days.astype(float), variance_reduction
+        ),
+        "runs": n_sim,
+    }
+
+    if service_level_target is not None:
+        # target np. 0.95 oznacza: 95% przebiegów bez stock-outu
+        res["service_level_achieved"] = float(1.0 - any_stockout.mean())
+        res["service_level_target"] = float(service_level_target)
+
+    return res
+
+
 def monte_carlo_policy(
     forecast: pd.Series,
     current_stock: float,
@@ -112,77 +803,87 @@ def monte_carlo_policy(
     n_sim: int = 500,
     demand_volatility: float = 0.15,
     service_level_target: Optional[float] = None,
+    seed: SeedLike = None,
+    variance_reduction: str = "none",
+    ci_tolerance: Optional[float] = None,
+    time_budget_s: Optional[float] = None,
+    ci_metric: str = "fill_rate",
+    confidence: float = 0.95,
+    batch_size: int = DEFAULT_ADAPTIVE_BATCH,
+    weekday_profile: Optional[Sequence[float]] = None,
+    demand_paths: Optional[np.ndarray] = None,
 ) -> Dict[str, Any]:
     """
-    Symuluje politykę:
-    - idziemy dzień po dniu,
-    - jeśli na początku dnia stan < ROP -> składamy zamówienie, które przychodzi po lead_time_days,
+    Symuluje politykę (ROP, Q) na wszystkich przebiegach naraz:
+    - idziemy dzień po dniu, ale każdy krok to operacje na tablicach n_sim,
+    - jeśli pozycja zapasu (stan + zamówione w drodze) < ROP -> składamy zamówienie,
+      które przychodzi po lead_time_days,
     - zużywamy zapas wg forecastu +/- losowy szum,
-    - mierzymy ile razy stan spadł poniżej zera.
+    - mierzymy ile dni stan był poniżej zera.
 
     Zwraca:
-    - prawdopodobieństwo stock-outu
-    - średnią liczbę stock-outów na przebieg
+    - prawdopodobieństwo stock-outu (choć jednego dnia w przebiegu)
+    - średnią liczbę dni ze stock-outem na przebieg
+    - fill rate (jaka część popytu została obsłużona z półki)
+    - średni zapas na półce
     - procent przebiegów spełniających target service level
+    - błędy standardowe fill rate i liczby dni ze stock-outem (*_se)
+
+    variance_reduction – "none" / "antithetic" / "sobol" (patrz _sample_standard_normals).
+    weekday_profile – 7 wag dnia tygodnia do rozbicia prognozy na dni (patrz _to_daily_series).
+    demand_paths – ścieżki popytu zamiast szumu wokół prognozy (jak w monte_carlo_stockout).
+
+    Tryb adaptacyjny (gdy podasz ci_tolerance albo time_budget_s): jak w
+    monte_carlo_stockout, ale kryterium stopu liczymy dla `ci_metric`
+    ("fill_rate" – średni fill rate przebiegu, albo "prob_any_stockout").
     """
+    if ci_metric not in ("fill_rate", "prob_any_stockout"):
+        raise ValueError(f"Nieobsługiwana metryka precyzji: {ci_metric!r}")
 
-    daily_forecast = _to_daily_series(forecast)
-    n_days = len(daily_forecast)
+    daily = _to_daily_series(forecast, weekday_profile).to_numpy(dtype=float)
+    if n_sim <= 0 or daily.size == 0:
+        return {"prob_any_stockout": 0.0, "avg_stockouts_per_run": 0.0, "runs": int(max(n_sim, 0))}
 
-    stockout_runs = 0
-    stockouts_per_run: List[int] = []
-    service_ok_runs = 0
-
-    for _ in range(n_sim):
-        stock = float(current_stock)
-        # kolejka dostaw: lista (day_arrives, qty)
-        deliveries: List[tuple[int, float]] = []
-        stockouts_this_run = 0
-
-        for day_idx, val in enumerate(daily_forecast):
-            # sprawdź, czy dziś coś przychodzi
-            # (tu dla prostoty day_idx to liczba dni od startu)
-            if deliveries and deliveries[0][0] == day_idx:
-                _, qty = deliveries.pop(0)
-                stock += qty
-
-            # jeśli stan poniżej ROP – złóż zamówienie
-            if stock < reorder_point and order_qty > 0:
-                deliveries.append((day_idx + lead_time_days, order_qty))
-
-            # zużycie
-            noise = np.random.normal(loc=0.0, scale=demand_volatility * val)
-            demand = max(val + noise, 0.0)
-            stock -= demand
-
-            if stock < 0:
-                stockouts_this_run += 1
-
-        stockouts_per_run.append(stockouts_this_run)
-        if stockouts_this_run > 0:
-            stockout_runs += 1
-
-        # service level run-level (brak stock-outu w ogóle)
-        if service_level_target is not None:
-            # target np. 0.95 oznacza: 95% przebiegów bez stock-outu
-            # tu zapisujemy po prostu info, czy ten przebieg był OK
-            if stockouts_this_run == 0:
-                service_ok_runs += 1
-
-    prob_any_stockout = stockout_runs / n_sim if n_sim > 0 else 0.0
-    avg_stockouts = float(np.mean(stockouts_per_run)) if stockouts_per_run else 0.0
+    rng = _resolve_rng(seed)
+    path_sampler = None
+    if demand_paths is not None:
+        path_sampler = _daily_path_sampler(forecast, demand_paths, weekday_profile)
+        variance_reduction = "none"
 
-    res: Dict[str, Any] = {
-        "prob_any_stockout": float(prob_any_stockout),
-        "avg_stockouts_per_run": avg_stockouts,
-        "runs": int(n_sim),
-    }
+    def simulate_batch(n: int) -> Dict[str, np.ndarray]:
+        if path_sampler is not None:
+            demand = path_sampler(n, rng)
+        else:
+            demand = _sample_demand_matrix(daily, n, demand_volatility, rng, variance_reduction, day_major=True)
+        per_run = _simulate_policy_core(
+            demand,
+            current_stock=current_stock,
+            reorder_point=reorder_point,
+            order_qty=order_qty,
+            lead_time_days=lead_time_days,
+        )
+        per_run["fill_rate"] = _per_run_fill_rate(per_run)
+        per_run["prob_any_stockout"] = (per_run["stockout_days"] > 0).astype(float)
+        return per_run
 
-    if service_level_target is not None and n_sim > 0:
-        achieved = service_ok_runs / n_sim
-        res["service_level_achieved"] = float(achieved)
-        res["service_level_target"] = float(service_level_target)
+    if ci_tolerance is None and time_budget_s is None:
+        return _summarize_policy_runs(
+            simulate_batch(n_sim), daily.size, service_level_target, variance_reduction
+        )
 
+    per_run, info = _run_adaptive(
+        simulate_batch,
+        metric_key=ci_metric,
+        max_sim=n_sim,
+        batch_size=batch_size,
+        ci_tolerance=ci_tolerance,
+        confidence=confidence,
+        time_budget_s=time_budget_s,
+        binary_metric=ci_metric == "prob_any_stockout",
+        variance_reduction=variance_reduction,
+    )
+    res = _summarize_policy_runs(per_run, daily.size, service_level_target, variance_reduction)
+    res.update(info)
     return res
 
 
@@ -190,12 +891,156 @@ def monte_carlo_policy(
 # 3) Runner wielu scenariuszy – np. różne ROP albo różna zmienność
 # ─────────────────────────────────────────────────────────────
 
+# tablice podpięte z pamięci współdzielonej w procesie workera (nazwa → ndarray)
+_WORKER_ARRAYS: Dict[str, np.ndarray] = {}
+# uchwyty SharedMemory trzymamy, żeby bufor nie zniknął spod ndarray
+_WORKER_SHM: List[shared_memory.SharedMemory] = []
+
+
+class _SharedArrays:
+    """
+    Context manager: kopiuje tablice raz do `multiprocessing.shared_memory`
+    i oddaje lekkie specyfikacje (nazwa segmentu, kształt, dtype) do przekazania workerom.
+    Po wyjściu z bloku segmenty są zamykane i usuwane.
+    """
+
+    def __init__(self, arrays: Dict[str, np.ndarray]) -> None:
+        self._arrays = arrays
+        self._blocks: List[shared_memory.SharedMemory] = []
+        self.specs: Dict[str, Tuple[str, Tuple[int, ...], str]] = {}
+
+    def __enter__(self) -> "_SharedArrays":
+        for key, arr in self._arrays.items():
+            arr = np.ascontiguousarray(arr)
+            shm = shared_memory.SharedMemory(create=True, size=max(arr.nbytes, 1))
+            self._blocks.append(shm)
+            np.ndarray(arr.shape, dtype=arr.dtype, buffer=shm.buf)[...] = arr
+            self.specs[key] = (shm.name, arr.shape, arr.dtype.str)
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        for shm in self._blocks:
+            shm.close()
+            shm.unlink()
+        self._blocks.clear()
+
+
+def _attach_shared_arrays(specs: Dict[str, Tuple[str, Tuple[int, ...], str]]) -> None:
+    """Initializer puli procesów – podpina tablice z pamięci współdzielonej (bez kopiowania)."""
+    _WORKER_ARRAYS.clear()
+    for key, (name, shape, dtype) in specs.items():
+        try:
+            # Python 3.13+: segment należy do procesu głównego, worker go nie sprząta
+            shm = shared_memory.SharedMemory(name=name, track=False)
+        except TypeError:
+            shm = shared_memory.SharedMemory(name=name)
+        _WORKER_SHM.append(shm)
+        _WORKER_ARRAYS[key] = np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf)
+
+
+def _scenario_params(sc: Dict[str, Any], lead_time_days: int) -> Dict[str, Any]:
+    """Wyciąga parametry scenariusza z wartościami domyślnymi."""
+    return {
+        "scenario": sc.get("name", "scenario"),
+        "reorder_point": float(sc.get("reorder_point", 0)),
+        "order_qty": float(sc.get("order_qty", 0)),
+        "demand_volatility": float(sc.get("demand_volatility", 0.15)),
+        "lead_time_days": int(sc.get("lead_time_days", lead_time_days)),
+    }
+
+
+def _run_policy_scenario(
+    daily: np.ndarray,
+    current_stock: float,
+    params: Dict[str, Any],
+    n_sim: int,
+    seed_seq: np.random.SeedSequence,
+    normals: Optional[np.ndarray] = None,
+    variance_reduction: str = "none",
+) -> Dict[str, Any]:
+    """
+    Jeden scenariusz – wspólne dla trybu lokalnego i workerów.
+    Jeśli dostaniemy `normals` (tryb CRN), popyt budujemy z nich zamiast losować od nowa.
+    """
+    if normals is None:
+        rng = np.random.default_rng(seed_seq)
+        demand = _sample_demand_matrix(
+            daily, n_sim, params["demand_volatility"], rng, variance_reduction
+        )
+    else:
+        demand = _demand_from_normals(daily, normals, params["demand_volatility"])
+    per_run = _simulate_policy_core(
+        demand,
+        current_stock=current_stock,
+        reorder_point=params["reorder_point"],
+        order_qty=params["order_qty"],
+        lead_time_days=params["lead_time_days"],
+    )
+    sim_res = _summarize_policy_runs(per_run, daily.size, variance_reduction=variance_reduction)
+    sim_res.update(params)
+    # metryki per przebieg – potrzebne do różnic względem scenariusza bazowego, potem usuwane
+    sim_res["_runs"] = {
+        "fill_rate": _per_run_fill_rate(per_run),
+        "stockout_days": per_run["stockout_days"].astype(float),
+    }
+    return sim_res
+
+
+def _run_policy_scenario_worker(
+    task: Tuple[Dict[str, Any], np.random.SeedSequence],
+    current_stock: float,
+    n_sim: int,
+    variance_reduction: str = "none",
+) -> Dict[str, Any]:
+    """Wersja dla puli procesów – prognoza dzienna (i ew. wspólne N(0,1)) z pamięci współdzielonej."""
+    params, seed_seq = task
+    return _run_policy_scenario(
+        _WORKER_ARRAYS["daily"],
+        current_stock,
+        params,
+        n_sim,
+        seed_seq,
+        normals=_WORKER_ARRAYS.get("normals"),
+        variance_reduction=variance_reduction,
+    )
+
+
+def _add_deltas_vs_base(
+    results: List[Dict[str, Any]],
+    paired: bool,
+    variance_reduction: str,
+) -> None:
+    """
+    Dopisuje do każdego scenariusza różnicę fill rate i dni ze stock-outem względem
+    pierwszego scenariusza (bazowego) wraz z błędem standardowym.
+    Przy CRN przebiegi są sparowane, więc błąd liczymy z różnic per przebieg –
+    to właśnie tu wspólne liczby losowe zwężają przedziały.
+    """
+    base = results[0]
+    for res in results:
+        for metric, key in (("fill_rate", "fill_rate"), ("stockout_days", "avg_stockouts_per_run")):
+            diff = res["_runs"][metric].mean() - base["_runs"][metric].mean()
+            if paired:
+                se = _mean_standard_error(res["_runs"][metric] - base["_runs"][metric], variance_reduction)
+            else:
+                se = float(np.hypot(res[f"{key}_se"], base[f"{key}_se"])) if res is not base else 0.0
+            res[f"delta_{key}_vs_base"] = float(diff)
+            res[f"delta_{key}_se"] = se
+    for res in results:
+        res.pop("_runs", None)
+
+
 def run_scenarios(
     forecast: pd.Series,
     current_stock: float,
     lead_time_days: int,
     scenarios: Sequence[Dict[str, Any]],
     n_sim: int = 500,
+    seed: Optional[Union[int, np.random.SeedSequence]] = None,
+    n_jobs: Optional[int] = 1,
+    common_random_numbers: bool = False,
+    variance_reduction: str = "none",
+    weekday_profile: Optional[Sequence[float]] = None,
 ) -> List[Dict[str, Any]]:
     """
     Uruchamia kilka wariantów symulacji z różnymi parametrami.
@@ -204,28 +1049,1123 @@ def run_scenarios(
     - reorder_point (float)
     - order_qty (float)
     - demand_volatility (float)
+    - lead_time_days (int, opcjonalnie – nadpisuje globalny)
+
+    Powtarzalność: każdy scenariusz dostaje własny strumień RNG z
+    `SeedSequence(seed).spawn(...)`, więc wynik zależy tylko od seed i pozycji
+    scenariusza na liście – nie od liczby workerów.
+
+    n_jobs > 1 (albo -1 = wszystkie rdzenie) uruchamia scenariusze w puli procesów;
+    prognoza dzienna trafia do workerów raz, przez pamięć współdzieloną.
+
+    common_random_numbers=True – jedna macierz N(0, 1) (n_sim × n_days) jest losowana raz
+    i używana przez wszystkie scenariusze (różnią się tylko parametrami polityki
+    i skalą szumu). Różnice między scenariuszami nie mieszają się wtedy z szumem losowania.
+
+    variance_reduction – "none" / "antithetic" / "sobol"; działa z CRN i bez.
+    weekday_profile – 7 wag dnia tygodnia do rozbicia prognozy na dni (patrz _to_daily_series).
 
-    Zwracamy listę wyników z nazwą scenariusza.
+    Każdy wynik ma też `delta_*_vs_base` i `delta_*_se` – różnicę względem
+    pierwszego scenariusza i jej błąd standardowy.
+
+    Zwracamy listę wyników z nazwą scenariusza (w kolejności wejścia).
     """
-    results: List[Dict[str, Any]] = []
-    for sc in scenarios:
-        name = sc.get("name", "scenario")
-        rop = float(sc.get("reorder_point", 0))
-        oq = float(sc.get("order_qty", 0))
-        vol = float(sc.get("demand_volatility", 0.15))
+    daily = _to_daily_series(forecast, weekday_profile).to_numpy(dtype=float)
+    params_list = [_scenario_params(sc, lead_time_days) for sc in scenarios]
+    if not params_list or n_sim <= 0:
+        return []
+
+    root = seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+    shared: Dict[str, np.ndarray] = {"daily": daily}
+    if common_random_numbers:
+        crn_rng = np.random.default_rng(root.spawn(1)[0])
+        shared["normals"] = _sample_standard_normals(n_sim, daily.size, crn_rng, variance_reduction)
+    tasks = list(zip(params_list, root.spawn(len(params_list))))
 
-        sim_res = monte_carlo_policy(
-            forecast=forecast,
+    workers = _resolve_n_jobs(n_jobs, len(tasks))
+    if workers <= 1:
+        results = [
+            _run_policy_scenario(
+                daily,
+                current_stock,
+                params,
+                n_sim,
+                seed_seq,
+                normals=shared.get("normals"),
+                variance_reduction=variance_reduction,
+            )
+            for params, seed_seq in tasks
+        ]
+    else:
+        worker_fn = partial(
+            _run_policy_scenario_worker,
             current_stock=current_stock,
-            reorder_point=rop,
-            order_qty=oq,
-            lead_time_days=lead_time_days,
             n_sim=n_sim,
-            demand_volatility=vol,
+            variance_reduction=variance_reduction,
         )
-        sim_res["scenario"] = name
-        sim_res["reorder_point"] = rop
-        sim_res["order_qty"] = oq
-        sim_res["demand_volatility"] = vol
-        results.append(sim_res)
+        # kilka zadań na paczkę – mniej round-tripów przy setkach scenariuszy
+        chunksize = max(1, len(tasks) // (workers * 4))
+        with _SharedArrays(shared) as shm:
+            with ProcessPoolExecutor(
+                max_workers=workers,
+                initializer=_attach_shared_arrays,
+                initargs=(shm.specs,),
+            ) as pool:
+                results = list(pool.map(worker_fn, tasks, chunksize=chunksize))
+
+    _add_deltas_vs_base(results, paired=common_random_numbers, variance_reduction=variance_reduction)
     return results
+
+
+# ─────────────────────────────────────────────────────────────
+# 4) Symulacja strumieniowa – stała pamięć niezależnie od n_sim
+# ─────────────────────────────────────────────────────────────
+
+def monte_carlo_streaming(
+    forecast: pd.Series,
+    current_stock: float,
+    lead_time_days: int,
+    n_sim: int = 100_000,
+    demand_volatility: float = 0.15,
+    reorder_point: Optional[float] = None,
+    order_qty: float = 0.0,
+    block_size: Optional[int] = None,
+    seed: SeedLike = None,
+    quantiles: Sequence[float] = (0.05, 0.5, 0.95),
+    variance_reduction: str = "none",
+    confidence: float = 0.95,
+    weekday_profile: Optional[Sequence[float]] = None,
+) -> Dict[str, Any]:
+    """
+    Symulacja dużej liczby przebiegów blokami po `block_size` (domyślnie CONFIG.sim_block_size).
+
+    Każdy blok (block_size × n_days) jest losowany, przeliczany i od razu wyrzucany –
+    zostają tylko agregaty liczone w locie:
+    - średnia / odchylenie zapasu końcowego (Welford),
+    - kwantyle zapasu końcowego (t-digest),
+    - liczniki stock-outów (przebiegi i dni), fill rate i średni zapas przy polityce.
+
+    fill_rate to Σ obsłużone / Σ popyt (estymator ilorazowy), więc jego przedział ufności liczymy
+    metodą delta z momentów (obsłużone, popyt) per przebieg, a nie ze średniej fill rate per przebieg.
+
+    Szczytowe zużycie pamięci zależy więc od block_size × horyzont, a nie od n_sim × horyzont.
+
+    reorder_point = None → symulacja bez zamówień (jak monte_carlo_stockout),
+    w przeciwnym razie polityka (ROP, order_qty) jak w monte_carlo_policy.
+    Przy variance_reduction="none" wynik nie zależy od block_size (ten sam strumień RNG).
+    """
+    daily = _to_daily_series(forecast, weekday_profile).to_numpy(dtype=float)
+    block = int(block_size or CONFIG.sim_block_size)
+    if block <= 0:
+        raise ValueError("block_size musi być dodatni.")
+
+    rng = _resolve_rng(seed)
+    with_policy = reorder_point is not None
+
+    ending = RunningMoments()
+    digest = TDigest()
+    # kolumny: obsłużone, popyt, obsłużone + popyt (z trzeciej wariancji wychodzi kowariancja)
+    served_demand = RunningMoments()
+    stockout_runs = 0
+    stockout_days_total = 0.0
+    demand_total = 0.0
+    served_total = 0.0
+    inventory_total = 0.0
+    runs = 0
+
+    while runs < n_sim and daily.size:
+        n = min(block, n_sim - runs)
+        if with_policy:
+            demand = _sample_demand_matrix(daily, n, demand_volatility, rng, variance_reduction)
+            per_run = _simulate_policy_core(
+                demand,
+                current_stock=current_stock,
+                reorder_point=float(reorder_point),
+                order_qty=order_qty,
+                lead_time_days=lead_time_days,
+            )
+            del demand
+            stockout = per_run["stockout_days"] > 0
+            stockout_days_total += float(per_run["stockout_days"].sum())
+            demand_total += float(per_run["demand"].sum())
+            served_total += float(per_run["served"].sum())
+            inventory_total += float(per_run["inventory_sum"].sum())
+            served_demand.update(
+                np.column_stack([per_run["served"], per_run["demand"], per_run["served"] + per_run["demand"]])
+            )
+        else:
+            per_run = _simulate_stockout_batch(
+                daily, current_stock, n, demand_volatility, rng, variance_reduction
+            )
+            stockout = per_run["prob_stockout"] > 0
+            # bez zamówień stan tylko spada: dni ze stock-outem = od pierwszego do końca
+            days = daily.size - per_run["days_to_stockout"][stockout] + 1
+            stockout_days_total += float(days.sum())
+
+        ending.update(per_run["ending_stock"])
+        digest.update(per_run["ending_stock"])
+        stockout_runs += int(stockout.sum())
+        runs += n
+        del per_run
+
+    if runs == 0:
+        return {"prob_stockout": 0.0, "runs": 0, "block_size": block}
+
+    q_values = digest.quantile(np.asarray(quantiles, dtype=float)) if quantiles else []
+    res: Dict[str, Any] = {
+        "prob_stockout": stockout_runs / runs,
+        "prob_stockout_ci_half_width": wilson_half_width(stockout_runs, runs, confidence),
+        "avg_stockout_days_per_run": stockout_days_total / runs,
+        "avg_ending_stock": float(ending.mean),
+        "std_ending_stock": float(ending.std),
+        "min_ending_stock": digest.min,
+        "max_ending_stock": digest.max,
+        "ending_stock_percentiles": {
+            f"p{_format_pct(q * 100)}": float(v) for q, v in zip(quantiles, q_values)
+        },
+        "runs": int(runs),
+        "block_size": block,
+        # macierz popytu + ścieżka stanu w bloku (float64)
+        "peak_block_mb": 2 * min(block, runs) * daily.size * 8 / 1e6,
+    }
+    if with_policy:
+        res["fill_rate"] = served_total / demand_total if demand_total > 0 else 1.0
+        res["fill_rate_ci_half_width"] = _ratio_ci_half_width(served_demand, res["fill_rate"], confidence)
+        res["avg_inventory"] = inventory_total / (runs * daily.size)
+    return res
+
+
+def _ratio_ci_half_width(moments: RunningMoments, ratio: float, confidence: float) -> float:
+    """
+    Połowa przedziału ufności dla R = ΣS / ΣD metodą delta:
+    Var(R) ≈ Var(S − R·D) / (n · E[D]²), Var(S − R·D) = Var S − 2R·Cov(S, D) + R²·Var D.
+    moments – RunningMoments kolumn (S, D, S + D).
+    """
+    if moments.count < 2:
+        return float("inf")
+    mean_d = float(moments.mean[1])
+    if mean_d <= 0:
+        return 0.0
+    var_s, var_d, var_sum = (float(v) for v in moments.variance)
+    cov = 0.5 * (var_sum - var_s - var_d)
+    var_lin = max(var_s - 2.0 * ratio * cov + ratio * ratio * var_d, 0.0)
+    return float(z_for_confidence(confidence) * np.sqrt(var_lin / moments.count) / mean_d)
+
+
+# ─────────────────────────────────────────────────────────────
+# 5) Kernel zdarzeniowy (DES) – skaczemy między zdarzeniami, nie dniami
+# ─────────────────────────────────────────────────────────────
+
+class _LeadTimeSampler:
+    """
+    Losuje lead time (w dniach, int >= 0) dla jednego dostawcy – od razu dla wielu zamówień.
+    Dostawca może mieć:
+    - lead_time_values + lead_time_probs – rozkład empiryczny,
+    - lead_time_days + lead_time_std_days – normalny zaokrąglony do dni (std=0 → stały).
+    """
+
+    def __init__(self, supplier: Dict[str, Any], rng: np.random.Generator) -> None:
+        self._rng = rng
+        values = supplier.get("lead_time_values")
+        if values is not None:
+            self._values = np.asarray(values, dtype=float)
+            probs = supplier.get("lead_time_probs")
+            self._probs = None if probs is None else np.asarray(probs, dtype=float) / np.sum(probs)
+            self._mean = self._std = None
+        else:
+            self._values = None
+            self._mean = float(supplier.get("lead_time_days", 0))
+            self._std = float(supplier.get("lead_time_std_days", 0.0))
+
+    def __call__(self, size: int) -> np.ndarray:
+        if self._values is not None:
+            draw = self._rng.choice(self._values, size=size, p=self._probs)
+        elif self._std > 0:
+            draw = self._rng.normal(self._mean, self._std, size=size)
+        else:
+            draw = np.full(size, self._mean)
+        return np.maximum(np.rint(draw), 0).astype(np.int64)
+
+
+def _normalize_suppliers(
+    suppliers: Optional[Sequence[Dict[str, Any]]],
+    lead_time_days: int,
+    lead_time_std_days: float,
+) -> List[Dict[str, Any]]:
+    """Lista dostawców z udziałami sumującymi się do 1 (brak listy → jeden dostawca)."""
+    if not suppliers:
+        return [{"name": "default", "share": 1.0,
+                 "lead_time_days": lead_time_days, "lead_time_std_days": lead_time_std_days}]
+    out = [dict(sp) for sp in suppliers]
+    shares = np.array([float(sp.get("share", 1.0)) for sp in out])
+    if shares.sum() <= 0:
+        raise ValueError("Udziały dostawców muszą sumować się do wartości dodatniej.")
+    for sp, share in zip(out, shares / shares.sum()):
+        sp["share"] = float(share)
+    return out
+
+
+def _sample_demand_events(
+    daily: np.ndarray,
+    n_sim: int,
+    demand_volatility: float,
+    rng: np.random.Generator,
+    demand_probability: Optional[float],
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Zdarzenia popytu wszystkich przebiegów w układzie CSR: (dni, wielkości, offsets) –
+    zdarzenia przebiegu i to days[offsets[i]:offsets[i + 1]], rosnąco po dniach.
+
+    - demand_probability=None – popyt w każdym dniu z niezerową prognozą,
+      cały blok losowany naraz,
+    - demand_probability=p – popyt sporadyczny: dzień ma popyt z prawdopodobieństwem p,
+      wielkość = prognoza / p ± szum. Dni losujemy przez odstępy geometryczne (macierz
+      przebiegi × oczekiwana liczba zdarzeń), więc pamięć i czas rosną z liczbą zdarzeń,
+      a nie z długością horyzontu.
+    """
+    cand = np.flatnonzero(daily > 0)
+    if cand.size == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0), np.zeros(n_sim + 1, dtype=np.int64)
+
+    if demand_probability is None or demand_probability >= 1.0:
+        sizes = _sample_demand_matrix(daily[cand], n_sim, demand_volatility, rng)
+        offsets = np.arange(n_sim + 1, dtype=np.int64) * cand.size
+        return np.tile(cand, n_sim), sizes.ravel(), offsets
+
+    p = float(demand_probability)
+    if p <= 0:
+        raise ValueError("demand_probability musi być w przedziale (0, 1].")
+    expected = int(cand.size * p * 1.2) + 16
+    pos = np.cumsum(rng.geometric(p, size=(n_sim, expected)), axis=1) - 1
+    while (pos[:, -1] < cand.size - 1).any():
+        more = pos[:, -1:] + np.cumsum(rng.geometric(p, size=(n_sim, expected)), axis=1)
+        pos = np.concatenate([pos, more], axis=1)
+    inside = pos < cand.size
+    offsets = np.zeros(n_sim + 1, dtype=np.int64)
+    np.cumsum(inside.sum(axis=1), out=offsets[1:])
+    days = cand[pos[inside]]
+    sizes = daily[days] / p * (1.0 + demand_volatility * rng.standard_normal(days.size))
+    np.maximum(sizes, 0.0, out=sizes)
+    return days, sizes, offsets
+
+
+def _simulate_events_batch(
+    days: np.ndarray,
+    sizes: np.ndarray,
+    offsets: np.ndarray,
+    horizon: int,
+    current_stock: float,
+    reorder_point: float,
+    order_qty: float,
+    suppliers: List[Dict[str, Any]],
+    samplers: List[_LeadTimeSampler],
+    review_period_days: Optional[int],
+) -> Dict[str, np.ndarray]:
+    """
+    Wszystkie przebiegi w trybie zdarzeniowym naraz. Każdy przebieg ma własny zegar:
+    w jednym kroku pętli każdy aktywny przebieg przechodzi do swojego następnego zdarzenia
+    – przyjęcia dostawy, punktu przeglądu (review_period_days) albo dnia przecięcia ROP
+    (przegląd ciągły). Kroków jest tyle, ile zdarzeń ma najdłuższy przebieg, a każdy krok
+    to kilkanaście operacji na tablicach długości "aktywne przebiegi".
+
+    Między zdarzeniami stan zmienia się tylko przez popyt, więc braki, obsłużony popyt
+    i sumę zapasu liczymy w zamkniętej postaci z sum skumulowanych (searchsorted),
+    bez iteracji po dniach. Popyt wszystkich przebiegów leży w jednym wektorze (CSR):
+    suma skumulowana jest niemalejąca w całym wektorze, więc jedno searchsorted przycięte
+    do zakresu przebiegu daje wynik jak wyszukiwanie w samym przebiegu.
+    Dostawy w drodze: macierz slotów (przebiegi × sloty, dzień przyjęcia + ilość), poszerzana,
+    gdy któremuś przebiegowi zabraknie miejsca. Kolejność w dniu jak w _simulate_policy_core:
+    przyjęcie → decyzja → zużycie.
+    """
+    n_sim = offsets.size - 1
+    n_ev = days.size
+    start, end = offsets[:-1], offsets[1:]
+    run_of = np.repeat(np.arange(n_sim), np.diff(offsets))
+
+    cum = np.zeros(n_ev + 1)                      # cum[g] = popyt zdarzeń przed g (globalnie)
+    np.cumsum(sizes, out=cum[1:])
+    base = cum[start]                             # popyt przed pierwszym zdarzeniem przebiegu
+    day_pad = np.append(days, horizon).astype(np.int64)   # strażnik: dzień "po ostatnim zdarzeniu"
+    day_key = run_of * (horizon + 1) + days       # klucz (przebieg, dzień) – rosnący globalnie
+    # W[g] = Σ_{j<g} popyt przebiegu po zdarzeniu j · (dni do następnego zdarzenia przebiegu)
+    gaps = np.zeros(n_ev)
+    if n_ev:
+        gaps[:-1] = np.diff(days)
+        gaps[end[end > start] - 1] = 0.0
+    prefix = np.zeros(n_ev + 1)
+    np.cumsum((cum[1:] - base[run_of]) * gaps, out=prefix[1:])
+
+    def day_at(g: np.ndarray, e: np.ndarray) -> np.ndarray:
+        return np.where(g < e, day_pad[g], horizon)
+
+    stock = np.full(n_sim, float(current_stock))
+    # pozycja zapasu trzymana względem popytu skumulowanego w chwili ostatniej decyzji
+    pos_ref = stock.copy()
+    c_pos = np.zeros(n_sim)
+    seg_start = np.zeros(n_sim, dtype=np.int64)   # początek bieżącego odcinka
+    k_a = start.copy()                            # pierwsze zdarzenie popytu w odcinku
+    next_decision = np.zeros(n_sim, dtype=np.int64)
+    stockout_days = np.zeros(n_sim)
+    served = np.zeros(n_sim)
+    inventory_sum = np.zeros(n_sim)
+    orders = np.zeros(n_sim)
+
+    never = np.iinfo(np.int64).max // 2
+    slot_day = np.full((n_sim, 4), never, dtype=np.int64)
+    slot_qty = np.zeros((n_sim, 4))
+    active = np.arange(n_sim)
+
+    while active.size:
+        r = active
+        x = np.minimum(np.minimum(slot_day[r].min(axis=1), next_decision[r]), horizon)
+
+        # ── odcinek [seg_start, x): tylko popyt, stan liczony w zamkniętej postaci
+        seg = x > seg_start[r]
+        if seg.any():
+            rs, xs = r[seg], x[seg]
+            a, ka, e, st = seg_start[rs], k_a[rs], end[rs], stock[rs]
+            kb = np.clip(np.searchsorted(day_key, rs * (horizon + 1) + xs, "left"), ka, e)
+            c_a, c_b = cum[ka] - base[rs], cum[kb] - base[rs]
+            demand = c_b - c_a
+            ok = st >= 0
+            sod = np.where(ok, 0.0, xs - a)
+            srv = np.where(ok, np.minimum(demand, np.maximum(st, 0.0)), 0.0)
+            # pierwsze zdarzenie, po którym stan < 0
+            j0 = np.clip(np.searchsorted(cum, cum[ka] + st, "right"), ka + 1, kb + 1) - 1
+            sod += np.where(ok & (j0 < kb), xs - day_at(j0, e), 0.0)
+            stop = np.minimum(j0, kb)
+            inv = st * (np.where(ka < kb, day_pad[ka], xs) - a)
+            more = stop > ka
+            last = np.maximum(kb - 1, 0)
+            span_end = np.where(stop < kb, day_pad[stop], xs)
+            weighted = np.where(
+                stop < kb,
+                prefix[stop] - prefix[ka],
+                prefix[last] - prefix[ka] + c_b * (xs - day_pad[last]),
+            )
+            inv += np.where(more, (c_a + st) * (span_end - day_pad[ka]) - weighted, 0.0)
+            stockout_days[rs] += sod
+            served[rs] += srv
+            inventory_sum[rs] += np.where(st > 0, inv, 0.0)
+            stock[rs] = st - demand
+            seg_start[rs] = xs
+            k_a[rs] = kb
+
+        alive = x < horizon
+        r, x = r[alive], x[alive]
+        active = r
+        if r.size == 0:
+            break
+
+        # ── przyjęcia dostaw w dniu x
+        sd = slot_day[r]
+        hit = sd == x[:, None]
+        if hit.any():
+            stock[r] += np.where(hit, slot_qty[r], 0.0).sum(axis=1)
+            sd[hit] = never
+            slot_day[r] = sd
+
+        # ── decyzje zamówień
+        dm = next_decision[r] == x
+        if not dm.any():
+            continue
+        rd, xd = r[dm], x[dm]
+        c_x = cum[k_a[rd]] - base[rd]
+        position = pos_ref[rd] - (c_x - c_pos[rd])
+        place = (order_qty > 0) & (position < reorder_point)
+        if place.any():
+            rp, xp = rd[place], xd[place]
+            orders[rp] += 1
+            position[place] += order_qty
+            for sp, sampler in zip(suppliers, samplers):
+                qty = order_qty * sp["share"]
+                lead = sampler(rp.size)
+                now = lead == 0
+                stock[rp[now]] += qty
+                rq, dq = rp[~now], xp[~now] + lead[~now]
+                if rq.size == 0:
+                    continue
+                free = slot_day[rq] == never
+                if not free.any(axis=1).all():
+                    width = slot_day.shape[1]
+                    slot_day = np.concatenate([slot_day, np.full((n_sim, width), never, dtype=np.int64)], axis=1)
+                    slot_qty = np.concatenate([slot_qty, np.zeros((n_sim, width))], axis=1)
+                    free = slot_day[rq] == never
+                col = np.argmax(free, axis=1)
+                slot_day[rq, col] = dq
+                slot_qty[rq, col] = qty
+        pos_ref[rd] = position
+        c_pos[rd] = c_x
+
+        if review_period_days:
+            next_decision[rd] = xd + int(review_period_days)
+        elif order_qty <= 0:
+            next_decision[rd] = horizon
+        else:
+            # pierwszy dzień, w którym pozycja spadnie poniżej ROP
+            e = end[rd]
+            j = np.clip(np.searchsorted(cum, cum[k_a[rd]] + position - reorder_point, "right"), k_a[rd] + 1, e + 1) - 1
+            crossing = np.where(j < e, day_pad[np.minimum(j, n_ev)] + 1, horizon)
+            next_decision[rd] = np.where(position < reorder_point, xd + 1, crossing)
+
+    return {
+        "stockout_days": stockout_days,
+        "served": served,
+        "inventory_sum": inventory_sum,
+        "orders": orders,
+        "demand": cum[end] - base,
+        "ending_stock": stock,
+    }
+
+
+def monte_carlo_policy_events(
+    forecast: pd.Series,
+    current_stock: float,
+    reorder_point: float,
+    order_qty: float,
+    lead_time_days: int,
+    n_sim: int = 500,
+    demand_volatility: float = 0.15,
+    horizon_days: Optional[int] = None,
+    demand_probability: Optional[float] = None,
+    lead_time_std_days: float = 0.0,
+    suppliers: Optional[Sequence[Dict[str, Any]]] = None,
+    review_period_days: Optional[int] = None,
+    service_level_target: Optional[float] = None,
+    seed: SeedLike = None,
+    weekday_profile: Optional[Sequence[float]] = None,
+) -> Dict[str, Any]:
+    """
+    Polityka (ROP, Q) w symulacji zdarzeniowej – odpowiednik monte_carlo_policy
+    dla długich horyzontów i SKU z rzadkim popytem.
+
+    Zamiast iść dzień po dniu, kernel skacze między zdarzeniami: złożenie zamówienia,
+    przyjęcie dostawy, punkt przeglądu, przecięcie ROP. Wszystkie przebiegi idą razem
+    (_simulate_events_batch), a liczba kroków to liczba zdarzeń najdłuższego przebiegu –
+    rośnie z liczbą zamówień, nie z długością horyzontu.
+
+    Parametry ponad monte_carlo_policy:
+    - horizon_days – długość symulacji; dłuższa niż prognoza → profil dzienny jest powtarzany,
+    - demand_probability – popyt sporadyczny (dzień z popytem z prawdop. p, wielkość / p),
+    - lead_time_std_days – losowy lead time (normalny, zaokrąglony do dni),
+    - suppliers – lista dostawców: {"name", "share", "lead_time_days", "lead_time_std_days"}
+      albo {"lead_time_values", "lead_time_probs"}; zamówienie dzielone wg udziałów,
+    - review_period_days – przegląd okresowy co R dni (None = przegląd ciągły).
+
+    Zwraca te same metryki co monte_carlo_policy.
+    """
+    daily = _to_daily_series(forecast, weekday_profile).to_numpy(dtype=float)
+    horizon = int(horizon_days) if horizon_days else int(daily.size)
+    if n_sim <= 0 or daily.size == 0 or horizon <= 0:
+        return {"prob_any_stockout": 0.0, "avg_stockouts_per_run": 0.0, "runs": int(max(n_sim, 0))}
+    if horizon != daily.size:
+        daily = np.resize(daily, horizon)
+
+    rng = _resolve_rng(seed)
+    supplier_list = _normalize_suppliers(suppliers, lead_time_days, lead_time_std_days)
+    samplers = [_LeadTimeSampler(sp, rng) for sp in supplier_list]
+    days, sizes, offsets = _sample_demand_events(daily, n_sim, demand_volatility, rng, demand_probability)
+
+    per_run = _simulate_events_batch(
+        days, sizes, offsets, horizon, current_stock, reorder_point, order_qty,
+        supplier_list, samplers, review_period_days,
+    )
+    res = _summarize_policy_runs(per_run, horizon, service_level_target)
+    res["horizon_days"] = horizon
+    return res
+
+
+# ─────────────────────────────────────────────────────────────
+# 6) Przegląd siatki polityk (ROP × Q) na wspólnych ścieżkach popytu
+# ─────────────────────────────────────────────────────────────
+
+# ile elementów stanu (polityki × przebiegi) liczymy naraz – ogranicza pamięć bufora dostaw
+_GRID_CHUNK_ELEMENTS = 2_000_000
+
+
+def sweep_policy_grid(
+    forecast: pd.Series,
+    current_stock: float,
+    lead_time_days: int,
+    reorder_points: Sequence[float],
+    order_qtys: Sequence[float],
+    n_sim: int = 300,
+    demand_volatility: float = 0.15,
+    holding_cost_per_day: Optional[float] = None,
+    shortage_cost: Optional[float] = None,
+    order_cost: Optional[float] = None,
+    fill_rate_target: Optional[float] = None,
+    seed: SeedLike = None,
+    variance_reduction: str = "none",
+    weekday_profile: Optional[Sequence[float]] = None,
+    demand_paths: Optional[np.ndarray] = None,
+) -> Dict[str, Any]:
+    """
+    Ocenia całą siatkę polityk ROP × Q na JEDNYM zestawie ścieżek popytu.
+
+    Popyt (n_sim × n_days) losujemy raz, a potem silnik polityki liczy wszystkie
+    pary (ROP, Q) naraz – stan ma kształt (liczba polityk × n_sim). Różnice między
+    komórkami siatki wynikają więc z polityki, nie z szumu losowania.
+    demand_paths – ścieżki popytu zamiast szumu wokół prognozy (jak w monte_carlo_stockout).
+
+    Koszt na przebieg = holding_cost_per_day · Σ zapas na półce
+                      + shortage_cost · niedostarczone z półki sztuki
+                      + order_cost · liczba zamówień
+    (domyślnie: miesięczny koszt utrzymania z CONFIG / 30, koszt braku i zamówienia z CONFIG).
+
+    Zwraca dict z osiami siatki i powierzchniami (DataFrame: index = ROP, columns = Q):
+    cost, fill_rate, prob_stockout, avg_inventory, avg_orders – gotowe do heatmapy.
+    "best" to polityka o najniższym koszcie (spełniająca fill_rate_target, jeśli podany).
+    """
+    rops = np.asarray(list(reorder_points), dtype=float)
+    qtys = np.asarray(list(order_qtys), dtype=float)
+    h = CONFIG.default_holding_cost / 30.0 if holding_cost_per_day is None else float(holding_cost_per_day)
+    p = CONFIG.default_shortage_cost if shortage_cost is None else float(shortage_cost)
+    k = CONFIG.default_order_cost if order_cost is None else float(order_cost)
+
+    daily = _to_daily_series(forecast, weekday_profile).to_numpy(dtype=float)
+    if rops.size == 0 or qtys.size == 0 or n_sim <= 0 or daily.size == 0:
+        return {"status": "empty", "reorder_points": rops, "order_qtys": qtys}
+
+    rng = _resolve_rng(seed)
+    if demand_paths is not None:
+        demand = _daily_path_sampler(forecast, demand_paths, weekday_profile)(n_sim, rng)
+    else:
+        demand = _sample_demand_matrix(daily, n_sim, demand_volatility, rng, variance_reduction)
+
+    grid_rop, grid_qty = (a.ravel() for a in np.meshgrid(rops, qtys, indexing="ij"))
+    n_pol = grid_rop.size
+    metrics = {key: np.empty(n_pol) for key in ("cost", "fill_rate", "prob_stockout", "avg_inventory", "avg_orders")}
+
+    chunk = max(1, _GRID_CHUNK_ELEMENTS // n_sim)
+    for lo in range(0, n_pol, chunk):
+        sl = slice(lo, min(lo + chunk, n_pol))
+        per_run = _simulate_policy_core(
+            demand,
+            current_stock=current_stock,
+            reorder_point=grid_rop[sl, None],
+            order_qty=grid_qty[sl, None],
+            lead_time_days=lead_time_days,
+        )
+        total_demand = per_run["demand"].sum(axis=1)
+        served = per_run["served"].sum(axis=1)
+        short = per_run["demand"] - per_run["served"]
+        cost = h * per_run["inventory_sum"] + p * short + k * per_run["orders"]
+
+        metrics["cost"][sl] = cost.mean(axis=1)
+        metrics["fill_rate"][sl] = np.divide(served, total_demand, out=np.ones_like(served), where=total_demand > 0)
+        metrics["prob_stockout"][sl] = (per_run["stockout_days"] > 0).mean(axis=1)
+        metrics["avg_inventory"][sl] = per_run["inventory_sum"].mean(axis=1) / daily.size
+        metrics["avg_orders"][sl] = per_run["orders"].mean(axis=1)
+
+    surfaces = {
+        key: pd.DataFrame(
+            vals.reshape(rops.size, qtys.size),
+            index=pd.Index(rops, name="reorder_point"),
+            columns=pd.Index(qtys, name="order_qty"),
+        )
+        for key, vals in metrics.items()
+    }
+
+    feasible = np.ones(n_pol, dtype=bool)
+    if fill_rate_target is not None:
+        feasible = metrics["fill_rate"] >= fill_rate_target
+    best: Optional[Dict[str, float]] = None
+    if feasible.any():
+        i = int(np.flatnonzero(feasible)[np.argmin(metrics["cost"][feasible])])
+        best = {"reorder_point": float(grid_rop[i]), "order_qty": float(grid_qty[i])}
+        best.update({key: float(vals[i]) for key, vals in metrics.items()})
+
+    return {
+        "status": "ok",
+        "reorder_points": rops,
+        "order_qtys": qtys,
+        **surfaces,
+        "best": best,
+        "runs": int(n_sim),
+        "costs": {"holding_cost_per_day": h, "shortage_cost": p, "order_cost": k},
+    }
+
+
+# ─────────────────────────────────────────────────────────────
+# 7) Portfel – wszystkie szeregi SKU × magazyn w jednym przebiegu
+# ─────────────────────────────────────────────────────────────
+
+# kolumny polityki, które można podać per szereg w policy_df
+PORTFOLIO_POLICY_COLS = ("current_stock", "reorder_point", "order_qty", "lead_time_days")
+
+# ile elementów tensora popytu (szeregi × przebiegi × dni) trzymamy naraz
+_PORTFOLIO_CHUNK_ELEMENTS = 20_000_000
+
+
+def _portfolio_demand_stats(values: np.ndarray, period_days: float) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Dzienna średnia i odchylenie popytu per szereg z macierzy okresowej (NaN = przed startem szeregu).
+    Dni w okresie traktujemy jako niezależne, więc std okresu dzielimy przez sqrt(dni).
+    """
+    n_obs = np.sum(~np.isnan(values), axis=1)
+    safe = np.where(n_obs > 0, n_obs, 1)
+    mean = np.nansum(values, axis=1) / safe
+    sq = np.nansum((values - mean[:, None]) ** 2, axis=1)
+    std = np.sqrt(sq / np.where(n_obs > 1, n_obs - 1, 1))
+    std[n_obs < 2] = 0.0
+    return mean / period_days, std / np.sqrt(period_days)
+
+
+def _portfolio_policy(
+    keys: pd.DataFrame,
+    policy_df: Optional[pd.DataFrame],
+    mu: np.ndarray,
+    sigma: np.ndarray,
+    service_level: float,
+    lead_time_stats: Optional[pd.DataFrame] = None,
+) -> pd.DataFrame:
+    """
+    Dokleja parametry polityki do szeregów; czego brakuje, liczymy wektorowo jak w optimization:
+    ROP = μ·L + z·sqrt(L·σ² + μ²·σ_L²), Q = EOQ (roczny popyt, koszty z CONFIG), stan = 0,
+    L = średni czas dostawy z lead_time_stats (LeadTimeIndex.lookup, wiersze jak keys) albo CONFIG.
+    Kolumna lead_time_std_days > 0 oznacza szereg z losowym czasem dostawy z indeksu.
+    """
+    table = keys.copy()
+    if policy_df is not None and not policy_df.empty:
+        key_cols = [c for c in keys.columns if c in policy_df.columns]
+        cols = key_cols + [c for c in PORTFOLIO_POLICY_COLS if c in policy_df.columns]
+        table = table.merge(policy_df[cols].drop_duplicates(key_cols, keep="last"), on=key_cols, how="left")
+    for col in PORTFOLIO_POLICY_COLS:
+        if col not in table.columns:
+            table[col] = np.nan
+        table[col] = pd.to_numeric(table[col], errors="coerce")
+
+    lead = table["lead_time_days"]
+    lead_std = np.zeros(len(table))
+    if lead_time_stats is not None:
+        mean = lead_time_stats["lead_time_mean"].to_numpy(dtype=float)
+        from_index = lead.isna().to_numpy() & ~np.isnan(mean)
+        lead = lead.fillna(pd.Series(np.maximum(np.round(mean), 1.0), index=table.index))
+        lead_std = np.where(from_index, np.nan_to_num(lead_time_stats["lead_time_std"].to_numpy(dtype=float)), 0.0)
+    lead = lead.fillna(CONFIG.default_lead_time_days).clip(lower=0).round()
+    table["lead_time_days"] = lead.astype(np.int64)
+    table["lead_time_std_days"] = lead_std
+    lead_arr = table["lead_time_days"].to_numpy(dtype=float)
+
+    safety = calc_safety_stock(sigma, lead_arr, service_level, lead_time_std_days=lead_std, avg_daily_demand=mu)
+    table["reorder_point"] = table["reorder_point"].fillna(
+        pd.Series(calc_reorder_point(mu, lead_arr, safety), index=table.index)
+    )
+    k, h = CONFIG.default_order_cost, CONFIG.default_holding_cost
+    eoq = np.sqrt(2.0 * np.maximum(mu, 0.0) * 365.0 * k / h) if k > 0 and h > 0 else np.zeros_like(mu)
+    table["order_qty"] = table["order_qty"].fillna(pd.Series(eoq, index=table.index))
+    table["current_stock"] = table["current_stock"].fillna(0.0)
+    return table
+
+
+def _portfolio_path_sampler(
+    values: np.ndarray,
+    method: str,
+    freq: str,
+    horizon: int,
+    period_days: float,
+    n_sim: int,
+    shared_seed: Optional[np.random.SeedSequence],
+    series_seeds: Sequence[np.random.SeedSequence],
+) -> Callable[[np.ndarray], np.ndarray]:
+    """
+    Popyt dzienny (szeregi × n_sim × dni) ze ścieżek prognozy – dla wskazanych wierszy pivotu.
+    Prognozę i błędy backtestu liczymy dla całej paczki szeregów naraz, a ścieżki losujemy
+    strumieniem danego szeregu (albo wspólnym), żeby wynik nie zależał od składu portfela.
+    """
+    from .ets import season_length_for
+    from .forecasting import forecast_matrix
+    from .probabilistic import _history_std, _sample_paths, horizon_residuals
+
+    n_periods = int(np.ceil(horizon / period_days))
+    day_period = np.minimum((np.arange(horizon) // period_days).astype(np.int64), n_periods - 1)
+    season_length = season_length_for(freq)
+
+    def sample(idx: np.ndarray) -> np.ndarray:
+        y = values[idx]
+        point = forecast_matrix(y, n_periods, method, season_length)
+        res = horizon_residuals(y, n_periods, method, season_length=season_length)
+        sigma = _history_std(y)
+        paths = np.empty((idx.size, n_sim, n_periods))
+        for j, i in enumerate(idx):
+            rng = np.random.default_rng(shared_seed if shared_seed is not None else series_seeds[i])
+            part = {"residuals": res["residuals"][j:j + 1], "n_valid": res["n_valid"][j:j + 1], "step_map": res["step_map"]}
+            paths[j] = _sample_paths(point[j:j + 1], part, sigma[j:j + 1], n_sim, rng)[0]
+        return paths[:, :, day_period] / period_days
+
+    return sample
+
+
+def _portfolio_inputs(
+    agg: pd.DataFrame,
+    policy_df: Optional[pd.DataFrame],
+    freq: str,
+    horizon: int,
+    n_sim: int,
+    seed: SeedLike,
+    shared_random_numbers: bool,
+    service_level: float,
+    forecast_method: Optional[str],
+    lead_time_index: Optional[Any] = None,
+) -> Dict[str, Any]:
+    """
+    Wspólne przygotowanie portfela: pivot historii, statystyki popytu, tabela polityki
+    i funkcja losująca popyt dzienny (szeregi × n_sim × dni) dla wskazanych wierszy tabeli.
+    Każdy szereg ma własny strumień z SeedSequence.spawn (albo wszystkie – wspólne szoki),
+    więc ponowne losowanie tych samych wierszy daje te same ścieżki.
+
+    lead_time_index (oi.lead_times.LeadTimeIndex) – szeregi bez lead time w policy_df dostają
+    rozkład empiryczny z dostaw; sample_lead losuje wtedy czas dostawy każdego zamówienia
+    (szeregi × n_sim × dni), a "stochastic_lead" wskazuje takie szeregi.
+    """
+    pivot = pivot_sales_matrix(agg, freq=freq)
+    keys = pivot["keys"]
+    n_series = len(keys)
+    if n_series == 0 or horizon <= 0 or n_sim <= 0:
+        return {
+            "keys": keys, "table": keys.iloc[:0], "sample_demand": None, "sample_lead": None,
+            "stochastic_lead": np.zeros(0, dtype=bool), "period_days": 1.0,
+        }
+
+    periods = pd.PeriodIndex(pivot["periods"], freq=freq)
+    period_days = float((periods[-1].end_time.normalize() - periods[0].start_time).days + 1) / len(periods)
+    mu, sigma = _portfolio_demand_stats(pivot["values"], period_days)
+
+    lead_stats: Optional[pd.DataFrame] = None
+    lead_pmf: Optional[Dict[str, Any]] = None
+    if lead_time_index is not None:
+        lead_stats = lead_time_index.lookup(keys)
+        lead_pmf = lead_time_index.pmf_matrix(keys)
+    table = _portfolio_policy(keys, policy_df, mu, sigma, service_level, lead_stats)
+    stochastic_lead = table["lead_time_std_days"].to_numpy() > 0
+    table.insert(len(keys.columns), "daily_demand_mean", mu)
+    table.insert(len(keys.columns) + 1, "daily_demand_std", sigma)
+
+    ss = seed if isinstance(seed, np.random.SeedSequence) else None
+    if ss is None:
+        ss = np.random.SeedSequence(_resolve_rng(seed).integers(2**63))
+    shared_z: Optional[np.ndarray] = None
+    series_seeds: List[np.random.SeedSequence] = []
+    if shared_random_numbers:
+        shared_z = np.random.default_rng(ss).standard_normal((n_sim, horizon))
+    else:
+        series_seeds = ss.spawn(n_series)
+
+    sample_paths: Optional[Callable[[np.ndarray], np.ndarray]] = None
+    if forecast_method is not None:
+        sample_paths = _portfolio_path_sampler(
+            pivot["values"], forecast_method, freq, horizon, period_days, n_sim,
+            ss if shared_random_numbers else None, series_seeds,
+        )
+
+    def sample_demand(idx: np.ndarray) -> np.ndarray:
+        if sample_paths is not None:
+            return sample_paths(idx)
+        if shared_z is not None:
+            z = np.broadcast_to(shared_z, (idx.size, n_sim, horizon))
+        else:
+            z = np.stack([np.random.default_rng(series_seeds[i]).standard_normal((n_sim, horizon)) for i in idx])
+        return np.maximum(mu[idx, None, None] + sigma[idx, None, None] * z, 0.0)
+
+    lead_seeds = ss.spawn(n_series) if stochastic_lead.any() else []
+    fixed_lead = table["lead_time_days"].to_numpy()
+
+    def sample_lead(idx: np.ndarray) -> np.ndarray:
+        out = np.empty((idx.size, n_sim, horizon), dtype=np.int32)
+        for j, i in enumerate(idx):
+            if stochastic_lead[i]:
+                out[j] = np.random.default_rng(lead_seeds[i]).choice(
+                    lead_pmf["values"], size=(n_sim, horizon), p=lead_pmf["probs"][i]
+                )
+            else:
+                out[j] = fixed_lead[i]
+        return out
+
+    return {
+        "keys": keys,
+        "table": table,
+        "sample_demand": sample_demand,
+        "sample_lead": sample_lead,
+        "stochastic_lead": stochastic_lead,
+        "period_days": period_days,
+    }
+
+
+def simulate_portfolio(
+    agg: pd.DataFrame,
+    policy_df: Optional[pd.DataFrame] = None,
+    freq: str = "W",
+    horizon_days: int = 90,
+    n_sim: int = 200,
+    seed: SeedLike = None,
+    shared_random_numbers: bool = False,
+    service_level: Optional[float] = None,
+    forecast_method: Optional[str] = None,
+    lead_time_index: Optional[Any] = None,
+) -> pd.DataFrame:
+    """
+    Symuluje politykę (ROP, Q) dla całego asortymentu naraz.
+
+    Wejście:
+    - agg: wynik preprocessing.aggregate_sales (sku [+ magazyn], data, ilosc) w częstotliwości freq,
+    - policy_df: opcjonalnie parametry per szereg – kolumny kluczy + dowolne z
+      current_stock / reorder_point / order_qty / lead_time_days;
+      brakujące uzupełniamy (stan 0, lead time z CONFIG, ROP z poziomu obsługi, Q = EOQ).
+
+    Popyt dzienny szeregu ~ max(N(μ, σ), 0), gdzie μ i σ liczymy z historii
+    (brak sprzedaży w okresie po starcie szeregu = 0). Szeregi o tym samym lead time
+    liczymy jednym wywołaniem silnika – stan ma kształt (szeregi × n_sim).
+
+    shared_random_numbers=True – wszystkie szeregi dostają te same standaryzowane szoki
+    (popyt w portfelu idealnie skorelowany – wariant "zły dzień dla wszystkich").
+    Domyślnie każdy szereg ma własny strumień z SeedSequence.spawn, więc jego wynik
+    nie zależy od tego, jakie inne szeregi są w portfelu.
+
+    forecast_method (np. "ma", "ets") – zamiast N(μ, σ) z historii popyt idzie ze ścieżek prognozy
+    tej metody (bootstrap błędów backtestu, oi.probabilistic), rozłożonych równo na dni okresu.
+    Przy shared_random_numbers=True wszystkie szeregi losują ścieżki z tych samych liczb losowych.
+    Domyślne ROP / Q nadal liczymy ze statystyk historii.
+
+    lead_time_index (oi.lead_times.LeadTimeIndex) – szeregi bez lead_time_days w policy_df dostają
+    czas dostawy z dostaw: każde zamówienie ma lead time wylosowany z rozkładu empirycznego SKU,
+    a domyślny ROP uwzględnia wariancję lead time.
+
+    Zwraca tidy DataFrame: klucze, popyt dzienny, parametry polityki i metryki
+    (prob_stockout, avg_stockout_days, fill_rate, avg_inventory, avg_orders, expected_shortage).
+    """
+    horizon = int(horizon_days)
+    metric_cols = ["prob_stockout", "avg_stockout_days", "fill_rate", "avg_inventory", "avg_orders", "expected_shortage"]
+    inputs = _portfolio_inputs(
+        agg, policy_df, freq, horizon, n_sim, seed, shared_random_numbers,
+        CONFIG.default_service_level if service_level is None else float(service_level),
+        forecast_method,
+        lead_time_index,
+    )
+    table = inputs["table"]
+    n_series = len(table)
+    if n_series == 0 or horizon <= 0 or n_sim <= 0:
+        return pd.DataFrame(
+            columns=list(inputs["keys"].columns)
+            + ["daily_demand_mean", "daily_demand_std", *PORTFOLIO_POLICY_COLS, "lead_time_std_days", *metric_cols]
+        )
+
+    stock = table["current_stock"].to_numpy(dtype=float)
+    rop = table["reorder_point"].to_numpy(dtype=float)
+    qty = table["order_qty"].to_numpy(dtype=float)
+    sample_demand, sample_lead = inputs["sample_demand"], inputs["sample_lead"]
+    # grupa = stały lead time; szeregi z losowym lead time (z indeksu dostaw) idą razem jako -1
+    group = np.where(inputs["stochastic_lead"], -1, table["lead_time_days"].to_numpy())
+
+    out = {col: np.empty(n_series) for col in metric_cols}
+    chunk = max(1, _PORTFOLIO_CHUNK_ELEMENTS // (n_sim * horizon))
+    for lt in np.unique(group):
+        members = np.flatnonzero(group == lt)
+        for lo in range(0, members.size, chunk):
+            idx = members[lo:lo + chunk]
+            demand = sample_demand(idx)
+            per_run = _simulate_policy_core(
+                demand,
+                current_stock=stock[idx, None],
+                reorder_point=rop[idx, None],
+                order_qty=qty[idx, None],
+                lead_time_days=sample_lead(idx) if lt < 0 else int(lt),
+            )
+            total = per_run["demand"].sum(axis=1)
+            served = per_run["served"].sum(axis=1)
+            out["prob_stockout"][idx] = (per_run["stockout_days"] > 0).mean(axis=1)
+            out["avg_stockout_days"][idx] = per_run["stockout_days"].mean(axis=1)
+            out["fill_rate"][idx] = np.divide(served, total, out=np.ones_like(served), where=total > 0)
+            out["avg_inventory"][idx] = per_run["inventory_sum"].mean(axis=1) / horizon
+            out["avg_orders"][idx] = per_run["orders"].mean(axis=1)
+            out["expected_shortage"][idx] = (total - served) / n_sim
+
+    for col in metric_cols:
+        table[col] = out[col]
+    return table
+
+
+# ─────────────────────────────────────────────────────────────
+# 8) ROP z symulacji – najmniejszy punkt zamówienia dający docelowy poziom obsługi
+# ─────────────────────────────────────────────────────────────
+
+# miary poziomu obsługi, do których szukamy ROP
+ROP_SEARCH_TARGETS = ("csl", "fill_rate")
+
+# ile razy podwajamy górną granicę ROP, zanim uznamy cel za nieosiągalny
+_ROP_EXPAND_ROUNDS = 12
+
+
+def _service_metric(per_run: Dict[str, np.ndarray], target: str) -> np.ndarray:
+    """
+    Poziom obsługi szeregów zbiorczo po przebiegach (oś przebiegów = ostatnia):
+    - "fill_rate" – obsłużone z półki / popyt,
+    - "csl"       – 1 − epizody braku / cykle; cykl = zamówienie (min. 1 na przebieg).
+    """
+    if target == "fill_rate":
+        total = per_run["demand"].sum(axis=-1)
+        served = per_run["served"].sum(axis=-1)
+        return np.divide(served, total, out=np.ones_like(served), where=total > 0)
+    cycles = np.maximum(per_run["orders"], 1).sum(axis=-1)
+    return np.clip(1.0 - per_run["stockout_events"].sum(axis=-1) / cycles, 0.0, 1.0)
+
+
+def optimize_reorder_points(
+    agg: pd.DataFrame,
+    policy_df: Optional[pd.DataFrame] = None,
+    freq: str = "W",
+    target: str = "csl",
+    target_level: Optional[float] = None,
+    horizon_days: int = 180,
+    n_sim: int = 200,
+    seed: SeedLike = None,
+    forecast_method: Optional[str] = None,
+    tol: float = 1.0,
+    max_iter: int = 30,
+    progress_callback: Optional[Callable[[int, int], None]] = None,
+    lead_time_index: Optional[Any] = None,
+) -> pd.DataFrame:
+    """
+    Szuka dla każdego szeregu najmniejszego ROP, przy którym symulacja osiąga target_level
+    poziomu obsługi ("csl" – cykle bez braku, albo "fill_rate").
+
+    calc_safety_stock zakłada popyt normalny – przy sprzedaży sporadycznej / skokowej daje
+    inny poziom obsługi niż deklarowany. Tutaj poziom obsługi mierzymy wprost w symulacji:
+    - popyt (szeregi × n_sim × dni) losujemy RAZ na paczkę szeregów i używamy go we wszystkich
+      krokach szukania (wspólne liczby losowe) – metryka jest wtedy prawie monotoniczna w ROP
+      i bisekcja nie błądzi przez szum losowania,
+    - bisekcja idzie równolegle dla całej paczki: jeden krok = jedno wywołanie silnika polityki
+      dla wszystkich szeregów, które jeszcze nie zbiegły (przedział > tol),
+    - górną granicę zaczynamy od ROP z rozkładu normalnego i podwajamy, dopóki cel nie jest spełniony.
+
+    Każdy przebieg startuje ze stanem = ROP, żeby wynik mierzył samą politykę, a nie dzisiejszy
+    stan, i żeby nawet przy dużym Q każdy przebieg miał co najmniej jeden cykl. Pozycja stoi
+    dokładnie na progu, a _simulate_policy_core zamawia przy pozycja < ROP, sprawdzając to przed
+    zużyciem dnia – dzień 0 jest więc bez zamówienia, a pierwsze idzie następnego dnia po
+    pierwszym popycie (jak w klasycznym cyklu, który zaczyna się w chwili zejścia pod ROP).
+
+    Q i lead time z policy_df (jak w simulate_portfolio); kolumny reorder_point i current_stock
+    z policy_df pomijamy.
+    forecast_method (np. "sba" dla popytu sporadycznego) – popyt ze ścieżek prognozy zamiast N(μ, σ).
+    lead_time_index – losowy czas dostawy każdego zamówienia z rozkładu empirycznego (jak w simulate_portfolio);
+    wylosowany raz na paczkę, wspólny dla wszystkich kroków szukania.
+
+    Zwraca DataFrame: klucze, daily_demand_mean/std, lead_time_days, order_qty,
+    reorder_point_normal (wzór z rozkładu normalnego), reorder_point (z symulacji), safety_stock,
+    service_level_achieved, status ("ok" / "unreachable" – cel nieosiągalny w horyzoncie), iterations.
+    """
+    if target not in ROP_SEARCH_TARGETS:
+        raise ValueError(f"Nieznana miara poziomu obsługi '{target}' – dostępne: {', '.join(ROP_SEARCH_TARGETS)}.")
+    level = CONFIG.default_service_level if target_level is None else float(target_level)
+    horizon = int(horizon_days)
+    tol = max(float(tol), 1e-6)
+    if policy_df is not None:
+        policy_df = policy_df.drop(columns=["reorder_point", "current_stock"], errors="ignore")
+
+    inputs = _portfolio_inputs(
+        agg, policy_df, freq, horizon, n_sim, seed, False,
+        level if target == "csl" else CONFIG.default_service_level,
+        forecast_method,
+        lead_time_index,
+    )
+    table = inputs["table"]
+    key_cols = list(inputs["keys"].columns)
+    out_cols = key_cols + [
+        "daily_demand_mean", "daily_demand_std", "lead_time_days", "lead_time_std_days", "order_qty",
+        "reorder_point_normal",
+        "reorder_point", "safety_stock", "service_level_achieved", "status", "iterations",
+    ]
+    n_series = len(table)
+    if n_series == 0 or horizon <= 0 or n_sim <= 0:
+        return pd.DataFrame(columns=out_cols)
+
+    mu = table["daily_demand_mean"].to_numpy(dtype=float)
+    qty = np.maximum(table["order_qty"].to_numpy(dtype=float), 0.0)
+    lead = table["lead_time_days"].to_numpy()
+    normal_rop = table["reorder_point"].to_numpy(dtype=float)
+    sample_demand, sample_lead = inputs["sample_demand"], inputs["sample_lead"]
+    group = np.where(inputs["stochastic_lead"], -1, lead)
+
+    best = np.empty(n_series)
+    achieved = np.empty(n_series)
+    reached = np.zeros(n_series, dtype=bool)
+    iterations = np.zeros(n_series, dtype=np.int64)
+
+    chunk = max(1, _PORTFOLIO_CHUNK_ELEMENTS // (n_sim * horizon))
+    done = 0
+    for lt in np.unique(group):
+        members = np.flatnonzero(group == lt)
+        for lo_i in range(0, members.size, chunk):
+            idx = members[lo_i:lo_i + chunk]
+            demand = sample_demand(idx)
+            lead_draws = sample_lead(idx) if lt < 0 else None
+            q = qty[idx]
+
+            def evaluate(rows: np.ndarray, rop: np.ndarray) -> np.ndarray:
+                per_run = _simulate_policy_core(
+                    demand[rows],
+                    current_stock=rop[:, None],
+                    reorder_point=rop[:, None],
+                    order_qty=q[rows, None],
+                    lead_time_days=int(lt) if lead_draws is None else lead_draws[rows],
+                )
+                return _service_metric(per_run, target)
+
+            all_rows = np.arange(idx.size)
+            lo = np.zeros(idx.size)
+            hi = np.maximum(np.nan_to_num(normal_rop[idx]), tol)
+            steps = np.zeros(idx.size, dtype=np.int64)
+
+            # ROP = 0 wystarcza (np. brak popytu) – nie ma czego szukać
+            metric = evaluate(all_rows, lo)
+            ok_at_zero = metric >= level
+            hi[ok_at_zero] = 0.0
+            hi_metric = metric.copy()
+
+            # górna granica: podwajamy, aż cel będzie spełniony
+            pending = np.flatnonzero(~ok_at_zero)
+            for _ in range(_ROP_EXPAND_ROUNDS + 1):
+                if pending.size == 0:
+                    break
+                metric = evaluate(pending, hi[pending])
+                steps[pending] += 1
+                hi_metric[pending] = metric
+                met = metric >= level
+                lo[pending[~met]] = hi[pending[~met]]
+                pending = pending[~met]
+                hi[pending] *= 2.0
+            ok = hi_metric >= level
+            if pending.size:
+                hi[pending] /= 2.0          # ostatnia sprawdzona (i niewystarczająca) granica
+
+            # bisekcja na wspólnych ścieżkach: lo nie spełnia celu, hi spełnia
+            for _ in range(int(max_iter)):
+                active = np.flatnonzero(ok & (hi - lo > tol))
+                if active.size == 0:
+                    break
+                mid = 0.5 * (lo[active] + hi[active])
+                metric = evaluate(active, mid)
+                steps[active] += 1
+                met = metric >= level
+                hi[active[met]] = mid[met]
+                hi_metric[active[met]] = metric[met]
+                lo[active[~met]] = mid[~met]
+
+            best[idx] = hi
+            achieved[idx] = hi_metric
+            reached[idx] = ok
+            iterations[idx] = steps
+            done += idx.size
+            if progress_callback is not None:
+                progress_callback(done, n_series)
+
+    res = table[
+        key_cols + ["daily_demand_mean", "daily_demand_std", "lead_time_days", "lead_time_std_days", "order_qty"]
+    ].copy()
+    res["reorder_point_normal"] = normal_rop
+    res["reorder_point"] = best
+    res["safety_stock"] = best - mu * lead
+    res["service_level_achieved"] = achieved
+    res["status"] = np.where(reached, "ok", "unreachable")
+    res["iterations"] = iterations
+    return res[out_cols]
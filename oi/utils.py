@@ -25,3 +25,23 @@ def init_session_state() -> None:
         }
     if "OPENAI_API_KEY" not in st.session_state:
         st.session_state.OPENAI_API_KEY = ""
+
+def get_lead_time_index():
+    """
+    Indeks czasów dostaw (oi.lead_times.LeadTimeIndex) z wgranych plików dostaw.
+    Trzymamy go w sesji – przy kolejnym wgraniu dokładamy tylko nowe pliki. Gdy któryś plik
+    zniknął z wgranych (usunięty albo podmieniony poprawioną wersją), budujemy indeks od nowa –
+    inaczej jego dostawy zostałyby w histogramie. Brak dostaw → None.
+    """
+    from .lead_times import LeadTimeIndex
+
+    frames = st.session_state.get("uploaded_data", {}).get("dostawy")
+    if not frames:
+        st.session_state.pop("lead_time_index", None)
+        return None
+    index = st.session_state.get("lead_time_index")
+    if index is None or index.is_stale(frames):
+        index = LeadTimeIndex()
+    index.update(frames)
+    st.session_state["lead_time_index"] = index
+    return index if len(index) else None
@@ -2,7 +2,13 @@
 import streamlit as st
 from oi.ui_components import render_topbar, render_alert
 from oi.preprocessing import normalize_sales_df, aggregate_sales
-from oi.forecasting import forecast_sku
+from oi.forecasting import list_batch_forecasters, list_forecasters
+from oi.forecast_cache import cached_forecast_sku, get_forecast_cache
+from oi.forecast_executor import forecast_all_parallel
+from oi.backtesting import DEFAULT_BACKTEST_METHODS, rolling_origin_backtest
+from oi.probabilistic import DEFAULT_QUANTILES
+from oi.hierarchy import RECONCILIATION_METHODS, forecast_hierarchy
+from oi.simulation import weekday_profile_from_sales
 from oi.config import CONFIG
 
 st.set_page_config(page_title="Prognozy", page_icon="📈", layout="wide")
@@ -14,9 +20,21 @@ sprzedaz = st.session_state.uploaded_data.get("sprzedaz")
 if sprzedaz is None:
     render_alert("Brak danych sprzedażowych. Przejdź do Dashboard i załaduj.", "err")
 else:
-    sprzedaz = normalize_sales_df(sprzedaz)
     freq = st.selectbox("Częstotliwość agregacji", ["W", "M", "D"], index=0)
-    agg = aggregate_sales(sprzedaz, freq=freq)
+    # normalizację i agregację trzymamy między rerunami, dopóki nie zmieni się wgrany plik / freq –
+    # ta sama ramka pozwala cache prognoz odpowiadać bez filtrowania danych od nowa
+    prepared = st.session_state.get("_prognozy_agg")
+    if prepared is None or prepared["raw"] is not sprzedaz or prepared["freq"] != freq:
+        normalized = normalize_sales_df(sprzedaz)
+        prepared = {
+            "raw": sprzedaz,
+            "freq": freq,
+            "sales": normalized,
+            "agg": aggregate_sales(normalized, freq=freq),
+        }
+        st.session_state["_prognozy_agg"] = prepared
+    sprzedaz = prepared["sales"]
+    agg = prepared["agg"]
 
     sku_list = agg[CONFIG.sku_col].unique().tolist()
     sku = st.selectbox("Wybierz SKU", sku_list)
@@ -28,7 +46,20 @@ else:
             location = location_sel
 
     horizon = st.slider("Horyzont prognozy (okresy)", 4, 52, 12)
-    res = forecast_sku(agg, sku=sku, location=location, periods=horizon, freq=freq)
+    methods = list_forecasters()
+    method = st.selectbox(
+        "Metoda prognozy", list(methods), index=list(methods).index("ma"), format_func=lambda m: f"{m} – {methods[m]}"
+    )
+    # kwantyle do pasma na wykresie + ścieżki popytu dla rekomendacji i symulacji
+    res = cached_forecast_sku(
+        agg, sku=sku, location=location, periods=horizon, freq=freq, method=method,
+        quantiles=(0.05, 0.5, 0.95), n_paths=500,
+    )
+    cache_stats = get_forecast_cache().stats()
+    st.caption(
+        f"Cache prognoz: {cache_stats['hits'] + cache_stats['disk_hits']} trafień / "
+        f"{cache_stats['misses']} pudeł ({cache_stats['entries']} wpisów w pamięci)"
+    )
 
     if res["forecast"] is None:
         render_alert("Brak danych dla tego SKU/magazynu", "warn")
@@ -36,6 +67,7 @@ else:
         tab1, tab2 = st.tabs(["Wykres", "Tabelka"])
         history = res["history"]
         forecast = res["forecast"]
+        quantiles = res.get("quantiles")
 
         with tab1:
             chart_df = (
@@ -43,12 +75,22 @@ else:
                 .to_frame()
                 .join(forecast.rename("forecast"), how="outer")
             )
+            if quantiles is not None:
+                chart_df = chart_df.join(quantiles[["p5", "p95"]], how="outer")
             st.line_chart(chart_df)
+            if quantiles is not None:
+                st.caption("p5–p95: przedział z bootstrapu błędów prognozy na historii (rolling-origin).")
         with tab2:
-            st.dataframe(
-                forecast.rename("prognoza").to_frame().reset_index().rename(columns={"index": "okres"})
-            )
+            table = forecast.rename("prognoza").to_frame()
+            if quantiles is not None:
+                table = table.join(quantiles)
+            st.dataframe(table.reset_index().rename(columns={"index": "okres"}))
 
+        if res["meta"].get("requested_method") == "auto":
+            st.caption(
+                f"Tryb auto: klasa zmienności {res['meta']['xyz']}, wybrano **{res['meta']['method']}** "
+                f"(MAE z backtestu: {res['meta']['selection'] or 'bez backtestu – szereg stabilny'})."
+            )
         st.success("Prognoza wygenerowana. Możesz teraz przejść do zakładki Rekomendacje.")
         st.session_state["last_forecast"] = {
             "sku": sku,
@@ -56,4 +98,100 @@ else:
             "freq": freq,
             "history": history,
             "forecast": forecast,
+            # ścieżki popytu (n_paths × okresy) – rozkład prognozy dla ROP i Monte Carlo
+            "paths": res.get("paths"),
+            # profil dnia tygodnia z dziennej historii – symulacje rozbijają nim okresy na dni
+            "weekday_profile": weekday_profile_from_sales(sprzedaz, sku=sku, location=location),
         }
+
+    st.divider()
+    st.subheader("📦 Prognoza dla całego asortymentu")
+    batch_methods = list_batch_forecasters() + [m for m in list_forecasters() if m not in list_batch_forecasters()]
+    batch_method = st.selectbox("Metoda (wszystkie szeregi)", batch_methods, index=1)
+    if st.button("Prognozuj wszystkie SKU"):
+        progress = st.progress(0.0, text="Liczę prognozy dla wszystkich szeregów...")
+        batch = forecast_all_parallel(
+            agg,
+            periods=horizon,
+            freq=freq,
+            method=batch_method,
+            progress_callback=lambda done, total: progress.progress(
+                done / max(total, 1), text=f"Prognozy: {done}/{total} szeregów"
+            ),
+            # kwantyle z bootstrapu błędów – z nich Rekomendacje liczą zapas bezpieczeństwa
+            quantiles=DEFAULT_QUANTILES,
+        )
+        st.session_state["forecast_all"] = batch
+        n_fallback = int((batch["meta"]["status"] != "ok").sum())
+        if n_fallback:
+            render_alert(f"{n_fallback} szeregów policzono zapasowo metodą 'ma' (limit czasu albo błąd modelu).", "warn")
+        st.caption(f"Szeregów: {len(batch['meta'])}")
+        st.dataframe(batch["meta"], use_container_width=True)
+        st.download_button(
+            "Pobierz prognozy (CSV)",
+            batch["forecast"].to_csv(index=False).encode("utf-8"),
+            file_name="prognozy_wszystkie.csv",
+            mime="text/csv",
+        )
+
+    with st.expander("🔁 Backtest metod (rolling origin)"):
+        b1, b2 = st.columns(2)
+        with b1:
+            bt_horizon = st.slider("Horyzont backtestu (okresy)", 1, 12, 4)
+        with b2:
+            bt_origins = st.slider("Liczba punktów startu", 4, 52, 12)
+        bt_methods = st.multiselect(
+            "Metody",
+            [m for m in list_batch_forecasters() if m != "auto"],
+            default=list(DEFAULT_BACKTEST_METHODS),
+            help="ETS / Holt-Winters i Croston dopasowują się od nowa w każdym punkcie startu – "
+            "przy dużym asortymencie i wielu punktach startu to minuty zamiast sekund.",
+        )
+        if st.button("Uruchom backtest", disabled=not bt_methods):
+            with st.spinner("Liczę prognozy ze wszystkich punktów startu..."):
+                bt = rolling_origin_backtest(
+                    agg, freq=freq, horizon=bt_horizon, n_origins=bt_origins, methods=bt_methods
+                )
+            if bt["meta"]["status"] != "ok":
+                render_alert("Za krótka historia na backtest z takimi parametrami.", "warn")
+            else:
+                st.caption(
+                    f"{bt['meta']['n_series']} szeregów × {bt['meta']['n_origins']} punktów startu. "
+                    "Bias > 0 oznacza przeszacowanie popytu."
+                )
+                st.dataframe(bt["summary"], use_container_width=True)
+                st.line_chart(bt["by_horizon"].pivot(index="step", columns="method", values="mae"))
+
+    with st.expander("🧩 Prognoza spójna na wszystkich poziomach (całość / magazyn / SKU)"):
+        h1, h2 = st.columns(2)
+        with h1:
+            h_method = st.selectbox(
+                "Metoda bazowa", [m for m in list_batch_forecasters() if m != "auto"], index=1, key="hier_method"
+            )
+        with h2:
+            h_rec = st.selectbox(
+                "Uzgadnianie",
+                list(RECONCILIATION_METHODS),
+                index=2,
+                format_func=lambda m: {"bu": "bottom-up", "td": "top-down (udziały historyczne)",
+                                       "mint_shrink": "MinT (shrink)"}[m],
+            )
+        if st.button("Licz prognozę hierarchiczną"):
+            with st.spinner("Prognozy bazowe dla wszystkich poziomów + uzgadnianie..."):
+                hres = forecast_hierarchy(agg, periods=horizon, freq=freq, method=h_method, reconciliation=h_rec)
+            if hres["meta"]["status"] != "ok":
+                render_alert("Brak danych do zbudowania hierarchii.", "warn")
+            else:
+                lam = hres["meta"]["lambda"]
+                st.caption(
+                    f"{hres['meta']['n_nodes']} węzłów ({hres['meta']['n_bottom']} szeregów dolnych)"
+                    + (f", λ shrinkage = {lam:.2f}" if lam is not None else "")
+                )
+                summary = hres["forecast"].groupby("level")[["base", "forecast"]].sum()
+                st.dataframe(summary, use_container_width=True)
+                st.download_button(
+                    "Pobierz prognozy hierarchiczne (CSV)",
+                    hres["forecast"].to_csv(index=False).encode("utf-8"),
+                    file_name="prognozy_hierarchia.csv",
+                    mime="text/csv",
+                )
@@ -1,7 +1,12 @@
 # pages/03_📦_Rekomendacje.py
+import pandas as pd
 import streamlit as st
 from oi.ui_components import render_topbar, render_alert
-from oi.optimization import build_inventory_recommendation
+from oi.utils import get_lead_time_index
+from oi.optimization import RECOMMENDATION_PARAM_COLS, build_inventory_recommendation, build_inventory_recommendations
+from oi.order_allocation import optimize_orders
+from oi.multi_echelon import NETWORK_PARAM_COLS, optimize_multi_echelon
+from oi.preprocessing import normalize_sales_df, aggregate_sales
 from oi.config import CONFIG
 
 st.set_page_config(page_title="Rekomendacje", page_icon="📦", layout="wide")
@@ -9,17 +14,29 @@ st.set_page_config(page_title="Rekomendacje", page_icon="📦", layout="wide")
 render_topbar("📦 Rekomendacje zatowarowania", "ROP, safety stock, EOQ")
 
 lf = st.session_state.get("last_forecast")
+lt_index = get_lead_time_index()
 
 if not lf:
     render_alert("Brak prognozy w sesji. Najpierw wygeneruj prognozę w zakładce 'Prognozy'.", "warn")
 else:
+    lt_dist = lt_index.distribution(lf["sku"]) if lt_index is not None else None
     c1, c2, c3 = st.columns(3)
     with c1:
         current_stock = st.number_input("Aktualny stan magazynu (szt.)", min_value=0.0, value=100.0, step=10.0)
     with c2:
         service_level = st.slider("Poziom obsługi", 0.5, 0.999, 0.95)
     with c3:
-        lead_time_days = st.number_input("Czas dostawy (dni)", min_value=1, value=7, step=1)
+        lead_time_days = st.number_input(
+            "Czas dostawy (dni)", min_value=1, value=max(int(round(lt_dist["mean"])), 1) if lt_dist else 7, step=1
+        )
+    if lt_dist:
+        use_lt_dist = st.checkbox(
+            f"Losowy czas dostawy z dostaw (śr. {lt_dist['mean']:.1f} dni, σ {lt_dist['std']:.1f})",
+            value=True,
+            help="Rozkład empiryczny z wgranych plików dostaw – zapas bezpieczeństwa uwzględnia wahania lead time.",
+        )
+        if not use_lt_dist:
+            lt_dist = None
 
     order_cost = st.number_input("Koszt złożenia zamówienia (PLN)", min_value=1.0, value=50.0)
     holding_cost = st.number_input("Miesięczny koszt utrzymania 1 szt. (PLN)", min_value=0.1, value=2.0)
@@ -31,6 +48,8 @@ else:
         service_level=service_level,
         order_cost=order_cost,
         holding_cost=holding_cost,
+        demand_paths=lf.get("paths"),
+        lead_time_dist=lt_dist,
     )
 
     st.subheader("📋 Wynik")
@@ -39,6 +58,8 @@ else:
     col2.metric("Zapas bezpieczeństwa", f"{rec['safety_stock']:.0f} szt.")
     col3.metric("Punkt zamówienia (ROP)", f"{rec['reorder_point']:.0f} szt.")
     col4.metric("EOQ", f"{rec['eoq']:.0f} szt.")
+    if rec.get("uncertainty_source") == "paths":
+        st.caption("ROP = kwantyl popytu w czasie dostawy ze ścieżek prognozy (bootstrap błędów metody).")
 
     if rec["suggested_order_qty"] > 0:
         st.success(f"✅ Zalecane zamówienie: **{rec['suggested_order_qty']:.0f} szt.**")
@@ -59,3 +80,160 @@ else:
             "suggested_order_qty": float(rec["suggested_order_qty"]),
         })
         st.markdown(ai_ans)
+
+st.divider()
+st.subheader("🏬 Rekomendacje dla całego asortymentu")
+batch = st.session_state.get("forecast_all")
+if batch is None:
+    render_alert("Brak prognozy dla całego asortymentu – policz ją w zakładce 'Prognozy'.", "warn")
+else:
+    params_file = st.file_uploader(
+        "Parametry per SKU (CSV, opcjonalnie)",
+        type=["csv"],
+        help=f"Kolumny kluczy ({CONFIG.sku_col}, {CONFIG.location_col}) + dowolne z: "
+        f"{', '.join(RECOMMENDATION_PARAM_COLS)}. Braki → wartości domyślne z ustawień, stan = 0.",
+    )
+    params_df = pd.read_csv(params_file) if params_file is not None else None
+    recs = build_inventory_recommendations(
+        batch["forecast"],
+        params_df=params_df,
+        freq=str(batch["meta"]["freq"].iloc[0]) if len(batch["meta"]) else None,
+        forecast_meta=batch["meta"],
+        lead_time_index=lt_index,
+    )
+    if lt_index is not None:
+        with st.expander("⏱️ Czasy dostaw z plików dostaw"):
+            st.caption(
+                f"{len(lt_index)} dostaw. SKU bez własnego lead_time_days w parametrach dostają średnią "
+                "i odchylenie z tej tabeli (brak dostaw SKU → statystyki dostawcy / całości)."
+            )
+            st.dataframe(lt_index.stats("supplier_sku"), use_container_width=True)
+    if not (recs["uncertainty_source"] == "quantiles").any():
+        render_alert(
+            "Prognoza bez kwantyli – zapas bezpieczeństwa z rozrzutu prognozy punktowej "
+            "(dla płaskich metod wychodzi 0). Przelicz prognozę dla całego asortymentu.",
+            "warn",
+        )
+    to_order = recs[recs["suggested_order_qty"] > 0]
+    st.caption(f"Szeregów: {len(recs)}, do zamówienia: {len(to_order)}")
+    st.dataframe(recs.sort_values("stockout_risk", ascending=False), use_container_width=True)
+    st.download_button(
+        "Pobierz rekomendacje (CSV)",
+        recs.to_csv(index=False).encode("utf-8"),
+        file_name="rekomendacje_wszystkie.csv",
+        mime="text/csv",
+    )
+
+    with st.expander("💰 Zamówienia przy wspólnym budżecie / pojemności"):
+        st.caption(
+            "Dzieli limit między SKU tak, by łączny oczekiwany koszt (utrzymanie + braki) był najmniejszy. "
+            "Budżet wymaga kolumny unit_cost w pliku parametrów; pojemność liczy unit_volume (domyślnie 1 / szt.)."
+        )
+        a1, a2, a3 = st.columns(3)
+        with a1:
+            budget = st.number_input("Budżet zakupów (PLN, 0 = bez limitu)", min_value=0.0, value=0.0, step=1000.0)
+        with a2:
+            capacity = st.number_input("Pojemność magazynu (0 = bez limitu)", min_value=0.0, value=0.0, step=100.0)
+        with a3:
+            max_units = st.number_input("Limit sztuk w zamówieniu (0 = bez limitu)", min_value=0.0, value=0.0, step=100.0)
+        review_days = st.number_input(
+            "Okres przeglądu (dni)", min_value=1, value=int(CONFIG.default_review_period_days), step=1
+        )
+        if st.button("Optymalizuj zamówienia"):
+            alloc_table = recs
+            extra = [c for c in ("unit_cost", "unit_volume", "shortage_cost") if params_df is not None and c in params_df]
+            if extra:
+                keys = [c for c in (CONFIG.sku_col, CONFIG.location_col) if c in recs.columns and c in params_df.columns]
+                alloc_table = recs.merge(params_df[keys + extra].drop_duplicates(keys), on=keys, how="left")
+            try:
+                alloc = optimize_orders(
+                    alloc_table,
+                    budget=budget or None,
+                    capacity=capacity or None,
+                    max_units=max_units or None,
+                    review_period_days=int(review_days),
+                )
+            except ValueError as exc:
+                render_alert(str(exc), "err")
+            else:
+                if alloc["meta"]["status"] == "infeasible":
+                    render_alert("Limit jest już przekroczony przez obecne stany – nic nie zamawiamy.", "warn")
+                st.caption(
+                    f"Oczekiwany koszt: {alloc['meta']['total_cost']:,.0f} PLN "
+                    f"(bez ograniczeń: {alloc['meta']['unconstrained_cost']:,.0f} PLN)"
+                )
+                st.dataframe(alloc["constraints"], use_container_width=True)
+                st.dataframe(alloc["orders"], use_container_width=True)
+                st.download_button(
+                    "Pobierz zamówienia (CSV)",
+                    alloc["orders"].to_csv(index=False).encode("utf-8"),
+                    file_name="zamowienia_optymalne.csv",
+                    mime="text/csv",
+                )
+
+st.divider()
+st.subheader("🏭 Sieć dwupoziomowa: DC → magazyny regionalne")
+sprzedaz_all = st.session_state.get("uploaded_data", {}).get("sprzedaz")
+if sprzedaz_all is None:
+    render_alert("Brak danych sprzedażowych – popyt magazynów liczymy z historii sprzedaży.", "warn")
+else:
+    st.caption(
+        "Wspólne rozmieszczenie zapasu bezpieczeństwa: DC obiecuje magazynom czas obsługi, "
+        "a magazyny chronią się na resztę drogi. Popyt DC to suma magazynów (łączenie zmienności)."
+    )
+    n1, n2, n3 = st.columns(3)
+    with n1:
+        dc_lead_time = st.number_input(
+            "Czas dostawy do DC (dni)", min_value=0, value=int(CONFIG.default_lead_time_days), step=1,
+            help="SKU z dostawami w plikach dostaw dostają średni czas z tych dostaw.",
+        )
+    with n2:
+        dc_holding = st.number_input(
+            "Miesięczny koszt utrzymania 1 szt. w DC (PLN)", min_value=0.0, value=float(CONFIG.default_holding_cost)
+        )
+    with n3:
+        dc_service = st.slider("Poziom obsługi DC", 0.5, 0.999, float(CONFIG.default_service_level))
+    network_file = st.file_uploader(
+        "Parametry magazynów regionalnych (CSV, opcjonalnie)",
+        type=["csv"],
+        help=f"Kolumna {CONFIG.location_col} + dowolne z: {', '.join(NETWORK_PARAM_COLS)}. "
+        f"lead_time_days = przerzut z DC (domyślnie {CONFIG.default_transfer_days} dni).",
+    )
+    if st.button("Rozmieść zapas w sieci"):
+        with st.spinner("Liczę..."):
+            agg_all = aggregate_sales(normalize_sales_df(sprzedaz_all), freq="W")
+            net = optimize_multi_echelon(
+                agg_all,
+                freq="W",
+                network_df=pd.read_csv(network_file) if network_file is not None else None,
+                dc_lead_time_days=int(dc_lead_time),
+                dc_holding_cost=dc_holding,
+                dc_service_level=dc_service,
+                lead_time_index=lt_index,
+            )
+        meta = net["meta"]
+        if meta["status"] == "no_locations":
+            render_alert(f"Dane sprzedaży nie mają kolumny '{CONFIG.location_col}' – brak sieci magazynów.", "warn")
+        elif meta["status"] == "empty":
+            render_alert("Brak danych do policzenia.", "warn")
+        else:
+            m1, m2, m3 = st.columns(3)
+            m1.metric("Koszt zapasu bezpieczeństwa", f"{meta['total_cost']:,.0f} PLN / mies.")
+            m2.metric("Bufor tylko w DC (S = 0)", f"{meta['dc_buffer_cost']:,.0f} PLN / mies.")
+            m3.metric("SKU × magazyn", f"{meta['n_series']}")
+            st.markdown("**DC (per SKU)**")
+            st.dataframe(net["dc"], use_container_width=True)
+            st.markdown("**Magazyny regionalne**")
+            st.dataframe(net["locations"], use_container_width=True)
+            st.download_button(
+                "Pobierz zapasy magazynów (CSV)",
+                net["locations"].to_csv(index=False).encode("utf-8"),
+                file_name="zapas_siec_magazyny.csv",
+                mime="text/csv",
+            )
+            st.download_button(
+                "Pobierz zapasy DC (CSV)",
+                net["dc"].to_csv(index=False).encode("utf-8"),
+                file_name="zapas_siec_dc.csv",
+                mime="text/csv",
+            )
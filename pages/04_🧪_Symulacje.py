@@ -1,7 +1,9 @@
 # pages/04_🧪_Symulacje.py
 import streamlit as st
 from oi.ui_components import render_topbar, render_alert
-from oi.simulation import monte_carlo_stockout
+from oi.utils import get_lead_time_index
+from oi.preprocessing import normalize_sales_df, aggregate_sales
+from oi.simulation import monte_carlo_stockout, optimize_reorder_points, sweep_policy_grid, simulate_portfolio
 
 st.set_page_config(page_title="Symulacje", page_icon="🧪", layout="wide")
 
@@ -20,7 +22,22 @@ else:
     with c3:
         n_sim = st.slider("Liczba symulacji", 100, 2000, 500, step=100)
 
-    volatility = st.slider("Zmienność popytu", 0.01, 0.5, 0.15, step=0.01)
+    # ścieżki z prognozy niosą rzeczywisty błąd metody – suwak zmienności tylko bez nich
+    paths = lf.get("paths")
+    volatility = 0.15
+    if paths is None:
+        volatility = st.slider("Zmienność popytu", 0.01, 0.5, 0.15, step=0.01)
+    else:
+        st.caption("Popyt losowany ze ścieżek prognozy (bootstrap błędów metody).")
+
+    adaptive = st.checkbox(
+        "Tryb adaptacyjny (symuluj aż do żądanej precyzji)",
+        help="Liczba symulacji staje się górnym limitem – dla łatwych SKU skończymy dużo wcześniej.",
+    )
+    ci_tolerance = None
+    if adaptive:
+        ci_tolerance = st.slider("Tolerancja P(stock-out) ±", 0.001, 0.05, 0.01, step=0.001, format="%.3f")
+        n_sim = st.slider("Maks. liczba symulacji", 1000, 100000, 20000, step=1000)
 
     res = monte_carlo_stockout(
         forecast=lf["forecast"],
@@ -28,6 +45,9 @@ else:
         lead_time_days=lead_time_days,
         n_sim=n_sim,
         demand_volatility=volatility,
+        ci_tolerance=ci_tolerance,
+        weekday_profile=lf.get("weekday_profile"),
+        demand_paths=paths,
     )
 
     st.metric("Prawdopodobieństwo stock-out", f"{res['prob_stockout']*100:.1f}%")
@@ -35,4 +55,160 @@ else:
     st.metric("Min zapas końcowy", f"{res['min_ending_stock']:.1f} szt.")
     st.metric("Max zapas końcowy", f"{res['max_ending_stock']:.1f} szt.")
 
+    if res.get("adaptive"):
+        st.caption(
+            f"Wykonano {res['runs']} symulacji, przedział ufności 95%: "
+            f"±{res['ci_half_width']*100:.2f} pp (powód zatrzymania: {res['stop_reason']})."
+        )
+
+    pct = res.get("ending_stock_percentiles") or {}
+    if pct:
+        cols = st.columns(len(pct))
+        for col, (label, val) in zip(cols, pct.items()):
+            col.metric(f"Zapas końcowy {label}", f"{val:.1f} szt.")
+
     st.caption("Możesz użyć tego do testowania różnych polityk uzupełnień.")
+
+    st.subheader("🗺️ Siatka polityk ROP × wielkość zamówienia")
+    g1, g2, g3 = st.columns(3)
+    with g1:
+        rop_range = st.slider("Zakres ROP", 0.0, 2000.0, (20.0, 300.0), step=10.0)
+    with g2:
+        qty_range = st.slider("Zakres wielkości zamówienia", 10.0, 3000.0, (50.0, 600.0), step=10.0)
+    with g3:
+        grid_n = st.slider("Punktów na oś", 5, 40, 20)
+    fill_target = st.slider("Minimalny fill rate (do wyboru najlepszej polityki)", 0.5, 1.0, 0.95, step=0.01)
+
+    if st.button("Przelicz siatkę"):
+        import numpy as np
+        import plotly.express as px
+
+        with st.spinner("Symuluję całą siatkę na wspólnych ścieżkach popytu..."):
+            sweep = sweep_policy_grid(
+                forecast=lf["forecast"],
+                current_stock=current_stock,
+                lead_time_days=lead_time_days,
+                reorder_points=np.linspace(*rop_range, grid_n),
+                order_qtys=np.linspace(*qty_range, grid_n),
+                n_sim=min(n_sim, 500),
+                demand_volatility=volatility,
+                fill_rate_target=fill_target,
+                weekday_profile=lf.get("weekday_profile"),
+                demand_paths=paths,
+            )
+
+        if sweep.get("status") == "ok":
+            tab_cost, tab_fill, tab_so = st.tabs(["Koszt", "Fill rate", "P(stock-out)"])
+            for tab, key, scale in (
+                (tab_cost, "cost", "Viridis"),
+                (tab_fill, "fill_rate", "RdYlGn"),
+                (tab_so, "prob_stockout", "RdYlGn_r"),
+            ):
+                with tab:
+                    surface = sweep[key].round(3)
+                    fig = px.imshow(
+                        surface,
+                        x=[f"{q:.0f}" for q in surface.columns],
+                        y=[f"{r:.0f}" for r in surface.index],
+                        labels={"x": "Wielkość zamówienia", "y": "ROP", "color": key},
+                        color_continuous_scale=scale,
+                        aspect="auto",
+                        origin="lower",
+                    )
+                    st.plotly_chart(fig, use_container_width=True)
+
+            best = sweep.get("best")
+            if best:
+                st.success(
+                    f"Najtańsza polityka: ROP **{best['reorder_point']:.0f}**, "
+                    f"zamówienie **{best['order_qty']:.0f}** szt. "
+                    f"(fill rate {best['fill_rate']*100:.1f}%, koszt {best['cost']:.0f} PLN)."
+                )
+            else:
+                render_alert("Żadna polityka z siatki nie osiąga wymaganego fill rate.", "warn")
+
+st.divider()
+st.subheader("🏬 Cały asortyment (SKU × magazyn)")
+sprzedaz_all = st.session_state.get("uploaded_data", {}).get("sprzedaz")
+if sprzedaz_all is None:
+    render_alert("Brak danych sprzedażowych – portfel liczymy z historii sprzedaży.", "warn")
+else:
+    p1, p2, p3, p4 = st.columns(4)
+    with p1:
+        pf_horizon = st.slider("Horyzont (dni)", 14, 365, 90, step=7)
+    with p2:
+        pf_sims = st.slider("Symulacji na szereg", 50, 1000, 200, step=50)
+    with p3:
+        pf_shared = st.checkbox(
+            "Wspólne szoki popytu",
+            help="Wszystkie SKU dostają te same losowania – wariant skorelowanego popytu w portfelu.",
+        )
+    with p4:
+        pf_method = st.selectbox(
+            "Popyt z",
+            [None, "ma", "naive", "ets"],
+            format_func=lambda m: "historii (N(μ, σ))" if m is None else f"ścieżek prognozy {m}",
+        )
+
+    if st.button("Symuluj portfel"):
+        with st.spinner("Symuluję wszystkie szeregi naraz..."):
+            agg_all = aggregate_sales(normalize_sales_df(sprzedaz_all), freq="W")
+            portfolio = simulate_portfolio(
+                agg_all,
+                freq="W",
+                horizon_days=pf_horizon,
+                n_sim=pf_sims,
+                shared_random_numbers=pf_shared,
+                forecast_method=pf_method,
+                lead_time_index=get_lead_time_index(),
+            )
+        st.caption(
+            "Polityka domyślna: ROP z poziomu obsługi, lead time z dostaw (losowy per zamówienie) albo z ustawień, "
+            "zamówienie = EOQ, stan początkowy 0."
+        )
+        st.dataframe(portfolio.sort_values("prob_stockout", ascending=False), use_container_width=True)
+
+    with st.expander("🎯 ROP z symulacji (najmniejszy punkt zamówienia dla poziomu obsługi)"):
+        st.caption(
+            "Dla każdego SKU bisekcja ROP na wspólnych ścieżkach popytu – bez założenia rozkładu normalnego. "
+            "Dla sprzedaży sporadycznej wybierz popyt ze ścieżek prognozy sba / croston."
+        )
+        o1, o2, o3 = st.columns(3)
+        with o1:
+            opt_target = st.selectbox(
+                "Miara", ["csl", "fill_rate"],
+                format_func=lambda m: {"csl": "cykle bez braku (CSL)", "fill_rate": "fill rate"}[m],
+            )
+        with o2:
+            opt_level = st.slider("Docelowy poziom", 0.5, 0.999, 0.95, key="rop_search_level")
+        with o3:
+            opt_method = st.selectbox(
+                "Popyt z", [None, "ma", "ets", "sba", "croston", "tsb"], key="rop_search_method",
+                format_func=lambda m: "historii (N(μ, σ))" if m is None else f"ścieżek prognozy {m}",
+            )
+        if st.button("Szukaj ROP dla wszystkich SKU"):
+            progress = st.progress(0.0, text="Szukam ROP...")
+            agg_all = aggregate_sales(normalize_sales_df(sprzedaz_all), freq="W")
+            rops = optimize_reorder_points(
+                agg_all,
+                freq="W",
+                target=opt_target,
+                target_level=opt_level,
+                horizon_days=pf_horizon,
+                n_sim=pf_sims,
+                forecast_method=opt_method,
+                lead_time_index=get_lead_time_index(),
+                progress_callback=lambda done, total: progress.progress(
+                    done / max(total, 1), text=f"ROP: {done}/{total} szeregów"
+                ),
+            )
+            n_bad = int((rops["status"] != "ok").sum())
+            if n_bad:
+                render_alert(f"{n_bad} szeregów nie osiąga celu w horyzoncie symulacji (np. lead time ≥ horyzont).", "warn")
+            st.dataframe(rops, use_container_width=True)
+            st.download_button(
+                "Pobierz ROP (CSV)",
+                rops.to_csv(index=False).encode("utf-8"),
+                file_name="rop_symulacja.csv",
+                mime="text/csv",
+            )